@@ -0,0 +1,239 @@
+"""Managed storage for build artifacts (compiled PDFs and similar outputs).
+
+Artifacts are stored by key in a pluggable backend: a local directory, or
+GridFS when several backend hosts need to share them. Which artifacts exist,
+who references them and when they were last used is tracked in a MongoDB
+collection, so every worker sees the same view and garbage collection can
+keep total disk use bounded:
+
+- unreferenced artifacts expire after a TTL
+- when the store grows past its size budget, the least recently used
+  artifacts are removed (unreferenced ones first)
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+# Artifacts used this recently are never evicted, so in-progress downloads survive GC
+EVICTION_GRACE = timedelta(minutes=5)
+ACCESS_TOUCH_INTERVAL = timedelta(minutes=1)
+
+
+class LocalArtifactBackend:
+    """Stores artifacts as files in a directory"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        return str(path) if path.exists() else None
+
+    async def put(self, key: str, source_path: str) -> int:
+        path = self._path(key)
+        tmp_path = path.with_name(f"{key}.tmp.{os.getpid()}")
+        await asyncio.to_thread(shutil.copyfile, source_path, tmp_path)
+        os.replace(tmp_path, path)
+        return path.stat().st_size
+
+    async def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    async def stream(self, key: str) -> AsyncIterator[bytes]:
+        with open(self._path(key), 'rb') as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def delete(self, key: str):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class GridFSArtifactBackend:
+    """Stores artifacts in a GridFS bucket shared by all backend hosts"""
+
+    def __init__(self, database, bucket_name: str = "artifacts"):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    async def put(self, key: str, source_path: str) -> int:
+        with open(source_path, 'rb') as f:
+            file_id = await self.bucket.upload_from_stream(key, f)
+        # Drop older uploads of the same key
+        async for old in self.bucket.find({"filename": key, "_id": {"$ne": file_id}}):
+            await self.bucket.delete(old["_id"])
+        return os.path.getsize(source_path)
+
+    async def exists(self, key: str) -> bool:
+        async for _ in self.bucket.find({"filename": key}, limit=1):
+            return True
+        return False
+
+    async def stream(self, key: str) -> AsyncIterator[bytes]:
+        download = await self.bucket.open_download_stream_by_name(key)
+        while True:
+            chunk = await download.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    async def delete(self, key: str):
+        async for old in self.bucket.find({"filename": key}):
+            await self.bucket.delete(old["_id"])
+
+
+class ArtifactStore:
+    """Artifact backend plus a MongoDB registry of metadata and references"""
+
+    def __init__(self, collection, backend, max_bytes: int, ttl: timedelta):
+        self.collection = collection
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.collected = 0
+        self.freed_bytes = 0
+
+    async def put(
+        self,
+        key: str,
+        source_path: str,
+        kind: str,
+        content_type: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Store a file under key (replacing any previous content) and register it"""
+        size = await self.backend.put(key, source_path)
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"key": key},
+            {
+                "$set": {
+                    "kind": kind,
+                    "size": size,
+                    "content_type": content_type,
+                    "metadata": metadata or {},
+                    "last_access": now
+                },
+                "$setOnInsert": {"key": key, "refs": [], "created_at": now}
+            },
+            upsert=True
+        )
+        return key
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Registry entry of a stored artifact, or None if it is gone"""
+        entry = await self.collection.find_one({"key": key})
+        if not entry:
+            return None
+        if not await self.backend.exists(key):
+            await self.collection.delete_one({"key": key})
+            return None
+        now = datetime.utcnow()
+        if now - entry["last_access"] > ACCESS_TOUCH_INTERVAL:
+            await self.collection.update_one({"key": key}, {"$set": {"last_access": now}})
+        return entry
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of the artifact if the backend keeps one"""
+        return self.backend.local_path(key)
+
+    def stream(self, key: str) -> AsyncIterator[bytes]:
+        return self.backend.stream(key)
+
+    async def retain(self, owner: str, key: str):
+        """Make key the artifact referenced by owner, releasing its previous one"""
+        await self.collection.update_many(
+            {"refs": owner, "key": {"$ne": key}},
+            {"$pull": {"refs": owner}}
+        )
+        await self.collection.update_one({"key": key}, {"$addToSet": {"refs": owner}})
+
+    async def release(self, owners: Iterable[str]):
+        """Drop every reference held by the given owners"""
+        owners = list(owners)
+        if owners:
+            await self.collection.update_many(
+                {"refs": {"$in": owners}},
+                {"$pull": {"refs": {"$in": owners}}}
+            )
+
+    async def _delete(self, entry: Dict[str, Any]):
+        await self.backend.delete(entry["key"])
+        await self.collection.delete_one({"key": entry["key"]})
+        self.collected += 1
+        self.freed_bytes += entry.get("size", 0)
+
+    async def collect_garbage(self) -> Dict[str, int]:
+        """Expire unreferenced artifacts past their TTL, then evict LRU down to the size budget"""
+        now = datetime.utcnow()
+        deleted = freed = 0
+
+        expired = self.collection.find({"refs": {"$size": 0}, "last_access": {"$lt": now - self.ttl}})
+        async for entry in expired:
+            await self._delete(entry)
+            deleted += 1
+            freed += entry.get("size", 0)
+
+        totals = await self.collection.aggregate([
+            {"$group": {"_id": None, "size": {"$sum": "$size"}}}
+        ]).to_list(1)
+        total = totals[0]["size"] if totals else 0
+        if total > self.max_bytes:
+            # Unreferenced artifacts go first; referenced ones can always be rebuilt
+            candidates = self.collection.aggregate([
+                {"$match": {"last_access": {"$lt": now - EVICTION_GRACE}}},
+                {"$addFields": {"referenced": {"$gt": [{"$size": "$refs"}, 0]}}},
+                {"$sort": {"referenced": 1, "last_access": 1}}
+            ])
+            async for entry in candidates:
+                if total <= self.max_bytes:
+                    break
+                await self._delete(entry)
+                total -= entry.get("size", 0)
+                deleted += 1
+                freed += entry.get("size", 0)
+
+        if deleted:
+            logger.info(f"Artifact GC removed {deleted} artifacts ({freed} bytes)")
+        return {"deleted": deleted, "freed_bytes": freed}
+
+    async def stats(self) -> Dict[str, Any]:
+        totals = await self.collection.aggregate([
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "size": {"$sum": "$size"},
+                "referenced": {"$sum": {"$cond": [{"$gt": [{"$size": "$refs"}, 0]}, 1, 0]}}
+            }}
+        ]).to_list(1)
+        totals = totals[0] if totals else {"count": 0, "size": 0, "referenced": 0}
+        return {
+            "backend": type(self.backend).__name__,
+            "artifacts": totals["count"],
+            "referenced": totals["referenced"],
+            "size_bytes": totals["size"],
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": int(self.ttl.total_seconds()),
+            "collected": self.collected,
+            "freed_bytes": self.freed_bytes,
+        }
@@ -0,0 +1,223 @@
+"""Content-addressed storage for file and version text.
+
+Every distinct text is stored once, keyed by its sha256, and compressed
+(zlib, or zstd when the zstandard package is installed). Files and version
+snapshots hold a reference to the blob of their content; storing a text that
+already exists only increments its reference count, so storage and write
+volume grow with unique content. Blobs whose count drops to zero are removed
+by garbage collection.
+
+Reference counts are changed with single-document atomic updates, so a put
+racing a garbage collection either revives the blob before it is deleted or
+finds it gone and inserts it again.
+"""
+
+import asyncio
+import hashlib
+import logging
+import zlib
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson.binary import Binary
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODECS = ("zstd", "zlib", "none")
+# Texts this small are not worth compressing
+MIN_COMPRESS_BYTES = 256
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    return data
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+class BlobStore:
+    """Deduplicated, compressed text blobs with reference counts"""
+
+    def __init__(self, collection, codec: str = "zlib", cache_bytes: int = 32 * 1024 * 1024):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown blob codec: {codec}")
+        if codec == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, compressing blobs with zlib")
+            codec = "zlib"
+        self.collection = collection
+        self.codec = codec
+        # Blobs never change, so decoded texts can be cached without invalidation
+        self.cache: "OrderedDict[str, str]" = OrderedDict()
+        self.cache_bytes = cache_bytes
+        self.cached_bytes = 0
+        self.written = 0
+        self.deduplicated = 0
+        self.collected = 0
+
+    def _remember(self, key: str, text: str):
+        if key in self.cache or len(text) > self.cache_bytes:
+            return
+        self.cache[key] = text
+        self.cached_bytes += len(text)
+        while self.cached_bytes > self.cache_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= len(evicted)
+
+    def _encode(self, text: str) -> Dict[str, Any]:
+        data = text.encode('utf-8')
+        codec = self.codec if len(data) >= MIN_COMPRESS_BYTES else "none"
+        payload = compress(data, codec)
+        if len(payload) >= len(data):
+            codec, payload = "none", data
+        return {"codec": codec, "size": len(data), "stored_size": len(payload), "data": Binary(payload)}
+
+    async def put(self, text: str, refs: int = 1) -> str:
+        """Store text (or reference the existing copy) and return its hash"""
+        key = content_hash(text)
+        if await self._add_refs(key, refs):
+            self.deduplicated += 1
+            return key
+        document = await asyncio.to_thread(self._encode, text)
+        try:
+            await self.collection.insert_one({
+                "hash": key, "refs": refs, "created_at": datetime.utcnow(), **document
+            })
+            self.written += 1
+        except DuplicateKeyError:
+            # Inserted concurrently; count our references on that copy
+            await self._add_refs(key, refs)
+            self.deduplicated += 1
+        self._remember(key, text)
+        return key
+
+    async def put_many(self, texts: List[str]) -> List[str]:
+        """
+        Store several texts with a fixed number of round trips (not one per
+        text); returns their hashes in the same order
+        """
+        keys = await asyncio.to_thread(lambda: [content_hash(text) for text in texts])
+        counts = Counter(keys)
+        existing = set(await self.collection.distinct("hash", {"hash": {"$in": list(counts)}}))
+        if existing:
+            result = await self.collection.bulk_write(
+                [UpdateOne({"hash": key}, {"$inc": {"refs": counts[key]}}) for key in existing], ordered=False
+            )
+            if result.matched_count < len(existing):
+                # Collected before our update reached them; insert those again
+                existing &= set(await self.collection.distinct("hash", {"hash": {"$in": list(existing)}}))
+            self.deduplicated += len(existing)
+        new = {key: text for key, text in zip(keys, texts) if key not in existing}
+        if new:
+            now = datetime.utcnow()
+            documents = await asyncio.to_thread(lambda: [
+                {"hash": key, "refs": counts[key], "created_at": now, **self._encode(text)}
+                for key, text in new.items()
+            ])
+            try:
+                await self.collection.insert_many(documents, ordered=False)
+                self.written += len(documents)
+            except BulkWriteError as e:
+                # Some were inserted concurrently; count our references on those copies
+                duplicates = [documents[error["index"]]["hash"] for error in e.details["writeErrors"]]
+                for key in duplicates:
+                    await self._add_refs(key, counts[key])
+                self.written += len(documents) - len(duplicates)
+                self.deduplicated += len(duplicates)
+            for key, text in new.items():
+                self._remember(key, text)
+        return keys
+
+    async def _add_refs(self, key: str, count: int) -> bool:
+        result = await self.collection.update_one({"hash": key}, {"$inc": {"refs": count}})
+        return result.matched_count > 0
+
+    async def retain(self, key: str, count: int = 1):
+        """Add references to an existing blob"""
+        if not await self._add_refs(key, count):
+            raise KeyError(f"Blob {key} does not exist")
+
+    async def release(self, keys: Iterable[Optional[str]]):
+        """Drop one reference per listed hash (a hash may be listed several times)"""
+        for key, count in Counter(k for k in keys if k).items():
+            await self.collection.update_one({"hash": key}, {"$inc": {"refs": -count}})
+
+    async def get(self, key: str) -> Optional[str]:
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys: Iterable[Optional[str]]) -> Dict[str, str]:
+        """Texts by hash; unknown hashes are left out"""
+        texts = {}
+        missing = []
+        for key in set(k for k in keys if k):
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                texts[key] = self.cache[key]
+            else:
+                missing.append(key)
+        if missing:
+            cursor = self.collection.find({"hash": {"$in": missing}}, {"_id": 0, "hash": 1, "codec": 1, "data": 1})
+            async for blob in cursor:
+                data = await asyncio.to_thread(decompress, bytes(blob["data"]), blob["codec"])
+                texts[blob["hash"]] = data.decode('utf-8')
+                self._remember(blob["hash"], texts[blob["hash"]])
+        return texts
+
+    async def collect_garbage(self) -> Dict[str, int]:
+        """Delete blobs nothing references any more"""
+        deleted = freed = 0
+        async for blob in self.collection.find({"refs": {"$lte": 0}}, {"_id": 0, "hash": 1, "stored_size": 1}):
+            # Only delete if still unreferenced (a concurrent put may have revived it)
+            result = await self.collection.delete_one({"hash": blob["hash"], "refs": {"$lte": 0}})
+            if result.deleted_count:
+                deleted += 1
+                freed += blob.get("stored_size", 0)
+        self.collected += deleted
+        if deleted:
+            logger.info(f"Blob GC removed {deleted} blobs ({freed} bytes)")
+        return {"deleted": deleted, "freed_bytes": freed}
+
+    async def stats(self) -> Dict[str, Any]:
+        totals = await self.collection.aggregate([
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "size": {"$sum": "$size"},
+                "stored_size": {"$sum": "$stored_size"},
+                "refs": {"$sum": "$refs"}
+            }}
+        ]).to_list(1)
+        totals = totals[0] if totals else {"count": 0, "size": 0, "stored_size": 0, "refs": 0}
+        return {
+            "codec": self.codec,
+            "blobs": totals["count"],
+            "references": totals["refs"],
+            "size_bytes": totals["size"],
+            "stored_bytes": totals["stored_size"],
+            "written": self.written,
+            "deduplicated": self.deduplicated,
+            "collected": self.collected,
+            "cached_bytes": self.cached_bytes,
+        }
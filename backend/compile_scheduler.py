@@ -0,0 +1,159 @@
+"""Bounded worker pool for LaTeX compilations.
+
+Every TeX run goes through a CompileScheduler so that a burst of requests
+cannot fork an unbounded number of engine processes. Jobs wait in a bounded
+priority queue; interactive compiles (a user waiting on a PDF) are picked
+before batch compiles (uploads, background rebuilds). When the queue is full
+new jobs are rejected immediately instead of piling up.
+
+SingleFlight coalesces identical compiles that are already in flight so that
+concurrent requests for the same content share one TeX process.
+"""
+
+import asyncio
+import itertools
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class CompileQueueFullError(Exception):
+    """Raised when the compile queue cannot take another job"""
+
+    def __init__(self, retry_after: int = 5):
+        super().__init__("Compile queue is full, try again later")
+        self.retry_after = retry_after
+
+
+class CompileSchedulerClosedError(Exception):
+    """Raised when a job is submitted while the scheduler is shutting down"""
+
+    def __init__(self):
+        super().__init__("Compile scheduler is not accepting jobs")
+
+
+class CompileScheduler:
+    """Fixed-size pool of async workers pulling from a bounded priority queue"""
+
+    def __init__(self, workers: Optional[int] = None, max_queue: int = 100):
+        self.worker_count = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+        self._closed = False
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Spawn the worker tasks on the running event loop"""
+        if self._workers:
+            return
+        self._closed = False
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"compile-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    async def stop(self):
+        """Stop accepting jobs, cancel workers and fail anything still queued"""
+        self._closed = True
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while self._queue is not None and not self._queue.empty():
+            _, _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(CompileSchedulerClosedError())
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, job: Callable[[], Awaitable[Any]], priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """Queue a compile job and wait for its result"""
+        if self._closed:
+            raise CompileSchedulerClosedError()
+        self.start()
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise CompileQueueFullError()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._sequence), job, future))
+        return await future
+
+    async def _worker(self):
+        while True:
+            _, _, job, future = await self._queue.get()
+            try:
+                if future.done():
+                    # The waiter went away (e.g. client disconnected)
+                    continue
+                self.running += 1
+                try:
+                    result = await job()
+                except asyncio.CancelledError:
+                    if not future.done():
+                        future.set_exception(CompileSchedulerClosedError())
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.completed += 1
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.running -= 1
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters reported by the compile stats endpoint"""
+        return {
+            "workers": self.worker_count,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+class SingleFlight:
+    """Share one in-flight call between all callers using the same key"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.deduplicated = 0
+
+    def _finished(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away
+            task.exception()
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run call() for key, or wait for the identical call already running"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+        else:
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        # A waiter giving up must not cancel the compile for everyone else
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._inflight), "deduplicated": self.deduplicated}
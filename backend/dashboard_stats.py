@@ -0,0 +1,185 @@
+"""Materialized dashboard counters.
+
+Instead of counting and grouping the whole library on every dashboard load,
+the backend keeps running totals in the stats_counters collection, one
+document per scope ("global", "year:<id>", "semester:<id>", "subject:<id>"):
+
+    {"_id": "subject:<id>", "files": 12, "words": 8400, "bytes": 51200,
+     "status": {"success": 10, "error": 1, "pending": 1}}
+
+Every write that adds, removes or changes a file applies the difference with
+one bulk `$inc`, so the counters are exact without ever rescanning. Reads go
+through a snapshot cached for a few seconds. `rebuild` recomputes everything
+from tex_files (at first start, or to repair drift after manual edits).
+"""
+
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+GLOBAL_SCOPE = "global"
+# File fields the counters depend on
+COUNTER_PROJECTION = {
+    "_id": 0, "subject_id": 1, "semester_id": 1, "word_count": 1, "file_size": 1, "compilation_status": 1
+}
+DEFAULT_TTL = 5.0
+
+
+def scope_key(kind: str, scope_id: str) -> str:
+    return f"{kind}:{scope_id}"
+
+
+def file_increments(file: Dict[str, Any], sign: int) -> Dict[str, int]:
+    """Counter changes for adding (sign=1) or removing (sign=-1) one file"""
+    return {
+        "files": sign,
+        "words": sign * (file.get("word_count") or 0),
+        "bytes": sign * (file.get("file_size") or 0),
+        f"status.{file.get('compilation_status') or 'unknown'}": sign,
+    }
+
+
+class DashboardStats:
+    """Per-scope file counters, maintained on write and read from a short-lived cache"""
+
+    def __init__(self, db, ttl: float = DEFAULT_TTL):
+        self.db = db
+        self.collection = db.stats_counters
+        self.ttl = ttl
+        self._semester_years: Dict[str, Optional[str]] = {}
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0
+
+    def invalidate(self):
+        self._snapshot = None
+
+    async def _year_of(self, semester_id: Optional[str]) -> Optional[str]:
+        if not semester_id:
+            return None
+        if semester_id not in self._semester_years:
+            semester = await self.db.semesters.find_one({"id": semester_id}, {"_id": 0, "year_id": 1})
+            self._semester_years[semester_id] = semester.get("year_id") if semester else None
+        return self._semester_years[semester_id]
+
+    async def _scopes(self, file: Dict[str, Any]) -> List[str]:
+        scopes = [GLOBAL_SCOPE]
+        if file.get("subject_id"):
+            scopes.append(scope_key("subject", file["subject_id"]))
+        if file.get("semester_id"):
+            scopes.append(scope_key("semester", file["semester_id"]))
+            year_id = await self._year_of(file["semester_id"])
+            if year_id:
+                scopes.append(scope_key("year", year_id))
+        return scopes
+
+    async def _increment(self, increments: Dict[str, Dict[str, int]]):
+        operations = []
+        for scope, fields in increments.items():
+            fields = {field: n for field, n in fields.items() if n}
+            if fields:
+                operations.append(UpdateOne({"_id": scope}, {"$inc": fields}, upsert=True))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+        self.invalidate()
+
+    async def apply(self, changes: Iterable[Tuple[Dict[str, Any], int]]):
+        """Count files in (sign=1) or out (sign=-1); files need COUNTER_PROJECTION's fields"""
+        increments: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for file, sign in changes:
+            if not file:
+                continue
+            for scope in await self._scopes(file):
+                for field, n in file_increments(file, sign).items():
+                    increments[scope][field] += n
+        await self._increment(increments)
+
+    async def files_added(self, files: Iterable[Dict[str, Any]]):
+        await self.apply((file, 1) for file in files)
+
+    async def files_removed(self, files: Iterable[Dict[str, Any]]):
+        await self.apply((file, -1) for file in files)
+
+    async def file_changed(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]):
+        await self.apply([(before, -1), (after, 1)])
+
+    async def count(self, kind: str, n: int):
+        """Track the number of years, semesters or subjects"""
+        await self._increment({GLOBAL_SCOPE: {kind: n}})
+
+    async def drop_scope(self, kind: str, scope_id: str):
+        """Forget the counters of a deleted year, semester or subject"""
+        await self.collection.delete_one({"_id": scope_key(kind, scope_id)})
+        self._semester_years.pop(scope_id, None)
+        self.invalidate()
+
+    async def move_semester(self, semester_id: str, old_year_id: Optional[str], new_year_id: Optional[str]):
+        """Carry a semester's totals over when it is assigned to another year"""
+        self._semester_years[semester_id] = new_year_id
+        counters = await self.collection.find_one({"_id": scope_key("semester", semester_id)})
+        if not counters or old_year_id == new_year_id:
+            return
+        fields = {"files": counters.get("files", 0), "words": counters.get("words", 0), "bytes": counters.get("bytes", 0)}
+        fields.update({f"status.{s}": n for s, n in counters.get("status", {}).items()})
+        increments = {}
+        if old_year_id:
+            increments[scope_key("year", old_year_id)] = {field: -n for field, n in fields.items()}
+        if new_year_id:
+            increments[scope_key("year", new_year_id)] = fields
+        await self._increment(increments)
+
+    async def rebuild(self) -> int:
+        """Recompute every counter from the collections; returns the number of scopes"""
+        self._semester_years = {
+            s["id"]: s.get("year_id")
+            async for s in self.db.semesters.find({}, {"_id": 0, "id": 1, "year_id": 1})
+        }
+        groups = await self.db.tex_files.aggregate([
+            {"$group": {
+                "_id": {"subject_id": "$subject_id", "semester_id": "$semester_id", "status": "$compilation_status"},
+                "files": {"$sum": 1},
+                "words": {"$sum": "$word_count"},
+                "bytes": {"$sum": "$file_size"}
+            }}
+        ]).to_list(None)
+        documents: Dict[str, Dict[str, Any]] = {}
+        for group in groups:
+            file = {"subject_id": group["_id"].get("subject_id"), "semester_id": group["_id"].get("semester_id")}
+            status = group["_id"].get("status") or "unknown"
+            for scope in await self._scopes(file):
+                document = documents.setdefault(scope, {"_id": scope, "files": 0, "words": 0, "bytes": 0, "status": {}})
+                for field in ("files", "words", "bytes"):
+                    document[field] += group[field]
+                document["status"][status] = document["status"].get(status, 0) + group["files"]
+        totals = documents.setdefault(
+            GLOBAL_SCOPE, {"_id": GLOBAL_SCOPE, "files": 0, "words": 0, "bytes": 0, "status": {}}
+        )
+        for kind in ("years", "semesters", "subjects"):
+            totals[kind] = await self.db[kind].count_documents({})
+        await self.collection.delete_many({})
+        await self.collection.insert_many(list(documents.values()))
+        self.invalidate()
+        return len(documents)
+
+    async def ensure(self):
+        """Build the counters if they have never been computed"""
+        if not await self.collection.find_one({"_id": GLOBAL_SCOPE}):
+            await self.rebuild()
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Totals and per-scope breakdowns, at most ttl seconds old"""
+        if self._snapshot is not None and time.monotonic() - self._snapshot_at < self.ttl:
+            return self._snapshot
+        snapshot: Dict[str, Any] = {"totals": {}, "by_year": {}, "by_semester": {}, "by_subject": {}}
+        async for document in self.collection.find({}):
+            scope = document.pop("_id")
+            document["status"] = {status: n for status, n in document.get("status", {}).items() if n}
+            if scope == GLOBAL_SCOPE:
+                snapshot["totals"] = document
+            elif document.get("files"):
+                # Scopes without files are left out of the breakdowns
+                kind, scope_id = scope.split(":", 1)
+                snapshot[f"by_{kind}"][scope_id] = document
+        self._snapshot, self._snapshot_at = snapshot, time.monotonic()
+        return snapshot
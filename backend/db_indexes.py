@@ -0,0 +1,194 @@
+"""Declared MongoDB indexes and query plan checks.
+
+Every collection the backend queries lists the indexes its lookups need.
+IndexManager.ensure creates them at startup; creating an index that already
+exists with the same definition is a no-op, so this is safe on every start.
+IndexManager.explain runs the hot queries through `explain` and flags any
+that would still fall back to a collection scan.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Stands in for ids in explained queries; plans don't depend on the value
+SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "years": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("year", DESCENDING)]),
+    ],
+    "semesters": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("year_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "subjects": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("semester_id", ASCENDING)]),
+    ],
+    "terms": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "tex_files": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Listing filters plus the keyset order of file listings
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("subject_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("semester_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("tags", ASCENDING)]),
+        IndexModel([("updated_at", DESCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("name", ASCENDING)], sparse=True),
+    ],
+    "file_versions": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("file_id", ASCENDING), ("sequence", ASCENDING)], unique=True),
+    ],
+    "blobs": [
+        IndexModel([("hash", ASCENDING)], unique=True),
+        IndexModel([("refs", ASCENDING)]),
+    ],
+    "compile_jobs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "projects": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("subject_id", ASCENDING)]),
+    ],
+    "project_assets": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("project_id", ASCENDING), ("path", ASCENDING)], unique=True),
+    ],
+    "artifacts": [
+        IndexModel([("key", ASCENDING)], unique=True),
+        IndexModel([("refs", ASCENDING)]),
+        IndexModel([("last_access", ASCENDING)]),
+    ],
+}
+
+# Lookups on the request path, as (name, collection, filter, sort)
+HOT_QUERIES = [
+    ("year by id", "years", {"id": SAMPLE_ID}, None),
+    ("years by year", "years", {}, [("year", DESCENDING)]),
+    ("semester by id", "semesters", {"id": SAMPLE_ID}, None),
+    ("semesters of a year", "semesters", {"year_id": SAMPLE_ID}, [("created_at", DESCENDING)]),
+    ("subject by id", "subjects", {"id": SAMPLE_ID}, None),
+    ("subjects of a semester", "subjects", {"semester_id": SAMPLE_ID}, None),
+    ("file by id", "tex_files", {"id": SAMPLE_ID}, None),
+    ("files page", "tex_files", {}, [("created_at", ASCENDING), ("id", ASCENDING)]),
+    ("files by name page", "tex_files", {}, [("name", ASCENDING), ("id", ASCENDING)]),
+    ("files of a subject", "tex_files", {"subject_id": SAMPLE_ID}, [("created_at", ASCENDING), ("id", ASCENDING)]),
+    ("files of a semester", "tex_files", {"semester_id": SAMPLE_ID}, [("created_at", ASCENDING), ("id", ASCENDING)]),
+    ("files by tag", "tex_files", {"tags": {"$in": ["homework"]}}, None),
+    ("recent files", "tex_files", {}, [("updated_at", DESCENDING)]),
+    ("project file by path", "tex_files", {"project_id": SAMPLE_ID, "name": "main.tex"}, None),
+    ("file versions", "file_versions", {"file_id": SAMPLE_ID}, [("sequence", DESCENDING)]),
+    ("blob by hash", "blobs", {"hash": "0" * 64}, None),
+    ("compile job by id", "compile_jobs", {"id": SAMPLE_ID}, None),
+    ("queued compile jobs", "compile_jobs", {"status": "queued"}, None),
+    ("project by id", "projects", {"id": SAMPLE_ID}, None),
+    ("project asset by path", "project_assets", {"project_id": SAMPLE_ID, "path": "figure.png"}, None),
+    ("artifact by key", "artifacts", {"key": "0" * 64 + ".pdf"}, None),
+]
+
+
+def index_key(index: IndexModel) -> tuple:
+    return tuple(index.document["key"].items())
+
+
+def plan_stages(plan: Any) -> List[str]:
+    """Every stage name in an explain plan tree, outermost first"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages += plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages += plan_stages(item)
+    return stages
+
+
+def plan_indexes(plan: Any) -> List[str]:
+    names = []
+    if isinstance(plan, dict):
+        if "indexName" in plan:
+            names.append(plan["indexName"])
+        for value in plan.values():
+            names += plan_indexes(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            names += plan_indexes(item)
+    return names
+
+
+class IndexManager:
+    """Creates the declared indexes and checks that hot queries use them"""
+
+    def __init__(self, db, indexes: Optional[Dict[str, List[IndexModel]]] = None, hot_queries=None):
+        self.db = db
+        self.indexes = indexes if indexes is not None else REQUIRED_INDEXES
+        self.hot_queries = hot_queries if hot_queries is not None else HOT_QUERIES
+        self.failed: Dict[str, str] = {}
+
+    async def ensure(self) -> Dict[str, List[str]]:
+        """Create missing indexes; returns the index names per collection"""
+        created = {}
+        self.failed = {}
+        for collection, indexes in self.indexes.items():
+            try:
+                created[collection] = await self.db[collection].create_indexes(indexes)
+            except OperationFailure:
+                # Typically an existing index with other options, or duplicates under a unique key;
+                # create the rest one by one so a single conflict doesn't block them
+                created[collection] = []
+                for index in indexes:
+                    try:
+                        created[collection] += await self.db[collection].create_indexes([index])
+                    except OperationFailure as e:
+                        name = index.document["name"]
+                        self.failed[f"{collection}.{name}"] = str(e)
+                        logger.warning(f"Could not create index {collection}.{name}: {e}")
+        return created
+
+    async def status(self) -> Dict[str, Any]:
+        """Declared indexes that exist, are missing, or failed to build"""
+        collections = {}
+        for collection, indexes in self.indexes.items():
+            existing = await self.db[collection].index_information()
+            existing_keys = {tuple(info["key"]) for info in existing.values()}
+            declared = [index.document["name"] for index in indexes]
+            missing = [index.document["name"] for index in indexes if index_key(index) not in existing_keys]
+            collections[collection] = {"declared": declared, "missing": missing, "existing": sorted(existing)}
+        return {"collections": collections, "failed": self.failed}
+
+    async def explain(self, queries: Optional[Iterable] = None) -> List[Dict[str, Any]]:
+        """Query plan summary of each hot query, flagging collection scans"""
+        report = []
+        for name, collection, query, sort in (queries or self.hot_queries):
+            entry = {"query": name, "collection": collection}
+            try:
+                cursor = self.db[collection].find(query)
+                if sort:
+                    cursor = cursor.sort(sort)
+                explained = await cursor.explain()
+                winning = explained.get("queryPlanner", {}).get("winningPlan", {})
+                stages = plan_stages(winning)
+                entry.update({
+                    "stages": stages,
+                    "indexes": plan_indexes(winning),
+                    "collscan": "COLLSCAN" in stages,
+                    # A blocking in-memory sort also means an index is missing or unusable
+                    "in_memory_sort": "SORT" in stages,
+                })
+            except Exception as e:
+                entry["error"] = str(e)
+            report.append(entry)
+        return report
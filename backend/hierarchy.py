@@ -0,0 +1,120 @@
+"""Year → Semester → Subject → file tree in one aggregation.
+
+tree_pipeline runs over the years collection and nests semesters, subjects
+and file summaries with $lookup (localField/foreignField joins on the indexed
+id fields), attaching every node's totals from the stats_counters documents
+maintained by dashboard_stats. File summaries are only joined for expanded
+subjects, so a collapsed tree costs a lookup per year, semester and subject
+no matter how many files there are. Needs MongoDB 5.0+ ($lookup combining
+localField with a pipeline).
+"""
+
+from typing import Any, Dict, Iterable, List
+
+TREE_DEPTHS = ("years", "semesters", "subjects", "files")
+EMPTY_COUNTS = {"files": 0, "words": 0, "bytes": 0, "status": {}}
+
+
+def counters_lookup(kind: str) -> List[Dict[str, Any]]:
+    """Stages that attach a node's counters as `counts`"""
+    return [
+        {"$set": {"counter_key": {"$concat": [f"{kind}:", "$id"]}}},
+        {"$lookup": {
+            "from": "stats_counters",
+            "localField": "counter_key",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"_id": 0}}],
+            "as": "counts"
+        }},
+        {"$set": {"counts": {"$ifNull": [{"$first": "$counts"}, EMPTY_COUNTS]}}},
+    ]
+
+
+def tree_pipeline(depth: str, expand: Iterable[str], file_projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Aggregation over years down to file summaries. Files are joined for every
+    subject when depth is "files", otherwise only below the expanded ids
+    (year, semester or subject ids).
+    """
+    expand = list(expand)
+    if depth == "files":
+        expanded: Any = True
+    else:
+        expanded = {"$or": [
+            {"$in": ["$id", expand]},
+            {"$in": ["$semester_id", expand]},
+            {"$in": ["$$year_id", expand]},
+        ]}
+    subjects = [
+        {"$sort": {"name": 1}},
+        *counters_lookup("subject"),
+        # Collapsed subjects join on a missing key, which matches no file with a subject
+        {"$set": {"file_key": {"$cond": [expanded, "$id", "$$REMOVE"]}}},
+        {"$lookup": {
+            "from": "tex_files",
+            "localField": "file_key",
+            "foreignField": "subject_id",
+            "pipeline": [
+                {"$match": {"subject_id": {"$type": "string"}}},
+                {"$sort": {"created_at": 1, "id": 1}},
+                {"$project": file_projection},
+            ],
+            "as": "files"
+        }},
+        {"$project": {"_id": 0, "counter_key": 0, "file_key": 0}},
+    ]
+    semesters = [
+        {"$sort": {"created_at": -1}},
+        *counters_lookup("semester"),
+        {"$lookup": {
+            "from": "subjects",
+            "localField": "id",
+            "foreignField": "semester_id",
+            "let": {"year_id": "$year_id"},
+            "pipeline": subjects,
+            "as": "subjects"
+        }},
+        {"$project": {"_id": 0, "counter_key": 0}},
+    ]
+    return [
+        {"$sort": {"year": -1}},
+        *counters_lookup("year"),
+        {"$lookup": {
+            "from": "semesters",
+            "localField": "id",
+            "foreignField": "year_id",
+            "pipeline": semesters,
+            "as": "semesters"
+        }},
+        {"$project": {"_id": 0, "counter_key": 0}},
+    ]
+
+
+def shape_tree(years: List[Dict[str, Any]], depth: str, expand: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Cut the aggregated tree down to the requested depth, keeping expanded
+    branches whole (and the path down to them), and add child counts to
+    every node
+    """
+    expand = set(expand)
+    level = TREE_DEPTHS.index(depth)
+    for year in years:
+        year_open = year["id"] in expand
+        semesters = year.pop("semesters", [])
+        year["semester_count"] = len(semesters)
+        leads_to_expanded = False
+        for semester in semesters:
+            semester_open = year_open or semester["id"] in expand
+            subjects = semester.pop("subjects", [])
+            semester["subject_count"] = len(subjects)
+            if level >= 2 or semester_open or any(subject["id"] in expand for subject in subjects):
+                semester["subjects"] = subjects
+                leads_to_expanded = leads_to_expanded or level < 2
+            for subject in subjects:
+                files = subject.pop("files", [])
+                subject["file_count"] = subject["counts"].get("files", 0)
+                if level >= 3 or semester_open or subject["id"] in expand:
+                    subject["files"] = files
+        if level >= 1 or year_open or leads_to_expanded:
+            year["semesters"] = semesters
+    return years
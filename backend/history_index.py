@@ -0,0 +1,167 @@
+"""Index of file contents across their version history ("time travel" search).
+
+Instead of indexing every version, the index records when each content term
+(a field:term key, using the search index's fields) appears in and disappears
+from a file: for every key and file, a list of [from, until) sequence ranges.
+Adding a version only diffs its terms against the terms of the previous one,
+so its cost depends on what changed, and a query intersects the ranges of its
+terms without reading any history.
+
+Words and prefixed terms (math:, env:, label:, cmd:) work as in the full-text
+search; quoted phrases match versions that contain all of their words.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from latex_tokenizer import scan
+from search_index import CONTENT_FIELDS, parse_query, read_saved, write_saved
+
+FORMAT_VERSION = 1
+
+# [from, until) sequence ranges; until is None while the term is in the newest version
+Ranges = List[List[Optional[int]]]
+
+
+def history_key(field: str, term: str) -> str:
+    return f"{field}:{term}"
+
+
+def analysis_keys(fields: Dict[str, List[str]]) -> Set[str]:
+    """Keys of a version from the search index's analysis of the same content"""
+    return {history_key(field, term) for field in CONTENT_FIELDS for term in fields.get(field, ())}
+
+
+def version_keys(content: str) -> Set[str]:
+    return {history_key(token.field, token.term) for token in scan(content)}
+
+
+def intersect(a: Ranges, b: Ranges) -> Ranges:
+    """Overlap of two sorted, disjoint range lists"""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end_a, end_b = a[i][1], b[j][1]
+        end = end_b if end_a is None else end_a if end_b is None else min(end_a, end_b)
+        if end is None or start < end:
+            result.append([start, end])
+        # Move past whichever range ends first
+        if end_b is None or (end_a is not None and end_a <= end_b):
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+class HistoryIndex:
+    """Term presence ranges per file over version sequences, optionally saved to a file"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.ranges: Dict[str, Dict[str, Ranges]] = {}  # key -> file id -> ranges
+        self.heads: Dict[str, int] = {}  # file id -> newest indexed sequence
+        self.file_keys: Dict[str, Set[str]] = {}  # file id -> every key it ever had
+        self.dirty = False
+        self.ready = False  # set once the startup catch-up has finished
+
+    def __len__(self) -> int:
+        return len(self.heads)
+
+    def _current_keys(self, file_id: str) -> Set[str]:
+        return {key for key in self.file_keys.get(file_id, ()) if self.ranges[key][file_id][-1][1] is None}
+
+    def apply(self, file_id: str, sequence: int, keys: Set[str]) -> bool:
+        """
+        Record version sequence of a file from its keys. Versions must come in
+        order: returns False (and changes nothing) if earlier ones are missing.
+        """
+        head = self.heads.get(file_id, 0)
+        if sequence <= head:
+            return True
+        if sequence != head + 1:
+            return False
+        current = self._current_keys(file_id)
+        for key in keys - current:
+            self.ranges.setdefault(key, {}).setdefault(file_id, []).append([sequence, None])
+        for key in current - keys:
+            self.ranges[key][file_id][-1][1] = sequence
+        self.file_keys.setdefault(file_id, set()).update(keys)
+        self.heads[file_id] = sequence
+        self.dirty = True
+        return True
+
+    def remove(self, file_id: str):
+        for key in self.file_keys.pop(file_id, ()):
+            files = self.ranges.get(key)
+            if files is not None:
+                files.pop(file_id, None)
+                if not files:
+                    del self.ranges[key]
+        if self.heads.pop(file_id, None) is not None:
+            self.dirty = True
+
+    def search(self, query: str, file_ids: Optional[Iterable[str]] = None) -> Dict[str, List[List[int]]]:
+        """
+        Files (all, or of file_ids) with versions matching every word and
+        phrase of the query, as inclusive [first, last] sequence ranges
+        """
+        matches: Optional[Dict[str, Ranges]] = None
+        if file_ids is not None:
+            matches = {file_id: [[1, None]] for file_id in file_ids}
+        for fields, terms in parse_query(query):
+            # Only contents have a history (not names, tags or notes)
+            field = next((f for f in fields if f in CONTENT_FIELDS), None)
+            if field is None:
+                return {}
+            for term in terms:
+                files = self.ranges.get(history_key(field, term), {})
+                if matches is None:
+                    matches = dict(files)
+                else:
+                    matches = {
+                        file_id: overlap for file_id, ranges in matches.items()
+                        if file_id in files and (overlap := intersect(ranges, files[file_id]))
+                    }
+                if not matches:
+                    return {}
+        return {
+            file_id: [[start, self.heads[file_id] if until is None else until - 1] for start, until in ranges]
+            for file_id, ranges in (matches or {}).items()
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.heads),
+            "versions": sum(self.heads.values()),
+            "keys": len(self.ranges),
+            "ranges": sum(len(r) for files in self.ranges.values() for r in files.values()),
+            "ready": self.ready,
+        }
+
+    # Persistence
+    def serialize(self) -> bytes:
+        """Saved form of the index (call on the thread that mutates it)"""
+        return json.dumps({
+            "version": FORMAT_VERSION,
+            "ranges": self.ranges,
+            "heads": self.heads,
+        }, separators=(',', ':')).encode('utf-8')
+
+    def write(self, data: bytes):
+        write_saved(self.path, data)
+
+    def load(self) -> bool:
+        """Restore the saved index; False if there is none or it is outdated"""
+        data = read_saved(self.path)
+        if data is None or data.get("version") != FORMAT_VERSION:
+            return False
+        self.ranges = data["ranges"]
+        self.heads = data["heads"]
+        self.file_keys = {}
+        for key, files in self.ranges.items():
+            for file_id in files:
+                self.file_keys.setdefault(file_id, set()).add(key)
+        self.dirty = False
+        return True
@@ -0,0 +1,231 @@
+"""Incremental LaTeX builds in persistent per-file build directories.
+
+A full build keeps its auxiliary files (.aux, .toc, .bbl, ...) between
+compiles, so the next compile of the same file starts with resolved
+cross-references and usually needs a single pass. Like latexmk, the engine
+is rerun only until the auxiliary files stop changing, and bibtex/biber run
+only when the set of citations or bibliography sources changed.
+"""
+
+import asyncio
+import glob
+import hashlib
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# Files whose content decides whether another pass is needed
+AUX_EXTENSIONS = ('.aux', '.toc', '.lof', '.lot', '.out', '.nav', '.snm')
+# Files worth carrying into a throwaway preview build
+PREVIEW_SEED_EXTENSIONS = ('.aux', '.toc', '.lof', '.lot', '.out', '.bbl')
+CITATION_LINE = re.compile(r'^\\(citation|bibdata|bibstyle|abx@aux@cite)\b.*$', re.MULTILINE)
+CITATION_STATE_FILE = '.citation-state'
+
+
+async def run_process(argv: List[str], cwd: str, env: Optional[Dict[str, str]] = None) -> Tuple[int, str]:
+    """Run a command and return (returncode, combined output); kills it if cancelled"""
+    process = await asyncio.create_subprocess_exec(
+        *argv,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        env=env
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        # Don't leave an orphaned TeX process behind on shutdown
+        if process.returncode is None:
+            process.kill()
+        raise
+    output = stdout.decode('utf-8', errors='replace') + stderr.decode('utf-8', errors='replace')
+    return process.returncode, output
+
+
+def _digest_files(paths) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode('utf-8'))
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(b'<missing>')
+    return digest.hexdigest()
+
+
+def aux_state(workdir: str, jobname: str) -> str:
+    """Fingerprint of the auxiliary files a pass reads back"""
+    return _digest_files(
+        os.path.join(workdir, jobname + ext) for ext in AUX_EXTENSIONS
+        if os.path.exists(os.path.join(workdir, jobname + ext))
+    )
+
+
+def bibliography_tool(workdir: str, jobname: str) -> Optional[str]:
+    """"biber" for biblatex documents, "bibtex" for \\bibliography, else None"""
+    if os.path.exists(os.path.join(workdir, jobname + '.bcf')):
+        return "biber"
+    try:
+        with open(os.path.join(workdir, jobname + '.aux'), encoding='utf-8', errors='replace') as f:
+            if '\\bibdata' in f.read():
+                return "bibtex"
+    except OSError:
+        pass
+    return None
+
+
+def citation_state(workdir: str, jobname: str, tool: str) -> str:
+    """Fingerprint of the citations and bibliography sources"""
+    digest = hashlib.sha256()
+    if tool == "biber":
+        digest.update(_digest_files([os.path.join(workdir, jobname + '.bcf')]).encode())
+    else:
+        try:
+            with open(os.path.join(workdir, jobname + '.aux'), encoding='utf-8', errors='replace') as f:
+                digest.update("\n".join(m.group(0) for m in CITATION_LINE.finditer(f.read())).encode('utf-8'))
+        except OSError:
+            pass
+    digest.update(_digest_files(glob.glob(os.path.join(workdir, '*.bib'))).encode())
+    return digest.hexdigest()
+
+
+def needs_bibliography(state: str, previous: Optional[str], has_bbl: bool) -> bool:
+    """bibtex/biber runs when the citations or sources changed since its last run, or there is no .bbl"""
+    return state != previous or not has_bbl
+
+
+def needs_another_pass(aux_before: str, aux_after: str, bibliography_ran: bool, rerun_requested: bool) -> bool:
+    """
+    The engine runs again after a fresh .bbl, when the aux files changed
+    during the pass, or when the log asks for a rerun
+    """
+    return bibliography_ran or aux_after != aux_before or rerun_requested
+
+
+async def build(
+    engine,
+    filename: str,
+    workdir: str,
+    mode: str,
+    engine_args: List[str],
+    env: Optional[Dict[str, str]] = None,
+    max_passes: Optional[int] = None
+) -> Tuple[int, str]:
+    """
+    Run the engine (and bibtex/biber when citations changed) until the aux files settle
+    Returns: (returncode of the last run, combined output of all runs)
+    """
+    jobname = os.path.basename(filename)
+    jobname = jobname[:-4] if jobname.endswith('.tex') else jobname
+    passes = max_passes or engine.max_passes
+    outputs = []
+    before = aux_state(workdir, jobname)
+    returncode = 0
+
+    for _ in range(passes):
+        returncode, output = await run_process(
+            engine.command_line(filename, workdir, mode, engine_args), workdir, env
+        )
+        outputs.append(output)
+        if returncode != 0:
+            break
+
+        rerun = False
+        tool = bibliography_tool(workdir, jobname) if engine.runs_bibliography else None
+        if tool:
+            state_path = os.path.join(workdir, CITATION_STATE_FILE)
+            state = citation_state(workdir, jobname, tool)
+            try:
+                previous = Path(state_path).read_text()
+            except OSError:
+                previous = None
+            if needs_bibliography(state, previous, os.path.exists(os.path.join(workdir, jobname + '.bbl'))):
+                bib_code, bib_output = await run_process([tool, jobname], workdir, env)
+                outputs.append(bib_output)
+                if bib_code == 0:
+                    Path(state_path).write_text(state)
+                    rerun = True
+
+        after = aux_state(workdir, jobname)
+        if not needs_another_pass(before, after, rerun, engine.needs_rerun(output)):
+            break
+        before = after
+
+    return returncode, "\n".join(outputs)
+
+
+class BuildDirectories:
+    """Persistent build directories, one per (file, engine)"""
+
+    def __init__(self, root: Path, ttl_days: float = 7):
+        self.root = Path(root)
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, build_id: str, engine_name: str) -> Path:
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', build_id)
+        return self.root / f"{safe_id}-{engine_name}"
+
+    async def acquire(self, build_id: str, engine_name: str):
+        """Lock a build directory against concurrent builds (also across processes)"""
+        path = self.path(build_id, engine_name)
+        path.mkdir(parents=True, exist_ok=True)
+        lock = self._locks.setdefault(str(path), asyncio.Lock())
+        await lock.acquire()
+        handle = None
+        try:
+            if fcntl is not None:
+                handle = open(path / '.lock', 'w')
+                await asyncio.to_thread(fcntl.flock, handle, fcntl.LOCK_EX)
+        except BaseException:
+            if handle is not None:
+                handle.close()
+            lock.release()
+            raise
+        os.utime(path)
+        return path, (lock, handle)
+
+    def release(self, token):
+        lock, handle = token
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+        lock.release()
+
+    def seed(self, build_id: str, engine_name: str, target_dir: str, jobname: str):
+        """Copy the aux files of a previous full build into another directory"""
+        path = self.path(build_id, engine_name)
+        for ext in PREVIEW_SEED_EXTENSIONS:
+            source = path / (jobname + ext)
+            if source.exists():
+                shutil.copyfile(source, os.path.join(target_dir, jobname + ext))
+
+    def remove(self, build_id: str):
+        """Drop every build directory of a file"""
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', build_id)
+        for path in self.root.glob(f"{safe_id}-*"):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def collect_garbage(self) -> int:
+        """Remove build directories that have not been used for ttl_days"""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for path in self.root.iterdir():
+            lock = self._locks.get(str(path))
+            if lock is not None and lock.locked():
+                continue
+            if path.is_dir() and path.stat().st_mtime < cutoff:
+                self._locks.pop(str(path), None)
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
@@ -0,0 +1,94 @@
+"""Dependency graph of multi-file LaTeX projects.
+
+Files of a project reference each other with \\input, \\include, \\subfile,
+\\includegraphics and \\bibliography/\\addbibresource. Paths are resolved the
+way TeX does it for a document compiled from the project root: relative to
+the workspace root, with the usual default extensions.
+"""
+
+import posixpath
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+COMMENT = re.compile(r'(?<!\\)%.*')
+INPUT_COMMAND = re.compile(r'\\(input|include|subfile)\s*\{([^}]+)\}')
+GRAPHICS_COMMAND = re.compile(r'\\includegraphics\s*(?:\[[^\]]*\])?\s*\{([^}]+)\}')
+BIBLIOGRAPHY_COMMAND = re.compile(r'\\(bibliography|addbibresource)\s*(?:\[[^\]]*\])?\s*\{([^}]+)\}')
+DOCUMENTCLASS = re.compile(r'^[^%\n]*\\documentclass', re.MULTILINE)
+
+GRAPHICS_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.eps', '.svg')
+
+
+def normalize_path(path: str) -> Optional[str]:
+    """Clean a project-relative path; None if it escapes the project"""
+    path = path.strip().strip('"').replace('\\', '/')
+    if not path or path.startswith('/'):
+        return None
+    path = posixpath.normpath(path)
+    if path == '.' or path.startswith('../') or path == '..':
+        return None
+    return path
+
+
+def is_root_document(content: str) -> bool:
+    """Whether a file is a compilable root (has a \\documentclass)"""
+    return bool(DOCUMENTCLASS.search(content))
+
+
+def parse_references(content: str) -> List[Tuple[str, str]]:
+    """(kind, target) for every file reference; kind is "tex", "graphics" or "bib" """
+    text = COMMENT.sub('', content)
+    references = [("tex", m.group(2)) for m in INPUT_COMMAND.finditer(text)]
+    references += [("graphics", m.group(1)) for m in GRAPHICS_COMMAND.finditer(text)]
+    for m in BIBLIOGRAPHY_COMMAND.finditer(text):
+        for target in m.group(2).split(','):
+            references.append(("bib", target))
+    return references
+
+
+def candidate_paths(kind: str, target: str) -> List[str]:
+    """Paths TeX would try for a reference, most specific first"""
+    path = normalize_path(target)
+    if path is None:
+        return []
+    if kind == "tex":
+        return [path] if path.endswith('.tex') else [path + '.tex', path]
+    if kind == "bib":
+        return [path] if path.endswith('.bib') else [path + '.bib']
+    if posixpath.splitext(path)[1].lower() in GRAPHICS_EXTENSIONS:
+        return [path]
+    return [path + ext for ext in GRAPHICS_EXTENSIONS] + [path]
+
+
+def resolve_dependencies(content: str, available: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Resolve a file's references against the paths that exist in the project
+    Returns: (resolved_paths, unresolved_targets)
+    """
+    available = set(available)
+    resolved, missing = [], []
+    for kind, target in parse_references(content):
+        match = next((p for p in candidate_paths(kind, target) if p in available), None)
+        if match is None:
+            missing.append(target.strip())
+        elif match not in resolved:
+            resolved.append(match)
+    return resolved, missing
+
+
+def dependency_closure(graph: Dict[str, List[str]], start: str) -> Set[str]:
+    """Every path reachable from start (excluding start itself)"""
+    seen: Set[str] = set()
+    stack = list(graph.get(start, []))
+    while stack:
+        path = stack.pop()
+        if path in seen or path == start:
+            continue
+        seen.add(path)
+        stack.extend(graph.get(path, []))
+    return seen
+
+
+def dependent_roots(graph: Dict[str, List[str]], roots: Iterable[str], changed: str) -> List[str]:
+    """Roots whose build includes the changed path (a changed root counts itself)"""
+    return [root for root in roots if root == changed or changed in dependency_closure(graph, root)]
@@ -0,0 +1,86 @@
+"""TeX engines the compile pipeline can run.
+
+Each engine knows how to build its command line for a full build or for a
+quick preview. A preview is a single draft pass (graphics are replaced by
+boxes, no reruns); a full build reruns the engine until cross-references
+settle (see latex_build.build).
+"""
+
+import os
+import re
+import shutil
+from typing import Dict, List
+
+MODE_FULL = "full"
+MODE_PREVIEW = "preview"
+COMPILE_MODES = (MODE_FULL, MODE_PREVIEW)
+
+DEFAULT_ENGINE = "xelatex"
+# Run before the document in preview passes (and dumped into preview formats)
+DRAFT_OPTIONS = '\\PassOptionsToPackage{draft}{graphicx}'
+RERUN_PATTERN = re.compile(
+    r'Rerun to get|Label\(s\) may have changed|Rerun LaTeX'
+)
+
+
+class TexEngine:
+    """A LaTeX-style engine driven with the usual -output-directory options"""
+
+    max_passes = 5
+    runs_bibliography = True
+
+    def __init__(self, name: str, supports_formats: bool = True):
+        self.name = name
+        self.command = name
+        # mylatexformat formats are only reliable for the pdfTeX/XeTeX family
+        self.supports_formats = supports_formats
+
+    def available(self) -> bool:
+        return shutil.which(self.command) is not None
+
+    def command_line(self, filename: str, output_dir: str, mode: str, extra_args: List[str]) -> List[str]:
+        """argv for one pass over filename (relative to output_dir)"""
+        args = [self.command, '-interaction=nonstopmode', *extra_args, '-output-directory', output_dir]
+        if mode == MODE_PREVIEW:
+            jobname = os.path.basename(filename)
+            jobname = jobname[:-4] if jobname.endswith('.tex') else jobname
+            return args + [
+                f'-jobname={jobname}',
+                DRAFT_OPTIONS + '\\input{"' + filename + '"}'
+            ]
+        return args + [filename]
+
+    def needs_rerun(self, output: str) -> bool:
+        return bool(RERUN_PATTERN.search(output))
+
+
+class TectonicEngine(TexEngine):
+    """Tectonic reruns itself (and bibtex) internally, so one invocation is a full build"""
+
+    max_passes = 1
+    runs_bibliography = False
+
+    def __init__(self):
+        super().__init__("tectonic", supports_formats=False)
+
+    def command_line(self, filename: str, output_dir: str, mode: str, extra_args: List[str]) -> List[str]:
+        args = [self.command, '--outdir', output_dir, '--keep-logs', *extra_args]
+        if mode == MODE_PREVIEW:
+            args += ['--reruns', '0']
+        return args + [filename]
+
+    def needs_rerun(self, output: str) -> bool:
+        return False
+
+
+def discover_engines() -> Dict[str, TexEngine]:
+    """Known engines; tectonic is only offered when it is installed"""
+    engines = {
+        "xelatex": TexEngine("xelatex"),
+        "pdflatex": TexEngine("pdflatex"),
+        "lualatex": TexEngine("lualatex", supports_formats=False),
+    }
+    tectonic = TectonicEngine()
+    if tectonic.available():
+        engines[tectonic.name] = tectonic
+    return engines
@@ -0,0 +1,171 @@
+"""LaTeX-aware tokenizer for search and word counts.
+
+A single pass over the source sorts what it sees into fields:
+
+    prose         words of the running text (also inside \\textbf{...}, \\section{...})
+    commands      command names, without the backslash
+    environments  names of \\begin{...} environments
+    labels        \\label keys
+    math          words and command names inside $...$, \\(...\\), \\[...\\]
+                  and math environments
+
+Comments are skipped, and so are the arguments of commands whose arguments
+are keys or paths rather than text (\\ref, \\cite, \\usepackage, ...), so
+searching "frac" or "amsmath" doesn't hit every document that uses them.
+Every token keeps its character offsets in the source. section_titles pulls
+out the plain-text titles of \\chapter/\\section/... headings.
+"""
+
+import re
+from collections import defaultdict
+from typing import Dict, Iterator, List, NamedTuple
+
+FIELDS = ("prose", "commands", "environments", "labels", "math")
+
+# Letters and digits, with inner apostrophes (don't); underscores and other punctuation separate words
+WORD_RE = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+LEXEME_RE = re.compile(
+    r"%[^\n]*"                                       # comment
+    r"|\\(begin|end)\s*\{([^}]*)\}"                  # environment boundary
+    r"|\\label\s*\{([^}]*)\}"                        # label
+    r"|(\$\$?|\\[(\[)\]])"                           # math delimiter
+    r"|\\([a-zA-Z@]+)\*?"                            # command
+    r"|\\."                                          # escaped character or \\
+    r"|(" + WORD_RE.pattern + r")"                   # word
+)
+SECTION_RE = re.compile(
+    r"\\(?:part|chapter|section|subsection|subsubsection|paragraph)\*?\s*(?:\[[^\]]*\])?\s*\{"
+)
+COMMENT_RE = re.compile(r"(?<!\\)%.*")
+COMMAND_RE = re.compile(r"\\[a-zA-Z@]+\*?\s*|[{}$]")
+MATH_TERM_RE = re.compile(r"\\([a-zA-Z@]+)|(" + WORD_RE.pattern + r")")
+
+MATH_ENVIRONMENTS = {
+    "equation", "align", "alignat", "flalign", "gather", "multline", "eqnarray",
+    "math", "displaymath",
+}
+# Commands whose arguments are keys, paths or code rather than text
+SKIPPED_ARGUMENTS = {
+    "ref", "eqref", "pageref", "autoref", "cref", "Cref", "nameref",
+    "cite", "citep", "citet", "citeauthor", "citeyear", "nocite", "parencite", "textcite", "autocite",
+    "usepackage", "RequirePackage", "documentclass", "input", "include", "subfile", "includegraphics",
+    "bibliography", "bibliographystyle", "addbibresource", "url", "hypersetup", "setlength",
+    "newcommand", "renewcommand", "providecommand", "DeclareMathOperator", "newenvironment",
+    "renewenvironment", "newtheorem", "definecolor", "color", "textcolor", "hspace", "vspace",
+}
+MATH_CLOSERS = {"$": "$", "$$": "$$", "\\(": "\\)", "\\[": "\\]"}
+
+
+class Token(NamedTuple):
+    field: str
+    term: str
+    start: int  # character offsets in the source
+    end: int
+
+
+def words(text: str) -> List[str]:
+    """Lowercased words of plain text (names, tags, notes, queries)"""
+    return WORD_RE.findall(text.lower())
+
+
+def math_terms(text: str) -> List[str]:
+    """Lowercased math tokens of a snippet of math source (x^2 + \\alpha -> x, 2, alpha)"""
+    return [(command or word).lower() for command, word in MATH_TERM_RE.findall(text)]
+
+
+def environment_name(name: str) -> str:
+    return name.strip().rstrip('*').lower()
+
+
+def label_key(key: str) -> str:
+    return key.strip().lower()
+
+
+def skip_arguments(source: str, pos: int) -> int:
+    """Position after the [optional] and {mandatory} arguments starting at pos"""
+    length = len(source)
+    while True:
+        start = pos
+        while pos < length and source[pos] in ' \t':
+            pos += 1
+        if pos >= length or source[pos] not in '[{':
+            return start
+        opener = source[pos]
+        closer = ']' if opener == '[' else '}'
+        depth = 0
+        while pos < length:
+            char = source[pos]
+            if char == '\\':
+                pos += 1
+            elif char == opener:
+                depth += 1
+            elif char == closer:
+                depth -= 1
+                if depth == 0:
+                    break
+            pos += 1
+        pos += 1
+
+
+def section_titles(source: str) -> List[str]:
+    """Titles of the sectioning commands, in order, with markup removed"""
+    titles = []
+    source = COMMENT_RE.sub('', source)
+    for match in SECTION_RE.finditer(source):
+        # The opening brace is part of the match; skip_arguments wants to start on it
+        end = skip_arguments(source, match.end() - 1)
+        title = ' '.join(COMMAND_RE.sub(' ', source[match.end():end - 1]).split())
+        if title:
+            titles.append(title)
+    return titles
+
+
+def scan(source: str) -> Iterator[Token]:
+    """Tokens of a LaTeX source in order of appearance"""
+    math_closer = None  # closing delimiter (or "end:<env>") while in math mode
+    pos = 0
+    while True:
+        match = LEXEME_RE.search(source, pos)
+        if not match:
+            return
+        pos = match.end()
+        boundary, environment, label, delimiter, command, word = match.groups()
+        if boundary:
+            name = environment_name(environment)
+            if boundary == "begin":
+                yield Token("environments", name, match.start(2), match.end(2))
+                if math_closer is None and name in MATH_ENVIRONMENTS:
+                    math_closer = "end:" + name
+            elif math_closer == "end:" + name:
+                math_closer = None
+        elif label is not None:
+            key = label_key(label)
+            if key:
+                yield Token("labels", key, match.start(3), match.end(3))
+        elif delimiter:
+            if math_closer is None:
+                if delimiter in MATH_CLOSERS:
+                    math_closer = MATH_CLOSERS[delimiter]
+            elif delimiter == math_closer:
+                math_closer = None
+        elif command:
+            yield Token("commands", command.lower(), match.start(5), match.end(5))
+            if math_closer is not None:
+                yield Token("math", command.lower(), match.start(5), match.end(5))
+            if command in SKIPPED_ARGUMENTS:
+                pos = skip_arguments(source, pos)
+        elif word:
+            yield Token("math" if math_closer is not None else "prose", word.lower(), match.start(6), match.end(6))
+
+
+def tokenize_latex(source: str) -> Dict[str, List[str]]:
+    """Terms of each field (see FIELDS), in order of appearance"""
+    fields: Dict[str, List[str]] = defaultdict(list)
+    for token in scan(source):
+        fields[token.field].append(token.term)
+    return {field: fields[field] for field in FIELDS}
+
+
+def count_words(source: str) -> int:
+    """Words of running text, leaving out commands, math, comments and keys"""
+    return sum(1 for token in scan(source) if token.field == "prose")
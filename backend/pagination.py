@@ -0,0 +1,80 @@
+"""Keyset (cursor) pagination for file listings.
+
+Pages are ordered by a sort field plus the file id as tie-breaker, so the
+order is total and stable. A cursor is the opaque encoding of the sort key of
+the last item on a page; the next page starts strictly after it. Unlike skip
+offsets, every page costs one index range scan no matter how deep it is, and
+items inserted or deleted meanwhile never shift a page boundary.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Sortable fields; both are immutable or rarely change, so cursors stay valid
+SORT_FIELDS = ("created_at", "name")
+# Order of ranked search results: score descending, then id
+RELEVANCE = "relevance"
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def sort_spec(sort: str) -> List[Tuple[str, int]]:
+    if sort not in SORT_FIELDS:
+        raise InvalidCursorError(f"Unknown sort '{sort}', expected one of: {', '.join(SORT_FIELDS)}")
+    return [(sort, 1), ("id", 1)]
+
+
+def page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def encode_cursor(sort: str, item: Dict[str, Any]) -> str:
+    value = item[sort]
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = json.dumps({"s": sort, "v": value, "id": item["id"]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(sort: str, cursor: str) -> Tuple[Any, str]:
+    """(sort value, id) of the item a cursor points at"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value = payload["v"]
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["$date"])
+        if payload["s"] != sort:
+            raise InvalidCursorError("Cursor was issued for a different sort order")
+        return value, payload["id"]
+    except InvalidCursorError:
+        raise
+    except Exception:
+        raise InvalidCursorError("Malformed cursor")
+
+
+def after_cursor(query: Dict[str, Any], sort: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict a Mongo query to the items after the cursor"""
+    if not cursor:
+        return query
+    value, item_id = decode_cursor(sort, cursor)
+    keyset = {"$or": [{sort: {"$gt": value}}, {sort: value, "id": {"$gt": item_id}}]}
+    return {"$and": [query, keyset]} if query else keyset
+
+
+def after_ranked(hits: List[Tuple[str, float]], cursor: Optional[str]) -> List[Tuple[str, float]]:
+    """The (id, score) hits ranked after the cursor; hits are sorted by score desc, id asc"""
+    if not cursor:
+        return hits
+    score, item_id = decode_cursor(RELEVANCE, cursor)
+    if not isinstance(score, (int, float)):
+        raise InvalidCursorError("Malformed cursor")
+    return [(i, s) for i, s in hits if s < score or (s == score and i > item_id)]
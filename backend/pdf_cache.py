@@ -0,0 +1,67 @@
+"""Content-addressed cache for compiled PDF artifacts.
+
+Compiled PDFs are stored in the artifact store under a key derived from the
+LaTeX source, the file name and the TeX engine, so identical inputs never
+have to be compiled twice. Size limits and eviction are handled by the
+artifact store's garbage collection.
+"""
+
+import hashlib
+from typing import Dict, Optional, Tuple
+
+from artifact_store import ArtifactStore
+
+
+def pdf_cache_key(
+    content: str,
+    filename: str,
+    engine: str = "xelatex",
+    mode: str = "full",
+    files: Optional[Dict[str, bytes]] = None
+) -> str:
+    """Build the cache key for a compile input (files: other workspace files by path)"""
+    digest = hashlib.sha256()
+    for part in (engine, mode, filename, content):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    for path in sorted(files or {}):
+        digest.update(path.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(hashlib.sha256(files[path]).digest())
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """Looks up and stores compiled PDFs in the artifact store"""
+
+    def __init__(self, artifacts: ArtifactStore):
+        self.artifacts = artifacts
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def artifact_key(key: str) -> str:
+        return f"{key}.pdf"
+
+    async def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """Return (artifact_key, compile_output) for a cached key, or None"""
+        entry = await self.artifacts.get(self.artifact_key(key))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["key"], entry.get("metadata", {}).get("output", "")
+
+    async def put(self, key: str, pdf_source: str, output: str = "") -> str:
+        """Store a freshly compiled PDF and return its artifact key"""
+        return await self.artifacts.put(
+            self.artifact_key(key),
+            pdf_source,
+            kind="pdf",
+            content_type="application/pdf",
+            metadata={"output": output}
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Counters reported by the cache stats endpoint"""
+        return {"hits": self.hits, "misses": self.misses}
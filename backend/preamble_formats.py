@@ -0,0 +1,166 @@
+"""Precompiled preamble formats (mylatexformat) for faster TeX runs.
+
+Most documents spend the bulk of a compile loading the same heavy packages.
+FormatCache dumps the preamble of a document into a TeX format file once,
+keyed by a hash of the engine and the preamble text, and later compiles of
+any document sharing that preamble load the format instead of the packages.
+
+Packages that set up native fonts (fontspec, unicode-math, polyglossia)
+cannot be dumped into a format, so the dump stops just before the first of
+them using mylatexformat's endofdump marker; the rest of the preamble is
+run normally on every compile.
+
+Preview passes get formats of their own: graphicx is loaded while the format
+is dumped, so its draft option has to be passed then, not when the format is
+used.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from latex_engines import DRAFT_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+BEGIN_DOCUMENT = re.compile(r'^[^%\n]*\\begin\s*\{document\}', re.MULTILINE)
+DOCUMENTCLASS = re.compile(r'^[^%\n]*\\documentclass', re.MULTILINE)
+# Preamble lines that cannot be stored in a format
+UNDUMPABLE = re.compile(
+    r'^[^%\n]*(\\usepackage\s*(\[[^\]]*\])?\s*\{[^}]*\b(fontspec|unicode-math|polyglossia)\b'
+    r'|\\set(main|sans|mono|math)font|\\newfontfamily)',
+    re.MULTILINE
+)
+ENDOFDUMP = '\\csname endofdump\\endcsname\n'
+
+
+def split_preamble(content: str) -> Optional[Tuple[str, str]]:
+    """
+    Split a document into the part that can be dumped into a format and the rest
+    Returns: (dumpable_preamble, remainder) or None if the document has no preamble
+    """
+    if not DOCUMENTCLASS.search(content):
+        return None
+    begin = BEGIN_DOCUMENT.search(content)
+    if not begin:
+        return None
+    preamble_end = begin.start()
+    undumpable = UNDUMPABLE.search(content, 0, preamble_end)
+    cut = undumpable.start() if undumpable else preamble_end
+    dumpable = content[:cut]
+    if not dumpable.strip():
+        return None
+    return dumpable, content[cut:]
+
+
+class FormatCache:
+    """Builds and caches one format file per (engine, preamble, draft) combination"""
+
+    def __init__(self, directory: Path, max_formats: int = 50):
+        self.directory = Path(directory)
+        self.max_formats = max_formats
+        self.hits = 0
+        self.builds = 0
+        self.failures = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._failed: set = set()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def format_name(engine: str, dumpable: str, draft: bool = False) -> str:
+        digest = hashlib.sha256(f"{engine}\0{dumpable}".encode('utf-8')).hexdigest()
+        return f"{engine}-{'draft-' if draft else ''}{digest[:32]}"
+
+    def _fmt_path(self, name: str) -> Path:
+        return self.directory / f"{name}.fmt"
+
+    async def prepare(
+        self, engine: str, content: str, draft: bool = False
+    ) -> Optional[Tuple[str, List[str], Dict[str, str]]]:
+        """
+        Get a format for this document's preamble, building it on first use
+        (draft: for preview passes, with graphics in draft mode)
+        Returns: (content_to_compile, extra_engine_args, extra_env) or None to compile normally
+        """
+        split = split_preamble(content)
+        if split is None:
+            return None
+        dumpable, remainder = split
+        name = self.format_name(engine, dumpable, draft)
+        if name in self._failed:
+            return None
+
+        fmt_path = self._fmt_path(name)
+        if fmt_path.exists():
+            self.hits += 1
+            os.utime(fmt_path)
+        else:
+            lock = self._locks.setdefault(name, asyncio.Lock())
+            async with lock:
+                if not fmt_path.exists() and not await self._build(engine, name, dumpable, draft):
+                    self._failed.add(name)
+                    return None
+            self._locks.pop(name, None)
+
+        prepared = dumpable + ENDOFDUMP + remainder
+        env = {"TEXFORMATS": f"{self.directory}{os.pathsep}"}
+        return prepared, [f"-fmt={name}"], env
+
+    async def _build(self, engine: str, name: str, dumpable: str, draft: bool = False) -> bool:
+        """Dump the preamble into <name>.fmt with mylatexformat"""
+        with tempfile.TemporaryDirectory() as build_dir:
+            source = os.path.join(build_dir, "preamble.tex")
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write((DRAFT_OPTIONS + '\n' if draft else '') + dumpable + ENDOFDUMP + "\\begin{document}\\end{document}\n")
+            process = await asyncio.create_subprocess_exec(
+                engine,
+                '-ini',
+                '-interaction=nonstopmode',
+                f'-jobname={name}',
+                f'&{engine}',
+                'mylatexformat.ltx',
+                source,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=build_dir
+            )
+            try:
+                stdout, _ = await process.communicate()
+            except asyncio.CancelledError:
+                process.kill()
+                raise
+            built = os.path.join(build_dir, f"{name}.fmt")
+            if process.returncode != 0 or not os.path.exists(built):
+                self.failures += 1
+                tail = stdout.decode('utf-8', errors='replace')[-500:]
+                logger.warning(f"Preamble format build failed for {name}: {tail}")
+                return False
+            tmp_path = self._fmt_path(name).with_suffix(".fmt.tmp")
+            shutil.copyfile(built, tmp_path)
+            os.replace(tmp_path, self._fmt_path(name))
+        self.builds += 1
+        self._evict()
+        return True
+
+    def _evict(self):
+        """Keep at most max_formats format files, dropping the least recently used"""
+        formats = sorted(self.directory.glob("*.fmt"), key=lambda p: p.stat().st_mtime)
+        for fmt in formats[:max(0, len(formats) - self.max_formats)]:
+            try:
+                fmt.unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "builds": self.builds,
+            "failures": self.failures,
+            "formats": len(list(self.directory.glob("*.fmt"))),
+        }
@@ -0,0 +1,442 @@
+"""Full-text search index over file names, contents, notes and tags.
+
+File contents live compressed in the blob store, where MongoDB text indexes
+can't see them, so the backend keeps a positional inverted index in memory:
+for every field, term -> {file id: [token positions]}. It is updated on every
+write and saved to disk, so a restart only re-reads the files whose content
+or metadata changed meanwhile.
+
+File contents go through the LaTeX tokenizer, so prose, math, command,
+environment and label tokens are separate fields. Queries are words plus
+"quoted phrases"; every word and phrase has to occur in at least one of the
+text fields (name, tags, notes, prose), or in the field a prefix selects:
+math:"x^2", env:theorem, label:eq:euler, cmd:frac.
+
+Content tokens also keep their character offsets, so highlighted snippets of
+a hit are cut straight from the matched positions, and the index keeps each
+file's subject, semester, tags and compile status for facet counts (and its
+name and section titles, which feed the autocomplete suggestions).
+
+Hits are ranked with BM25, summed over the fields with field weights (a match
+in the name counts more than one in the body). A query only touches the
+postings of its own terms, so its cost depends on how common the terms are
+rather than on the size of the library.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from latex_tokenizer import (
+    FIELDS as CONTENT_FIELDS, environment_name, label_key, math_terms, scan, section_titles, words
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the analysis or the saved layout changes; older saved indexes are rebuilt
+FORMAT_VERSION = 4
+FIELD_WEIGHTS = {
+    "name": 3.0, "tags": 2.0, "notes": 1.0, "prose": 1.0,
+    "math": 1.0, "commands": 1.0, "environments": 1.0, "labels": 1.0,
+}
+# Fields searched by terms without a prefix
+TEXT_FIELDS = ("name", "tags", "notes", "prose")
+# Fields that don't come from the content
+METADATA_FIELDS = ("name", "tags", "notes")
+# Query prefix -> (field, how the value becomes terms)
+PREFIXES = {
+    "math": ("math", math_terms),
+    "env": ("environments", lambda value: [environment_name(value)]),
+    "label": ("labels", lambda value: [label_key(value)]),
+    "cmd": ("commands", lambda value: [value.strip().lstrip('\\').lower()]),
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPETS_PER_HIT = 2
+SNIPPET_WIDTH = 160  # characters
+FACETS = ("subject_id", "semester_id", "tags", "compilation_status")
+
+QUERY_RE = re.compile(r'(?:([a-z]+):)?(?:"([^"]*)"?|(\S+))')
+
+Postings = Dict[str, Dict[str, List[int]]]
+# Same-length replacements, so offsets stay valid
+WHITESPACE = str.maketrans('\n\r\t', '   ')
+
+
+class Analysis(NamedTuple):
+    fields: Dict[str, List[str]]  # tokens of every indexed field
+    offsets: Dict[str, List[int]]  # start, end of every content token, flattened
+    metadata: Dict[str, Any]  # see file_metadata
+
+
+def analyze(file: Dict[str, Any]) -> Analysis:
+    """Everything the index keeps for a file document (which needs its content)"""
+    fields = metadata_fields(file)
+    offsets: Dict[str, List[int]] = {}
+    for field in CONTENT_FIELDS:
+        fields[field], offsets[field] = [], []
+    for token in scan(file.get("content") or ""):
+        fields[token.field].append(token.term)
+        offsets[token.field] += (token.start, token.end)
+    return Analysis(fields, offsets, file_metadata(file))
+
+
+def metadata_fields(file: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Tokens of the fields that don't come from the content"""
+    return {
+        "name": words(file.get("name") or ""),
+        "tags": words(" ".join(file.get("tags") or [])),
+        "notes": words(file.get("notes") or ""),
+    }
+
+
+def parse_query(query: str) -> List[Tuple[Tuple[str, ...], List[str]]]:
+    """
+    Clauses of a query as (fields, terms); clauses of several terms are
+    phrases ("quoted", or words that tokenize to several terms like x-ray)
+    """
+    clauses = []
+    for prefix, phrase, word in QUERY_RE.findall(query):
+        value = phrase or word
+        if prefix in PREFIXES:
+            field, terms = PREFIXES[prefix]
+            clause = ((field,), [term for term in terms(value) if term])
+        else:
+            # Not a field prefix (a word with a colon like "ratio:1")
+            clause = (TEXT_FIELDS, words(f"{prefix}:{value}" if prefix else value))
+        if clause[1]:
+            clauses.append(clause)
+    return clauses
+
+
+def file_signature(file: Dict[str, Any]) -> str:
+    """Changes whenever anything the index holds for a file changes"""
+    parts = [file.get("content_hash") or "", file.get("name") or "", file.get("notes") or ""]
+    parts += sorted(file.get("tags") or [])
+    return hashlib.sha1("\0".join(parts).encode('utf-8')).hexdigest()
+
+
+def file_metadata(file: Dict[str, Any]) -> Dict[str, Any]:
+    """What the index keeps per file besides postings (to filter hits and count facets)"""
+    return {
+        "signature": file_signature(file),
+        "name": file.get("name"),
+        "sections": section_titles(file.get("content") or ""),
+        "subject_id": file.get("subject_id"),
+        "semester_id": file.get("semester_id"),
+        "tags": file.get("tags") or [],
+        "compilation_status": file.get("compilation_status"),
+    }
+
+
+def phrase_starts(positions: List[List[int]]) -> List[int]:
+    """Where consecutive terms occur, given each term's positions in one field"""
+    following = [set(p) for p in positions[1:]]
+    return [
+        start for start in positions[0]
+        if all(start + offset in later for offset, later in enumerate(following, start=1))
+    ]
+
+
+def make_snippets(
+    content: str,
+    spans: Iterable[Tuple[int, int]],
+    count: int = SNIPPETS_PER_HIT,
+    width: int = SNIPPET_WIDTH
+) -> List[Dict[str, Any]]:
+    """
+    Up to count excerpts of content around the matched character spans, the
+    ones with the most matches first, as {"text", "highlights": [[start, end]]}
+    with highlights relative to the text
+    """
+    windows: List[List[Any]] = []  # [start, end, spans]
+    for start, end in sorted(set(spans)):
+        if windows and end - windows[-1][0] <= width:
+            window = windows[-1]
+            if start < window[1]:
+                # Overlaps the previous span (a phrase inside a phrase)
+                window[2][-1] = (window[2][-1][0], max(window[2][-1][1], end))
+            else:
+                window[2].append((start, end))
+            window[1] = max(window[1], end)
+        else:
+            windows.append([start, end, [(start, end)]])
+    best = sorted(windows, key=lambda window: -len(window[2]))[:count]
+    snippets = []
+    for start, end, window_spans in sorted(best):
+        pad = max(0, width - (end - start)) // 2
+        low, high = max(0, start - pad), min(len(content), end + pad)
+        # Don't cut words in half
+        if low > 0:
+            space = content.find(' ', low, start)
+            low = space + 1 if space >= 0 else low
+        if high < len(content):
+            space = content.rfind(' ', end, high)
+            high = space if space >= 0 else high
+        prefix = '…' if low > 0 else ''
+        text = prefix + content[low:high].translate(WHITESPACE) + ('…' if high < len(content) else '')
+        shift = len(prefix) - low
+        snippets.append({"text": text, "highlights": [[s + shift, e + shift] for s, e in window_spans]})
+    return snippets
+
+
+def write_saved(path: Path, data: bytes):
+    """Atomically replace a saved index with serialized (JSON) data"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip.compress(data, 6))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_saved(path: Optional[Path]) -> Optional[Dict[str, Any]]:
+    """A saved index, or None if there is none or it can't be read"""
+    if not path or not path.exists():
+        return None
+    try:
+        return json.loads(gzip.decompress(path.read_bytes()))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable index {path}: {e}")
+        return None
+
+
+class SearchIndex:
+    """Positional inverted index with BM25 ranking, optionally saved to a file"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.postings: Dict[str, Postings] = {field: {} for field in FIELD_WEIGHTS}
+        self.lengths: Dict[str, Dict[str, int]] = {field: {} for field in FIELD_WEIGHTS}
+        self.total_lengths: Dict[str, int] = {field: 0 for field in FIELD_WEIGHTS}
+        self.offsets: Dict[str, Dict[str, List[int]]] = {field: {} for field in CONTENT_FIELDS}
+        self.files: Dict[str, Dict[str, Any]] = {}  # file id -> file_metadata
+        self.file_terms: Dict[str, Dict[str, List[str]]] = {}  # file id -> distinct terms per field
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def add(self, file_id: str, analysis: Analysis):
+        """Index (or reindex) a file from its analysis"""
+        self.remove(file_id)
+        terms = {field: self._add_field(file_id, field, tokens) for field, tokens in analysis.fields.items()}
+        for field, field_offsets in analysis.offsets.items():
+            self.offsets[field][file_id] = field_offsets
+        self.files[file_id] = analysis.metadata
+        self.file_terms[file_id] = terms
+        self.dirty = True
+
+    def update_metadata(self, file_id: str, file: Dict[str, Any]) -> bool:
+        """
+        Reindex the name, tags, notes and filter fields of an indexed file whose
+        content didn't change (file needs no content); False if it isn't indexed
+        """
+        terms = self.file_terms.get(file_id)
+        if terms is None:
+            return False
+        for field, tokens in metadata_fields(file).items():
+            self._remove_field(file_id, field, terms.get(field, ()))
+            terms[field] = self._add_field(file_id, field, tokens)
+        sections = self.files[file_id].get("sections", [])
+        self.files[file_id] = {**file_metadata(file), "sections": sections}
+        self.dirty = True
+        return True
+
+    def _add_field(self, file_id: str, field: str, tokens: List[str]) -> List[str]:
+        """Post a file's tokens of one field; returns its distinct terms"""
+        positions: Dict[str, List[int]] = defaultdict(list)
+        for position, term in enumerate(tokens):
+            positions[term].append(position)
+        postings = self.postings[field]
+        for term, term_positions in positions.items():
+            postings.setdefault(term, {})[file_id] = term_positions
+        self.lengths[field][file_id] = len(tokens)
+        self.total_lengths[field] += len(tokens)
+        return list(positions)
+
+    def _remove_field(self, file_id: str, field: str, terms: Iterable[str]):
+        postings = self.postings[field]
+        for term in terms:
+            documents = postings.get(term)
+            if documents is not None:
+                documents.pop(file_id, None)
+                if not documents:
+                    del postings[term]
+        self.total_lengths[field] -= self.lengths[field].pop(file_id, 0)
+
+    def remove(self, file_id: str):
+        terms = self.file_terms.pop(file_id, None)
+        if terms is None:
+            return
+        for field, field_terms in terms.items():
+            self._remove_field(file_id, field, field_terms)
+        for field_offsets in self.offsets.values():
+            field_offsets.pop(file_id, None)
+        self.files.pop(file_id, None)
+        self.dirty = True
+
+    def signature(self, file_id: str) -> Optional[str]:
+        metadata = self.files.get(file_id)
+        return metadata["signature"] if metadata else None
+
+    def set_status(self, file_id: str, status: Optional[str]):
+        """Track a file's compile status (it isn't part of the signature)"""
+        metadata = self.files.get(file_id)
+        if metadata and metadata.get("compilation_status") != status:
+            metadata["compilation_status"] = status
+            self.dirty = True
+
+    def _frequencies(self, field: str, clause: List[str]) -> Dict[str, int]:
+        """Term (or phrase) frequency per file in one field"""
+        postings = self.postings[field]
+        if len(clause) == 1:
+            return {file_id: len(positions) for file_id, positions in postings.get(clause[0], {}).items()}
+        documents = [postings.get(term) for term in clause]
+        if not all(documents):
+            return {}
+        candidates = set.intersection(*(set(d) for d in sorted(documents, key=len)))
+        frequencies = {}
+        for file_id in candidates:
+            count = len(phrase_starts([d[file_id] for d in documents]))
+            if count:
+                frequencies[file_id] = count
+        return frequencies
+
+    def matching(
+        self,
+        subject_id: Optional[str] = None,
+        semester_id: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None,
+        file_ids: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """Ids of the files (all, or of file_ids) that pass the filters"""
+        wanted_tags: Optional[Set[str]] = set(tags) if tags else None
+        matches = []
+        for file_id in self.files if file_ids is None else file_ids:
+            metadata = self.files.get(file_id, {})
+            if subject_id and metadata.get("subject_id") != subject_id:
+                continue
+            if semester_id and metadata.get("semester_id") != semester_id:
+                continue
+            if wanted_tags and not wanted_tags.intersection(metadata.get("tags", [])):
+                continue
+            matches.append(file_id)
+        return matches
+
+    def search(
+        self,
+        query: str,
+        subject_id: Optional[str] = None,
+        semester_id: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """(file id, score) of the files matching every clause, best first"""
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+        total = max(len(self.files), 1)
+        scores: Dict[str, float] = defaultdict(float)
+        matched: Optional[Set[str]] = None
+        for fields, clause in clauses:
+            clause_matches = set()
+            for field in fields:
+                weight = FIELD_WEIGHTS[field]
+                frequencies = self._frequencies(field, clause)
+                if not frequencies:
+                    continue
+                idf = math.log(1 + (total - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+                average = self.total_lengths[field] / total or 1
+                lengths = self.lengths[field]
+                for file_id, tf in frequencies.items():
+                    norm = 1 - BM25_B + BM25_B * lengths.get(file_id, 0) / average
+                    scores[file_id] += weight * idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+                clause_matches.update(frequencies)
+            matched = clause_matches if matched is None else matched & clause_matches
+            if not matched:
+                return []
+        hits = [(file_id, scores[file_id]) for file_id in self.matching(subject_id, semester_id, tags, matched)]
+        hits.sort(key=lambda hit: (-hit[1], hit[0]))
+        return hits
+
+    def spans(self, file_id: str, query: str) -> List[Tuple[int, int]]:
+        """Character spans of a file's content where the query's words and phrases occur"""
+        spans = []
+        for fields, clause in parse_query(query):
+            for field in fields:
+                offsets = self.offsets.get(field, {}).get(file_id)
+                if not offsets:
+                    continue
+                positions = [self.postings[field].get(term, {}).get(file_id) for term in clause]
+                if not all(positions):
+                    continue
+                starts = positions[0] if len(clause) == 1 else phrase_starts(positions)
+                last = len(clause) - 1
+                spans += [(offsets[2 * p], offsets[2 * (p + last) + 1]) for p in starts]
+        return spans
+
+    def facets(self, file_ids: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """Number of the given files per subject, semester, tag and compile status"""
+        facets: Dict[str, Dict[str, int]] = {facet: defaultdict(int) for facet in FACETS}
+        for file_id in file_ids:
+            metadata = self.files.get(file_id)
+            if not metadata:
+                continue
+            for facet in ("subject_id", "semester_id", "compilation_status"):
+                facets[facet][metadata.get(facet) or "unknown"] += 1
+            for tag in metadata.get("tags", []):
+                facets["tags"][tag] += 1
+        return {facet: dict(counts) for facet, counts in facets.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.files),
+            "terms": {field: len(postings) for field, postings in self.postings.items()},
+            "tokens": dict(self.total_lengths),
+        }
+
+    # Persistence
+    def serialize(self) -> bytes:
+        """Saved form of the index (call on the thread that mutates it)"""
+        return json.dumps({
+            "version": FORMAT_VERSION,
+            "postings": self.postings,
+            "lengths": self.lengths,
+            "offsets": self.offsets,
+            "files": self.files,
+        }, separators=(',', ':')).encode('utf-8')
+
+    def write(self, data: bytes):
+        """Atomically replace the saved index with serialized data"""
+        write_saved(self.path, data)
+
+    def load(self) -> bool:
+        """Restore the saved index; False if there is none or it is outdated"""
+        data = read_saved(self.path)
+        if data is None:
+            return False
+        if data.get("version") != FORMAT_VERSION or set(data.get("postings", {})) != set(FIELD_WEIGHTS):
+            return False
+        self.postings = data["postings"]
+        self.lengths = data["lengths"]
+        self.offsets = data["offsets"]
+        self.files = data["files"]
+        self.total_lengths = {field: sum(lengths.values()) for field, lengths in self.lengths.items()}
+        self.file_terms = {file_id: {field: [] for field in FIELD_WEIGHTS} for file_id in self.files}
+        for field, postings in self.postings.items():
+            for term, documents in postings.items():
+                for file_id in documents:
+                    self.file_terms[file_id][field].append(term)
+        self.dirty = False
+        return True
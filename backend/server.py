@@ -1,17 +1,18 @@
 from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Callable, Iterable, Tuple, Union
 import uuid
 from datetime import datetime
 import json
-import re
 import base64
 import io
 import zipfile
@@ -19,6 +20,35 @@ import tempfile
 import shutil
 import subprocess
 import asyncio
+from datetime import timedelta
+from urllib.parse import quote
+
+from artifact_store import ArtifactStore, GridFSArtifactBackend, LocalArtifactBackend
+from blob_store import BlobStore
+from dashboard_stats import COUNTER_PROJECTION, DashboardStats
+from latex_build import BuildDirectories, build
+from latex_deps import (
+    dependency_closure, dependent_roots, is_root_document, normalize_path, resolve_dependencies
+)
+from latex_engines import DEFAULT_ENGINE, MODE_FULL, MODE_PREVIEW, discover_engines
+from latex_tokenizer import count_words
+from db_indexes import IndexManager
+from hierarchy import TREE_DEPTHS, shape_tree, tree_pipeline
+from history_index import HistoryIndex, analysis_keys, version_keys
+from compile_scheduler import (
+    CompileScheduler, CompileQueueFullError, CompileSchedulerClosedError, SingleFlight,
+    PRIORITY_INTERACTIVE, PRIORITY_BATCH
+)
+from pagination import (
+    RELEVANCE, InvalidCursorError, after_cursor, after_ranked, encode_cursor, page_size, sort_spec
+)
+from pdf_cache import PdfCache, pdf_cache_key
+from preamble_formats import FormatCache
+from search_index import SearchIndex, analyze, file_signature, make_snippets
+from suggest_index import (
+    DEFAULT_LIMIT as DEFAULT_SUGGESTIONS, KINDS as SUGGESTION_KINDS, MAX_LIMIT as MAX_SUGGESTIONS, SuggestIndex
+)
+from version_store import VersionConflictError, VersionStore
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -28,6 +58,67 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Declared indexes, created at startup
+index_manager = IndexManager(db)
+
+# Artifact store for compiled PDFs ("local" directory or shared "gridfs")
+ARTIFACT_BACKEND = os.environ.get('ARTIFACT_BACKEND', 'local')
+ARTIFACT_DIR = Path(os.environ.get('ARTIFACT_DIR', ROOT_DIR / 'artifacts'))
+ARTIFACT_MAX_MB = int(os.environ.get('ARTIFACT_MAX_MB', '512'))
+ARTIFACT_TTL_HOURS = float(os.environ.get('ARTIFACT_TTL_HOURS', '24'))
+ARTIFACT_GC_INTERVAL = int(os.environ.get('ARTIFACT_GC_INTERVAL', '300'))
+artifact_store = ArtifactStore(
+    db.artifacts,
+    GridFSArtifactBackend(db) if ARTIFACT_BACKEND == 'gridfs' else LocalArtifactBackend(ARTIFACT_DIR),
+    max_bytes=ARTIFACT_MAX_MB * 1024 * 1024,
+    ttl=timedelta(hours=ARTIFACT_TTL_HOURS)
+)
+
+# Compiled PDF cache (content-addressed, stored as artifacts)
+pdf_cache = PdfCache(artifact_store)
+
+# Compile worker pool (defaults to one worker per CPU core)
+COMPILE_WORKERS = int(os.environ.get('COMPILE_WORKERS', '0')) or None
+COMPILE_QUEUE_SIZE = int(os.environ.get('COMPILE_QUEUE_SIZE', '100'))
+compile_scheduler = CompileScheduler(COMPILE_WORKERS, COMPILE_QUEUE_SIZE)
+compile_singleflight = SingleFlight()
+
+# Precompiled preamble formats (set PREAMBLE_FORMATS=0 to disable)
+PREAMBLE_FORMATS = os.environ.get('PREAMBLE_FORMATS', '1') != '0'
+FORMAT_CACHE_DIR = Path(os.environ.get('FORMAT_CACHE_DIR', ROOT_DIR / 'format_cache'))
+format_cache = FormatCache(FORMAT_CACHE_DIR)
+
+# TeX engines files can choose from
+tex_engines = discover_engines()
+
+# Persistent per-file build directories keeping .aux/.toc/.bbl between compiles
+BUILD_DIR = Path(os.environ.get('BUILD_DIR', ROOT_DIR / 'builds'))
+BUILD_DIR_TTL_DAYS = float(os.environ.get('BUILD_DIR_TTL_DAYS', '7'))
+build_dirs = BuildDirectories(BUILD_DIR, BUILD_DIR_TTL_DAYS)
+
+# Deduplicated, compressed storage of file and version contents ("zlib", "zstd" or "none")
+BLOB_CODEC = os.environ.get('BLOB_CODEC', 'zlib')
+blob_store = BlobStore(db.blobs, BLOB_CODEC)
+
+# Version history (one document per saved version, delta-compressed between snapshots)
+VERSION_SNAPSHOT_INTERVAL = int(os.environ.get('VERSION_SNAPSHOT_INTERVAL', '20'))
+version_store = VersionStore(db.file_versions, blob_store, VERSION_SNAPSHOT_INTERVAL)
+
+# Dashboard counters, maintained on write (cached for STATS_CACHE_TTL seconds)
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '5'))
+dashboard_stats = DashboardStats(db, STATS_CACHE_TTL)
+
+# Full-text search index (in memory, saved to SEARCH_INDEX_PATH and on shutdown)
+SEARCH_INDEX_PATH = Path(os.environ.get('SEARCH_INDEX_PATH', ROOT_DIR / 'search_index' / 'index.json.gz'))
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+# Search box autocomplete, rebuilt at startup from the subjects and the search index
+suggest_index = SuggestIndex()
+# Version history search (term ranges over versions, saved to HISTORY_INDEX_PATH)
+HISTORY_INDEX_PATH = Path(os.environ.get('HISTORY_INDEX_PATH', ROOT_DIR / 'search_index' / 'history.json.gz'))
+history_index = HistoryIndex(HISTORY_INDEX_PATH)
+history_lock = asyncio.Lock()  # one version replay at a time
+HISTORY_VERSIONS_PER_HIT = 20
+
 # Create the main app without a prefix
 app = FastAPI(
     title="LaTeX Tracker API",
@@ -35,6 +126,19 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Compile scheduler backpressure
+@app.exception_handler(CompileQueueFullError)
+async def compile_queue_full_handler(request, exc: CompileQueueFullError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(CompileSchedulerClosedError)
+async def compile_scheduler_closed_handler(request, exc: CompileSchedulerClosedError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
 # Health check endpoint (outside of /api prefix for monitoring)
 @app.get("/health")
 async def health_check():
@@ -132,6 +236,7 @@ class Subject(BaseModel):
     description: Optional[str] = None
     semester_id: str
     color: Optional[str] = "#3B82F6"
+    revision: int = 0  # incremented on every update
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class SubjectCreate(BaseModel):
@@ -145,9 +250,31 @@ class SubjectUpdate(BaseModel):
     description: Optional[str] = None
     semester_id: Optional[str] = None
     color: Optional[str] = None
+    expected_revision: Optional[int] = None  # reject with 409 if the subject changed since
+
+class Project(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    subject_id: str
+    name: str
+    description: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ProjectCreate(BaseModel):
+    subject_id: str
+    name: str
+    description: Optional[str] = None
+
+class ProjectAsset(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    project_id: str
+    path: str  # workspace-relative, e.g. "figures/plot.png"
+    size: int
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class FileVersion(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    file_id: str
+    sequence: int  # 1 = initial content
     content: str
     word_count: int
     file_size: int
@@ -160,7 +287,8 @@ class TexFile(BaseModel):
     name: str
     subject_id: str
     semester_id: str
-    content: str
+    content: str  # stored in the blob store, not on the document
+    content_hash: Optional[str] = None  # blob holding content
     word_count: int
     file_size: int
     compilation_status: str = "unknown"
@@ -171,10 +299,45 @@ class TexFile(BaseModel):
     git_url: Optional[str] = None
     git_branch: Optional[str] = None
     git_path: Optional[str] = None
-    versions: List[FileVersion] = []
+    engine: str = DEFAULT_ENGINE  # "xelatex", "pdflatex", "lualatex", "tectonic"
+    project_id: Optional[str] = None  # name is the workspace path inside the project
+    dependencies: List[str] = []  # project paths this file references
+    head_version_id: Optional[str] = None  # latest entry in file_versions
+    version_count: int = 0
+    compile_job_id: Optional[str] = None  # latest background compile job
+    compiled_content_hash: Optional[str] = None  # input hash of the last compile
+    revision: int = 0  # incremented on every edit (not on compiles)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class TexFileSummary(BaseModel):
+    """Listing view of a file: metadata only, no content or compile output"""
+    id: str
+    name: str
+    subject_id: str
+    semester_id: str
+    project_id: Optional[str] = None
+    word_count: int
+    file_size: int
+    compilation_status: str = "unknown"
+    tags: List[str] = []
+    source_type: str = "manual"
+    engine: str = DEFAULT_ENGINE
+    version_count: int = 0
+    revision: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+# Mongo projection that loads just the summary fields
+FILE_SUMMARY_PROJECTION = {"_id": 0, **{field: 1 for field in TexFileSummary.model_fields}}
+FILE_VIEWS = ("full", "summary")
+# What update_file reads before writing
+UPDATE_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "subject_id": 1, "project_id": 1,
+    "revision": 1, "version_count": 1, "content_hash": 1
+}
+LISTING_FORMATS = ("json", "ndjson")
+
 class TexFileCreate(BaseModel):
     name: str
     subject_id: str
@@ -186,14 +349,18 @@ class TexFileCreate(BaseModel):
     git_url: Optional[str] = None
     git_branch: Optional[str] = None
     git_path: Optional[str] = None
+    engine: str = DEFAULT_ENGINE
+    project_id: Optional[str] = None
 
 class TexFileUpdate(BaseModel):
     name: Optional[str] = None
     content: Optional[str] = None
     tags: Optional[List[str]] = None
     notes: Optional[str] = None
+    engine: Optional[str] = None
     compilation_status: Optional[str] = None
     compilation_output: Optional[str] = None
+    expected_revision: Optional[int] = None  # reject with 409 if the file changed since
 
 class MultiFileUpload(BaseModel):
     files: List[dict]  # List of {name, content} objects
@@ -201,78 +368,640 @@ class MultiFileUpload(BaseModel):
     semester_id: str
     tags: List[str] = []
     notes: Optional[str] = None
+    engine: str = DEFAULT_ENGINE
+    project_id: Optional[str] = None
+
+class MultiUploadResult(BaseModel):
+    """Outcome of one entry of a multi-file upload"""
+    index: int  # position in the request's files list
+    name: Optional[str] = None
+    status: str  # "created" or "error"
+    error: Optional[str] = None
+    file: Optional[TexFileSummary] = None
+    job_id: Optional[str] = None  # background compile job, if one was queued
 
 class SearchRequest(BaseModel):
     query: str
     semester_id: Optional[str] = None
     subject_id: Optional[str] = None
     tags: Optional[List[str]] = None
+    view: str = "full"  # "summary" leaves out content and compile output
+    sort: Optional[str] = None  # "relevance" (default with a query), "created_at" or "name"
+    limit: Optional[int] = None  # page size (default 200, max 1000)
+    cursor: Optional[str] = None  # X-Next-Cursor of the previous page
+    format: str = "json"  # "ndjson" streams every hit as one JSON object per line
+    history: bool = False  # also match past versions; hits list the versions that matched
+
+class SearchSnippet(BaseModel):
+    text: str  # excerpt of the content, "…" where it was cut
+    highlights: List[Tuple[int, int]]  # [start, end) of every match in text
+
+class VersionMatch(BaseModel):
+    id: str
+    sequence: int
+    created_at: datetime
+
+class HistoryMatch(BaseModel):
+    ranges: List[Tuple[int, int]]  # first and last sequence of every run of matching versions
+    versions: List[VersionMatch]  # the newest matching versions (up to 20)
+    in_current: bool  # whether the newest version still matches
+
+class SearchHit(BaseModel):
+    file: Union[TexFile, TexFileSummary]
+    score: Optional[float] = None  # BM25 relevance, None without a query or in history search
+    snippets: List[SearchSnippet] = []  # of the current content
+    history: Optional[HistoryMatch] = None  # history search only
+
+class SearchResults(BaseModel):
+    hits: List[SearchHit]
+    total: int  # matching files across all pages
+    facets: Dict[str, Dict[str, int]]  # subject_id, semester_id, tags, compilation_status -> value -> files
+    next_cursor: Optional[str] = None
+
+class CompileJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    file_id: str
+    status: str = "queued"  # "queued", "success", "error"
+    compilation_output: Optional[str] = None
+    error: Optional[str] = None
+    pdf_available: bool = False
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
 
 # Helper Functions
-def count_words(text: str) -> int:
-    """Count words in LaTeX text, ignoring commands"""
-    # Remove LaTeX commands
-    text = re.sub(r'\\[a-zA-Z]+\*?(\[[^\]]*\])?(\{[^}]*\})*', '', text)
-    # Remove comments
-    text = re.sub(r'%.*', '', text)
-    # Count words
-    words = text.split()
-    return len(words)
+def validate_engine(engine: str):
+    """Reject engines that are unknown or not installed"""
+    if engine not in tex_engines:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown TeX engine '{engine}', choose one of: {', '.join(tex_engines)}"
+        )
 
 def get_file_size(content: str) -> int:
     """Get file size in bytes"""
     return len(content.encode('utf-8'))
 
-def create_file_version(content: str) -> FileVersion:
+def file_metadata(content: str) -> Tuple[int, int]:
+    """(word count, size in bytes) of a file's content"""
+    return count_words(content), get_file_size(content)
+
+def create_file_version(file_id: str, sequence: int, content: str) -> FileVersion:
     """Create a new file version"""
     word_count = count_words(content)
     file_size = get_file_size(content)
     return FileVersion(
+        file_id=file_id,
+        sequence=sequence,
         content=content,
         word_count=word_count,
         file_size=file_size
     )
 
-async def compile_latex_to_pdf(content: str, filename: str = "document.tex") -> tuple[str, str, str]:
+async def compile_latex_to_pdf(
+    content: str,
+    filename: str = "document.tex",
+    engine: str = DEFAULT_ENGINE,
+    priority: int = PRIORITY_INTERACTIVE,
+    force: bool = False,
+    mode: str = MODE_FULL,
+    build_id: Optional[str] = None,
+    files: Optional[Dict[str, bytes]] = None
+) -> tuple[str, str, str]:
     """
-    Compile LaTeX content to PDF using xelatex
-    Returns: (status, output, pdf_path_or_error)
+    Compile LaTeX content to PDF with the given engine
+    mode="full" reruns the engine until references settle, mode="preview"
+    does a single draft pass. With a build_id, full builds reuse that
+    build's aux files so unchanged references need no extra passes.
+    files holds the other workspace files (by relative path) of a project build.
+    Identical inputs are served from the PDF cache without recompiling,
+    identical compiles already running are joined rather than repeated,
+    and everything else waits for a slot in the compile scheduler.
+    force=True skips the PDF cache and always runs the engine.
+    Returns: (status, output, pdf_artifact_key_or_error)
     """
-    # Create temporary directory for compilation
-    with tempfile.TemporaryDirectory() as temp_dir:
-        tex_path = os.path.join(temp_dir, filename)
-        pdf_path = os.path.join(temp_dir, filename.replace('.tex', '.pdf'))
+    if engine not in tex_engines:
+        return "error", f"Unknown TeX engine: {engine}", f"Unknown TeX engine: {engine}"
+    
+    cache_key = pdf_cache_key(content, filename, engine, mode, files)
+    cached = None if force else await pdf_cache.get(cache_key)
+    if cached:
+        artifact_key, output = cached
+        return "success", output, artifact_key
+    
+    return await compile_singleflight.do(cache_key, lambda: compile_scheduler.submit(
+        lambda: run_latex(content, filename, tex_engines[engine], mode, cache_key, build_id, files),
+        priority=priority
+    ))
+
+async def run_latex(
+    content: str,
+    filename: str,
+    engine,
+    mode: str,
+    cache_key: str,
+    build_id: Optional[str] = None,
+    files: Optional[Dict[str, bytes]] = None
+) -> tuple[str, str, str]:
+    """Build the document and store the PDF on success"""
+    try:
+        # Load the preamble from a precompiled format when possible
+        # (not for project builds, whose preambles may \input workspace files)
+        engine_args = []
+        env = None
+        if PREAMBLE_FORMATS and engine.supports_formats and not files:
+            prepared = await format_cache.prepare(engine.command, content, draft=mode == MODE_PREVIEW)
+            if prepared:
+                content, engine_args, format_env = prepared
+                env = {**os.environ, **format_env}
         
+        if build_id and mode == MODE_FULL:
+            # Full builds of a known file run in its persistent build directory
+            build_dir, token = await build_dirs.acquire(build_id, engine.name)
+            try:
+                return await run_build(
+                    content, filename, engine, mode, cache_key, str(build_dir), engine_args, env, files
+                )
+            finally:
+                build_dirs.release(token)
+        
+        # Create temporary directory for compilation
+        with tempfile.TemporaryDirectory() as temp_dir:
+            if build_id:
+                # Previews start from the last full build's references
+                build_dirs.seed(build_id, engine.name, temp_dir, os.path.basename(filename).replace('.tex', ''))
+            return await run_build(
+                content, filename, engine, mode, cache_key, temp_dir, engine_args, env, files
+            )
+    
+    except Exception as e:
+        return "error", str(e), f"Exception during compilation: {str(e)}"
+
+WORKSPACE_MANIFEST = '.workspace.json'
+
+def workspace_path(work_dir: str, path: str) -> str:
+    """Where a document or workspace file goes in a build directory; refuses paths leaving it"""
+    root = os.path.realpath(work_dir)
+    target = os.path.realpath(os.path.join(root, path))
+    if target == root or os.path.commonpath([root, target]) != root:
+        raise ValueError(f"File path escapes the build directory: {path}")
+    return target
+
+async def run_build(
+    content: str,
+    filename: str,
+    engine,
+    mode: str,
+    cache_key: str,
+    work_dir: str,
+    engine_args: List[str],
+    env: Optional[Dict[str, str]],
+    files: Optional[Dict[str, bytes]] = None
+) -> tuple[str, str, str]:
+    """Write the source (and project workspace) into work_dir, run the engine passes and store the PDF"""
+    tex_path = workspace_path(work_dir, filename)
+    pdf_path = os.path.join(work_dir, os.path.basename(filename).replace('.tex', '.pdf'))
+    
+    # Materialize the other project files the document depends on, dropping
+    # files a previous build in a persistent directory left behind
+    manifest_path = os.path.join(work_dir, WORKSPACE_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            stale = set(json.load(f)) - set(files or {})
+        for path in stale:
+            target = workspace_path(work_dir, path)
+            if os.path.exists(target):
+                os.remove(target)
+    for path, data in (files or {}).items():
+        target = workspace_path(work_dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(sorted(files or {}), f)
+    
+    # Write LaTeX content to file
+    os.makedirs(os.path.dirname(tex_path), exist_ok=True)
+    with open(tex_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    # A PDF left over from an earlier build must not count as success
+    if os.path.exists(pdf_path):
+        os.remove(pdf_path)
+    
+    # Previews get one draft pass; full builds rerun until the aux files settle
+    max_passes = 1 if mode == MODE_PREVIEW else None
+    returncode, output = await build(engine, filename, work_dir, mode, engine_args, env, max_passes)
+    
+    # Check if PDF was created successfully
+    if returncode == 0 and os.path.exists(pdf_path):
+        # Copy the PDF into the artifact store
+        artifact_key = await pdf_cache.put(cache_key, pdf_path, output)
+        return "success", output, artifact_key
+    else:
+        return "error", output, f"Compilation failed with return code {returncode}"
+
+# Optimistic concurrency
+def revision_query(document_id: str, expected_revision: Optional[int]) -> dict:
+    """Filter matching the document, and only at the expected revision if one is given"""
+    query: Dict[str, Any] = {"id": document_id}
+    if expected_revision is not None:
+        # Documents from before revisions were tracked count as revision 0
+        query["revision"] = expected_revision if expected_revision else {"$in": [0, None]}
+    return query
+
+async def raise_update_failed(collection, document_id: str, label: str, expected_revision: Optional[int]):
+    """A conditional update matched nothing: the document is gone or was changed concurrently"""
+    current = await collection.find_one({"id": document_id}, {"_id": 0, "revision": 1})
+    if not current:
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+    detail = f"{label} was modified concurrently"
+    if expected_revision is not None:
+        detail += f" (expected revision {expected_revision}, now {current.get('revision', 0)})"
+    raise HTTPException(status_code=409, detail=f"{detail}, reload and retry")
+
+async def set_compile_state(query: dict, fields: dict) -> bool:
+    """Update a file's compile fields, keeping the dashboard status counters in step"""
+    before = await db.tex_files.find_one_and_update(
+        query, {"$set": fields}, projection={**COUNTER_PROJECTION, "id": 1}, return_document=ReturnDocument.BEFORE
+    )
+    if before and before.get("compilation_status") != fields["compilation_status"]:
+        await dashboard_stats.file_changed(before, {**before, "compilation_status": fields["compilation_status"]})
+        search_index.set_status(before["id"], fields["compilation_status"])
+    return before is not None
+
+async def record_compile_result(file_id: str, status: str, output: str, content_hash: str):
+    """Store the outcome of a foreground compile without touching the file's other fields"""
+    await set_compile_state({"id": file_id}, {
+        "compilation_status": status,
+        "compilation_output": output,
+        "compiled_content_hash": content_hash,
+        "compile_job_id": None,  # supersedes any queued background job
+        "updated_at": datetime.utcnow()
+    })
+
+# Background compile jobs
+COMPILE_JOB_RETRIES = 5
+background_tasks = set()
+
+def spawn_background(coro):
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def enqueue_compile_job(
+    job: CompileJob,
+    content: str,
+    filename: str,
+    engine: str = DEFAULT_ENGINE,
+    priority: int = PRIORITY_BATCH,
+    force: bool = False,
+    files: Optional[Dict[str, bytes]] = None
+) -> CompileJob:
+    """Record a compile job and run it in the background"""
+    await db.compile_jobs.insert_one(job.dict())
+    spawn_background(run_compile_job(job.id, job.file_id, content, filename, engine, priority, force, files))
+    return job
+
+async def run_compile_job(
+    job_id: str,
+    file_id: str,
+    content: str,
+    filename: str,
+    engine: str,
+    priority: int,
+    force: bool = False,
+    files: Optional[Dict[str, bytes]] = None
+):
+    """Compile in the background, then store the result on the job and the file"""
+    error = None
+    for attempt in range(COMPILE_JOB_RETRIES):
         try:
-            # Write LaTeX content to file
-            with open(tex_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            # Run xelatex compilation
-            process = await asyncio.create_subprocess_exec(
-                'xelatex',
-                '-interaction=nonstopmode',
-                '-output-directory', temp_dir,
-                tex_path,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=temp_dir
+            status, output, result = await compile_latex_to_pdf(
+                content, filename, engine, priority=priority, force=force, build_id=file_id, files=files
+            )
+            if status != "success":
+                error = result
+            break
+        except CompileQueueFullError as e:
+            # Background work can wait for the queue to drain
+            status, output, error = "error", str(e), str(e)
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            status, output, error = "error", f"Compilation failed: {str(e)}", str(e)
+            break
+    
+    await db.compile_jobs.update_one({"id": job_id}, {"$set": {
+        "status": status,
+        "compilation_output": output,
+        "error": error,
+        "pdf_available": status == "success",
+        "finished_at": datetime.utcnow()
+    }})
+    # Only the latest job of a file may write its result back
+    updated = await set_compile_state(
+        {"id": file_id, "compile_job_id": job_id},
+        {
+            "compilation_status": status,
+            "compilation_output": output,
+            "compiled_content_hash": pdf_cache_key(content, filename, engine, files=files)
+        }
+    )
+    if status == "success" and updated:
+        await artifact_store.retain(file_id, result)
+
+async def resume_compile_jobs():
+    """Restart jobs that were still queued when the server last stopped"""
+    jobs = await db.compile_jobs.find({"status": "queued"}).to_list(1000)
+    for job in jobs:
+        file = await find_file({"id": job["file_id"], "compile_job_id": job["id"]})
+        if not file:
+            await db.compile_jobs.update_one(
+                {"id": job["id"]},
+                {"$set": {"status": "error", "error": "Superseded or file deleted", "finished_at": datetime.utcnow()}}
             )
-            
-            stdout, stderr = await process.communicate()
-            output = stdout.decode('utf-8') + stderr.decode('utf-8')
-            
-            # Check if PDF was created successfully
-            if process.returncode == 0 and os.path.exists(pdf_path):
-                # Copy PDF to a permanent location
-                permanent_pdf_path = tempfile.mktemp(suffix='.pdf')
-                shutil.copy2(pdf_path, permanent_pdf_path)
-                return "success", output, permanent_pdf_path
-            else:
-                return "error", output, f"Compilation failed with return code {process.returncode}"
-                
+            continue
+        spawn_background(run_compile_job(
+            job["id"], file["id"], file["content"], file["name"],
+            file.get("engine", DEFAULT_ENGINE), PRIORITY_BATCH,
+            files=await project_workspace(file)
+        ))
+
+# File content storage
+def stored_file(file_obj: TexFile) -> dict:
+    """Document persisted for a file; its content lives in the blob store"""
+    return file_obj.dict(exclude={"content"})
+
+async def with_content(files: List[dict]) -> List[dict]:
+    """Fill in the content of file documents from the blob store"""
+    texts = await blob_store.get_many(f.get("content_hash") for f in files if "content" not in f)
+    for f in files:
+        if "content" not in f:
+            f["content"] = texts.get(f.get("content_hash"), "")
+    return files
+
+async def find_file(query: dict) -> Optional[dict]:
+    file = await db.tex_files.find_one(query)
+    return (await with_content([file]))[0] if file else None
+
+async def migrate_inline_file_content() -> int:
+    """Move contents still stored on file documents into the blob store"""
+    migrated = 0
+    async for file in db.tex_files.find({"content": {"$exists": True}}, {"_id": 0, "id": 1, "content": 1}):
+        key = await blob_store.put(file["content"])
+        result = await db.tex_files.update_one(
+            {"id": file["id"], "content": {"$exists": True}},
+            {"$set": {"content_hash": key}, "$unset": {"content": ""}}
+        )
+        if not result.modified_count:
+            await blob_store.release([key])
+        migrated += 1
+    if migrated:
+        logging.getLogger(__name__).info(f"Moved the content of {migrated} files into the blob store")
+    return migrated
+
+async def store_new_file_content(file_obj: TexFile):
+    """Store a new file's content and record it as version 1"""
+    file_obj.content_hash = await blob_store.put(file_obj.content)
+    version = create_file_version(file_obj.id, 1, file_obj.content)
+    await version_store.append(version.dict())
+    file_obj.head_version_id = version.id
+    file_obj.version_count = 1
+
+# Search index maintenance
+SEARCH_SYNC_PROJECTION = {
+    "_id": 0, "id": 1, "content_hash": 1, "name": 1, "notes": 1, "tags": 1,
+    "subject_id": 1, "semester_id": 1, "compilation_status": 1
+}
+
+async def index_files(files: List[dict]):
+    """
+    Add or refresh files (documents with content) in the search and suggestion
+    indexes, and their head version in the history index
+    """
+    def analyze_all():
+        analyzed = []
+        for file in files:
+            analysis = analyze(file)
+            analyzed.append((analysis, analysis_keys(analysis.fields) if file.get("version_count") else None))
+        return analyzed
+    
+    for file, (analysis, keys) in zip(files, await asyncio.to_thread(analyze_all)):
+        search_index.add(file["id"], analysis)
+        suggest_index.set_file(file["id"], analysis.metadata)
+        if keys is not None and not history_index.apply(file["id"], file["version_count"], keys):
+            # Versions the history index hasn't seen yet come first
+            spawn_background(catch_up_history(file["id"]))
+
+async def reindex_file_metadata(file: dict):
+    """Refresh the indexes after an edit that left the content alone (file without content)"""
+    if search_index.update_metadata(file["id"], file):
+        suggest_index.set_file(file["id"], search_index.files[file["id"]])
+    else:
+        await index_files(await with_content([dict(file)]))
+
+def unindex_files(file_ids: Iterable[str]):
+    for file_id in file_ids:
+        search_index.remove(file_id)
+        suggest_index.remove_file(file_id)
+        history_index.remove(file_id)
+
+async def save_index(index: Union[SearchIndex, HistoryIndex]):
+    """
+    Save a changed index. The JSON is built here on the event loop, the only
+    place the index changes, so it is a consistent snapshot; compressing and
+    writing it run in a worker thread.
+    """
+    if index.dirty and index.path:
+        data = index.serialize()
+        # Writes during the save mark the index dirty again for the next one
+        index.dirty = False
+        try:
+            await asyncio.to_thread(index.write, data)
+        except Exception:
+            index.dirty = True
+            raise
+
+async def sync_search_index():
+    """Load the saved search index and reindex the files changed since it was saved"""
+    loaded = search_index.load()
+    seen, stale = set(), []
+    async for file in db.tex_files.find({}, SEARCH_SYNC_PROJECTION):
+        seen.add(file["id"])
+        if search_index.signature(file["id"]) != file_signature(file):
+            stale.append(file)
+        else:
+            search_index.set_status(file["id"], file.get("compilation_status"))
+    unindex_files(set(search_index.files) - seen)
+    for start in range(0, len(stale), LISTING_BATCH_SIZE):
+        await index_files(await with_content(stale[start:start + LISTING_BATCH_SIZE]))
+    logging.getLogger(__name__).info(
+        f"Search index {'loaded' if loaded else 'built'}: {len(search_index)} files, {len(stale)} reindexed"
+    )
+    await save_index(search_index)
+
+async def load_suggestions():
+    """Fill the autocomplete index from the subjects and the search index's file metadata"""
+    async for subject in db.subjects.find({}, {"_id": 0, "id": 1, "name": 1}):
+        suggest_index.set_subject(subject["id"], subject.get("name"))
+    for file_id, metadata in search_index.files.items():
+        suggest_index.set_file(file_id, metadata)
+
+async def catch_up_history(file_id: str):
+    """Add the versions of a file the history index hasn't seen yet, oldest first"""
+    async with history_lock:
+        async for sequence, content in version_store.replay(file_id, history_index.heads.get(file_id, 0)):
+            history_index.apply(file_id, sequence, await asyncio.to_thread(version_keys, content))
+
+async def sync_history_index():
+    """Catch the (loaded) history index up with the versions saved since; runs in the background"""
+    known = set(history_index.heads)
+    seen, replayed = set(), 0
+    async for file in db.tex_files.find({}, {"_id": 0, "id": 1, "version_count": 1}):
+        seen.add(file["id"])
+        count = file.get("version_count") or 0
+        if history_index.heads.get(file["id"], 0) > count:
+            # The history was rewritten (e.g. a restored backup): start over
+            history_index.remove(file["id"])
+        if count > history_index.heads.get(file["id"], 0):
+            await catch_up_history(file["id"])
+            replayed += 1
+    for file_id in known - seen:
+        history_index.remove(file_id)
+    history_index.ready = True
+    logging.getLogger(__name__).info(
+        f"History index ready: {len(history_index)} files, {replayed} caught up"
+    )
+    await save_index(history_index)
+
+# Multi-file projects
+async def load_project_files(project_id: str) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """Files and assets (without data) of a project, keyed by workspace path"""
+    files = await db.tex_files.find(
+        {"project_id": project_id},
+        {"_id": 0, "id": 1, "project_id": 1, "name": 1, "content_hash": 1, "dependencies": 1, "engine": 1}
+    ).to_list(None)
+    await with_content(files)
+    assets = await db.project_assets.find(
+        {"project_id": project_id},
+        {"_id": 0, "id": 1, "path": 1, "size": 1}
+    ).to_list(None)
+    return {f["name"]: f for f in files}, {a["path"]: a for a in assets}
+
+async def project_workspace(file: dict) -> Optional[Dict[str, bytes]]:
+    """Other project files a document needs to build, keyed by workspace path"""
+    if not file.get("project_id"):
+        return None
+    files, assets = await load_project_files(file["project_id"])
+    graph = {path: f.get("dependencies", []) for path, f in files.items()}
+    needed = dependency_closure(graph, file["name"])
+    workspace = {path: files[path]["content"].encode('utf-8') for path in needed if path in files}
+    asset_paths = [path for path in needed if path in assets]
+    if asset_paths:
+        async for asset in db.project_assets.find({"project_id": file["project_id"], "path": {"$in": asset_paths}}):
+            workspace[asset["path"]] = bytes(asset["data"])
+    return workspace
+
+async def refresh_project_dependencies(project_id: str) -> Tuple[Dict[str, dict], Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    Re-resolve every file's references after the project changed
+    Returns: (files_by_path, previous_graph, current_graph)
+    """
+    files, assets = await load_project_files(project_id)
+    available = set(files) | set(assets)
+    previous, current = {}, {}
+    for path, f in files.items():
+        previous[path] = f.get("dependencies", [])
+        current[path], _ = resolve_dependencies(f["content"], available)
+        if current[path] != previous[path]:
+            await db.tex_files.update_one({"id": f["id"]}, {"$set": {"dependencies": current[path]}})
+    return files, previous, current
+
+async def start_project_compile(file: dict, priority: int = PRIORITY_BATCH) -> CompileJob:
+    """Queue a background build of a project root from its materialized workspace"""
+    job = CompileJob(file_id=file["id"])
+    await set_compile_state({"id": file["id"]}, {"compilation_status": "pending", "compile_job_id": job.id})
+    return await enqueue_compile_job(
+        job, file["content"], file["name"], file.get("engine", DEFAULT_ENGINE), priority,
+        files=await project_workspace(file)
+    )
+
+async def recompile_dependent_roots(
+    project_id: str, changed_paths: Iterable[str], file: Optional[dict] = None
+) -> List[CompileJob]:
+    """
+    Refresh the dependency graph and rebuild only the roots that include a changed path
+    A file passed in is patched with the dependencies and compile state written for it,
+    so the caller does not have to read it back.
+    """
+    files, previous, current = await refresh_project_dependencies(project_id)
+    roots = [path for path, f in files.items() if is_root_document(f["content"])]
+    affected = set()
+    for changed in changed_paths:
+        # The previous graph still knows about deleted or renamed files
+        affected.update(dependent_roots(previous, roots, changed))
+        affected.update(dependent_roots(current, roots, changed))
+    jobs = [await start_project_compile(files[root]) for root in sorted(affected)]
+    if file is not None:
+        file["dependencies"] = current.get(file["name"], file.get("dependencies", []))
+        for job in jobs:
+            if job.file_id == file["id"]:
+                file.update(compilation_status="pending", compile_job_id=job.id)
+    return jobs
+
+def validate_file_name(name: str) -> str:
+    """Normalized name of a standalone file (also its path in the build directory)"""
+    path = normalize_path(name)
+    if path is None:
+        raise HTTPException(status_code=400, detail=f"Invalid file name: {name}")
+    return path
+
+async def validate_project_path(project_id: str, subject_id: str, name: str, file_id: Optional[str] = None) -> str:
+    """Check a file can join a project under name; returns the normalized workspace path"""
+    project = await db.projects.find_one({"id": project_id})
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project["subject_id"] != subject_id:
+        raise HTTPException(status_code=400, detail="Project belongs to a different subject")
+    path = normalize_path(name)
+    if path is None:
+        raise HTTPException(status_code=400, detail=f"Invalid project file path: {name}")
+    existing = await db.tex_files.find_one({"project_id": project_id, "name": path, "id": {"$ne": file_id}})
+    if existing:
+        raise HTTPException(status_code=400, detail=f"Project already has a file at {path}")
+    return path
+
+# Artifact serving and cleanup
+def attachment_headers(filename: str) -> dict:
+    """Content-Disposition header for a download"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return {"Content-Disposition": f"attachment; filename*=utf-8''{quoted}"}
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+def artifact_response(artifact_key: str, filename: str, media_type: str):
+    """Serve an artifact from disk when the backend keeps one, otherwise stream it"""
+    local_path = artifact_store.local_path(artifact_key)
+    if local_path:
+        return FileResponse(path=local_path, filename=filename, media_type=media_type)
+    return StreamingResponse(
+        artifact_store.stream(artifact_key),
+        media_type=media_type,
+        headers=attachment_headers(filename)
+    )
+
+async def collect_garbage_periodically():
+    """Background loop cleaning up artifacts and idle build directories"""
+    while True:
+        await asyncio.sleep(ARTIFACT_GC_INTERVAL)
+        try:
+            await artifact_store.collect_garbage()
+            await blob_store.collect_garbage()
+            await asyncio.to_thread(build_dirs.collect_garbage)
+            await save_index(search_index)
+            await save_index(history_index)
         except Exception as e:
-            return "error", str(e), f"Exception during compilation: {str(e)}"
+            logging.getLogger(__name__).warning(f"Garbage collection failed: {e}")
 
 # Routes
 @api_router.get("/")
@@ -289,6 +1018,7 @@ async def create_year(year: YearCreate):
     
     year_obj = Year(**year.dict())
     await db.years.insert_one(year_obj.dict())
+    await dashboard_stats.count("years", 1)
     return year_obj
 
 @api_router.get("/years", response_model=List[Year])
@@ -326,6 +1056,8 @@ async def delete_year(year_id: str):
     result = await db.years.delete_one({"id": year_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Year not found")
+    await dashboard_stats.count("years", -1)
+    await dashboard_stats.drop_scope("year", year_id)
     return {"message": "Year deleted successfully"}
 
 # Semester endpoints
@@ -338,6 +1070,7 @@ async def create_semester(semester: SemesterCreate):
     
     semester_obj = Semester(**semester.dict())
     await db.semesters.insert_one(semester_obj.dict())
+    await dashboard_stats.count("semesters", 1)
     return semester_obj
 
 @api_router.get("/semesters", response_model=List[Semester])
@@ -362,6 +1095,8 @@ async def update_semester(semester_id: str, semester_update: SemesterUpdate):
     update_data = {k: v for k, v in semester_update.dict().items() if v is not None}
     if update_data:
         await db.semesters.update_one({"id": semester_id}, {"$set": update_data})
+    if update_data.get("year_id", semester["year_id"]) != semester["year_id"]:
+        await dashboard_stats.move_semester(semester_id, semester["year_id"], update_data["year_id"])
     
     updated_semester = await db.semesters.find_one({"id": semester_id})
     return Semester(**updated_semester)
@@ -376,6 +1111,8 @@ async def delete_semester(semester_id: str):
     result = await db.semesters.delete_one({"id": semester_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Semester not found")
+    await dashboard_stats.count("semesters", -1)
+    await dashboard_stats.drop_scope("semester", semester_id)
     return {"message": "Semester deleted successfully"}
 
 # Term endpoints (legacy - for backward compatibility)
@@ -416,8 +1153,15 @@ async def delete_term(term_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Term not found")
     # Also delete associated subjects and files
-    await db.subjects.delete_many({"term_id": term_id})
+    subject_ids = await db.subjects.distinct("id", {"term_id": term_id})
+    subjects = await db.subjects.delete_many({"term_id": term_id})
+    files = await db.tex_files.find({"term_id": term_id}, {**COUNTER_PROJECTION, "id": 1}).to_list(None)
     await db.tex_files.delete_many({"term_id": term_id})
+    await dashboard_stats.count("subjects", -subjects.deleted_count)
+    await dashboard_stats.files_removed(files)
+    unindex_files(f["id"] for f in files)
+    for subject_id in subject_ids:
+        suggest_index.remove_subject(subject_id)
     return {"message": "Term deleted successfully"}
 
 # Subject endpoints
@@ -430,6 +1174,8 @@ async def create_subject(subject: SubjectCreate):
     
     subject_obj = Subject(**subject.dict())
     await db.subjects.insert_one(subject_obj.dict())
+    await dashboard_stats.count("subjects", 1)
+    suggest_index.set_subject(subject_obj.id, subject_obj.name)
     return subject_obj
 
 @api_router.get("/subjects", response_model=List[Subject])
@@ -447,22 +1193,25 @@ async def get_subject(subject_id: str):
 
 @api_router.put("/subjects/{subject_id}", response_model=Subject)
 async def update_subject(subject_id: str, subject_update: SubjectUpdate):
-    subject = await db.subjects.find_one({"id": subject_id})
-    if not subject:
-        raise HTTPException(status_code=404, detail="Subject not found")
-    
     # Verify semester exists if semester_id is being updated
-    if subject_update.semester_id and subject_update.semester_id != subject.get('semester_id'):
+    if subject_update.semester_id:
         semester = await db.semesters.find_one({"id": subject_update.semester_id})
         if not semester:
             raise HTTPException(status_code=404, detail="Semester not found")
     
-    updated_subject = Subject(**subject)
-    for key, value in subject_update.dict(exclude_unset=True).items():
-        setattr(updated_subject, key, value)
-    
-    await db.subjects.replace_one({"id": subject_id}, updated_subject.dict())
-    return updated_subject
+    changes = subject_update.dict(exclude_unset=True, exclude={"expected_revision"})
+    update: Dict[str, Any] = {"$inc": {"revision": 1}}
+    if changes:
+        update["$set"] = changes
+    subject = await db.subjects.find_one_and_update(
+        revision_query(subject_id, subject_update.expected_revision),
+        update,
+        return_document=ReturnDocument.AFTER
+    )
+    if not subject:
+        await raise_update_failed(db.subjects, subject_id, "Subject", subject_update.expected_revision)
+    suggest_index.set_subject(subject_id, subject["name"])
+    return Subject(**subject)
 
 @api_router.delete("/subjects/{subject_id}")
 async def delete_subject(subject_id: str):
@@ -470,7 +1219,24 @@ async def delete_subject(subject_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Subject not found")
     # Also delete associated files
+    files = await db.tex_files.find(
+        {"subject_id": subject_id}, {**COUNTER_PROJECTION, "id": 1, "content_hash": 1}
+    ).to_list(None)
+    file_ids = [f["id"] for f in files]
     await db.tex_files.delete_many({"subject_id": subject_id})
+    await dashboard_stats.count("subjects", -1)
+    await dashboard_stats.files_removed(files)
+    await dashboard_stats.drop_scope("subject", subject_id)
+    unindex_files(file_ids)
+    suggest_index.remove_subject(subject_id)
+    await artifact_store.release(file_ids)
+    await blob_store.release(f.get("content_hash") for f in files)
+    await version_store.delete(file_ids)
+    for deleted_id in file_ids:
+        build_dirs.remove(deleted_id)
+    project_ids = await db.projects.distinct("id", {"subject_id": subject_id})
+    await db.projects.delete_many({"subject_id": subject_id})
+    await db.project_assets.delete_many({"project_id": {"$in": project_ids}})
     return {"message": "Subject deleted successfully"}
 
 # File endpoints
@@ -485,33 +1251,48 @@ async def create_file(file_data: TexFileCreate):
     if not semester:
         raise HTTPException(status_code=404, detail="Semester not found")
     
+    validate_engine(file_data.engine)
+    if file_data.project_id:
+        file_data.name = await validate_project_path(file_data.project_id, file_data.subject_id, file_data.name)
+    else:
+        file_data.name = validate_file_name(file_data.name)
+    
     # Create file with version
     word_count = count_words(file_data.content)
     file_size = get_file_size(file_data.content)
-    initial_version = create_file_version(file_data.content)
     
     file_obj = TexFile(
         **file_data.dict(),
         word_count=word_count,
-        file_size=file_size,
-        versions=[initial_version]
+        file_size=file_size
     )
+    await store_new_file_content(file_obj)
     
-    # Try to compile the LaTeX file automatically
-    try:
-        status, output, result = await compile_latex_to_pdf(file_data.content, file_data.name)
-        file_obj.compilation_status = status
-        file_obj.compilation_output = output
-    except Exception as e:
-        # If compilation fails, still create the file but mark compilation as error
-        file_obj.compilation_status = "error"
-        file_obj.compilation_output = f"Auto-compilation failed: {str(e)}"
+    if file_obj.project_id:
+        # Project files are built through the root documents that include them
+        await db.tex_files.insert_one(stored_file(file_obj))
+        await dashboard_stats.files_added([stored_file(file_obj)])
+        await index_files([file_obj.dict()])
+        await recompile_dependent_roots(file_obj.project_id, [file_obj.name])
+        return TexFile(**await find_file({"id": file_obj.id}))
     
-    await db.tex_files.insert_one(file_obj.dict())
+    # Compile in the background so the write returns immediately
+    job = CompileJob(file_id=file_obj.id)
+    file_obj.compilation_status = "pending"
+    file_obj.compile_job_id = job.id
+    await db.tex_files.insert_one(stored_file(file_obj))
+    await dashboard_stats.files_added([stored_file(file_obj)])
+    await index_files([file_obj.dict()])
+    await enqueue_compile_job(job, file_obj.content, file_obj.name, file_obj.engine)
     return file_obj
 
-@api_router.post("/files/multi-upload", response_model=List[TexFile])
+@api_router.post("/files/multi-upload", response_model=List[MultiUploadResult])
 async def create_multiple_files(multi_upload: MultiFileUpload):
+    """
+    Create many files at once: metadata is computed off the event loop, all
+    files and their first versions are stored with bulk inserts, and compiles
+    are queued on the worker pool. Returns one result per entry, in order.
+    """
     # Verify subject and semester exist
     subject = await db.subjects.find_one({"id": multi_upload.subject_id})
     if not subject:
@@ -521,52 +1302,128 @@ async def create_multiple_files(multi_upload: MultiFileUpload):
     if not semester:
         raise HTTPException(status_code=404, detail="Semester not found")
     
-    created_files = []
+    validate_engine(multi_upload.engine)
+    if multi_upload.project_id:
+        project = await db.projects.find_one({"id": multi_upload.project_id})
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        if project["subject_id"] != multi_upload.subject_id:
+            raise HTTPException(status_code=400, detail="Project belongs to a different subject")
+        project_paths = set(await db.tex_files.distinct("name", {"project_id": multi_upload.project_id}))
     
-    for file_data in multi_upload.files:
+    results = [MultiUploadResult(index=i, name=f.get('name'), status="error") for i, f in enumerate(multi_upload.files)]
+    accepted = []  # (result, name, content)
+    for result, file_data in zip(results, multi_upload.files):
         # Validate file data
-        if not file_data.get('name') or not file_data.get('content'):
+        name, content = file_data.get('name'), file_data.get('content')
+        if not isinstance(name, str) or not isinstance(content, str) or not name or not content:
+            result.error = "A file needs a name and non-empty content"
             continue
-            
-        # Create file with version
-        word_count = count_words(file_data['content'])
-        file_size = get_file_size(file_data['content'])
-        initial_version = create_file_version(file_data['content'])
-        
+        path = normalize_path(name)
+        if path is None:
+            result.error = "Invalid project path" if multi_upload.project_id else "Invalid file name"
+            continue
+        if multi_upload.project_id:
+            if path in project_paths:
+                result.error = f"Project already contains {path}"
+                continue
+            project_paths.add(path)
+        name = result.name = path
+        accepted.append((result, name, content))
+    if not accepted:
+        return results
+    
+    metadata = await asyncio.gather(*(asyncio.to_thread(file_metadata, content) for _, _, content in accepted))
+    contents = [content for _, _, content in accepted]
+    content_hashes = await blob_store.put_many(contents)
+    
+    file_objs, versions = [], []
+    for (result, name, content), (word_count, file_size), key in zip(accepted, metadata, content_hashes):
         file_obj = TexFile(
-            name=file_data['name'],
+            name=name,
             subject_id=multi_upload.subject_id,
             semester_id=multi_upload.semester_id,
-            content=file_data['content'],
+            content=content,
+            content_hash=key,
             word_count=word_count,
             file_size=file_size,
             tags=multi_upload.tags,
             notes=multi_upload.notes,
             source_type="multi_upload",
-            versions=[initial_version]
+            engine=multi_upload.engine,
+            project_id=multi_upload.project_id,
+            version_count=1
         )
-        
-        # Try to compile the LaTeX file automatically
-        try:
-            status, output, result = await compile_latex_to_pdf(file_data['content'], file_data['name'])
-            file_obj.compilation_status = status
-            file_obj.compilation_output = output
-        except Exception as e:
-            # If compilation fails, still create the file but mark compilation as error
-            file_obj.compilation_status = "error"
-            file_obj.compilation_output = f"Auto-compilation failed: {str(e)}"
-        
-        await db.tex_files.insert_one(file_obj.dict())
-        created_files.append(file_obj)
+        version = FileVersion(
+            file_id=file_obj.id, sequence=1, content=content, word_count=word_count, file_size=file_size
+        )
+        file_obj.head_version_id = version.id
+        # Project roots are built once every file of the upload is in place
+        if not multi_upload.project_id:
+            result.job_id = file_obj.compile_job_id = CompileJob(file_id=file_obj.id).id
+            file_obj.compilation_status = "pending"
+        file_objs.append(file_obj)
+        versions.append(version.dict())
+    await version_store.append_initial(versions)
     
-    return created_files
+    failed = {}
+    try:
+        await db.tex_files.insert_many([stored_file(f) for f in file_objs], ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"]: error.get("errmsg", "Insert failed") for error in e.details["writeErrors"]}
+        await version_store.delete(file_objs[i].id for i in failed)
+        await blob_store.release(file_objs[i].content_hash for i in failed)
+    
+    created = []
+    for i, ((result, _, _), file_obj) in enumerate(zip(accepted, file_objs)):
+        if i in failed:
+            result.error, result.job_id = failed[i], None
+            continue
+        result.status = "created"
+        result.file = TexFileSummary(**file_obj.dict())
+        created.append(file_obj)
+    await dashboard_stats.files_added(stored_file(f) for f in created)
+    await index_files([f.dict() for f in created])
+    
+    if multi_upload.project_id:
+        if created:
+            await recompile_dependent_roots(multi_upload.project_id, [f.name for f in created])
+            refreshed = await db.tex_files.find(
+                {"id": {"$in": [f.id for f in created]}}, FILE_SUMMARY_PROJECTION
+            ).to_list(None)
+            by_id = {f["id"]: f for f in refreshed}
+            for result, _, _ in accepted:
+                if result.file:
+                    result.file = TexFileSummary(**by_id[result.file.id])
+    elif created:
+        # Fan the compiles out to the worker pool
+        jobs = [CompileJob(id=f.compile_job_id, file_id=f.id) for f in created]
+        await db.compile_jobs.insert_many([job.dict() for job in jobs])
+        for job, file_obj in zip(jobs, created):
+            spawn_background(run_compile_job(
+                job.id, file_obj.id, file_obj.content, file_obj.name, file_obj.engine, PRIORITY_BATCH
+            ))
+    
+    return results
 
-@api_router.get("/files", response_model=List[TexFile])
+@api_router.get("/files", response_model=Union[List[TexFile], List[TexFileSummary]])
 async def get_files(
+    response: Response,
     semester_id: Optional[str] = None,
     subject_id: Optional[str] = None,
-    tags: Optional[str] = None
+    tags: Optional[str] = None,
+    view: str = "full",
+    sort: str = "created_at",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    format: str = "json"
 ):
+    """
+    List files a page at a time; pass the X-Next-Cursor header back as cursor
+    for the next page. view=summary returns metadata only (fetch content per
+    file on demand); format=ndjson streams all files instead of paging.
+    """
+    validate_listing(view, sort, cursor, format)
     query = {}
     if semester_id:
         query["semester_id"] = semester_id
@@ -576,49 +1433,230 @@ async def get_files(
         tag_list = [tag.strip() for tag in tags.split(",")]
         query["tags"] = {"$in": tag_list}
     
-    files = await db.tex_files.find(query).to_list(1000)
-    return [TexFile(**file) for file in files]
+    files = scan_files(query, view, sort, cursor)
+    return await listing_response(files, sort, limit, format, response)
 
 @api_router.get("/files/{file_id}", response_model=TexFile)
 async def get_file(file_id: str):
-    file = await db.tex_files.find_one({"id": file_id})
+    file = await find_file({"id": file_id})
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     return TexFile(**file)
 
-@api_router.put("/files/{file_id}", response_model=TexFile)
-async def update_file(file_id: str, file_update: TexFileUpdate):
-    file = await db.tex_files.find_one({"id": file_id})
-    if not file:
-        raise HTTPException(status_code=404, detail="File not found")
+@api_router.put("/files/{file_id}", response_model=Union[TexFile, TexFileSummary])
+async def update_file(file_id: str, file_update: TexFileUpdate, view: str = "full"):
+    """
+    Update the given fields in one atomic write. With expected_revision the
+    update is rejected (409) if the file changed since the client read it.
+    The file is read first only when the content or name changes: a new
+    version needs the current content and head, a rename needs the project.
+    Everything else is a single find_one_and_update, and view=summary returns
+    the file without its content, so a metadata edit never touches the blob store.
+    """
+    if view not in FILE_VIEWS:
+        raise HTTPException(status_code=400, detail=f"Unknown view '{view}', expected one of: {', '.join(FILE_VIEWS)}")
+    if file_update.engine is not None:
+        validate_engine(file_update.engine)
+    expected_revision = file_update.expected_revision
+    changes = file_update.dict(exclude_unset=True, exclude={"content", "expected_revision"})
     
-    file_obj = TexFile(**file)
+    file = None
+    if file_update.content or file_update.name is not None:
+        file = await db.tex_files.find_one({"id": file_id}, UPDATE_PROJECTION)
+        if not file:
+            raise HTTPException(status_code=404, detail="File not found")
+        if expected_revision is not None and file.get("revision", 0) != expected_revision:
+            await raise_update_failed(db.tex_files, file_id, "File", expected_revision)
+    if file_update.name is not None:
+        if file.get("project_id"):
+            changes["name"] = await validate_project_path(
+                file["project_id"], file["subject_id"], file_update.name, file_id
+            )
+        else:
+            changes["name"] = validate_file_name(file_update.name)
     
+    query = revision_query(file_id, expected_revision)
+    new_version = None
     # If content is being updated, create a new version
-    if file_update.content and file_update.content != file_obj.content:
-        new_version = create_file_version(file_update.content)
-        file_obj.versions.append(new_version)
-        file_obj.content = file_update.content
-        file_obj.word_count = new_version.word_count
-        file_obj.file_size = new_version.file_size
-    
-    # Update other fields
-    for key, value in file_update.dict(exclude_unset=True).items():
-        if key != "content":
-            setattr(file_obj, key, value)
+    current_content = await blob_store.get(file.get("content_hash")) if file_update.content else None
+    if file_update.content and file_update.content != current_content:
+        new_version = create_file_version(file_id, file.get("version_count", 0) + 1, file_update.content)
+        try:
+            await version_store.append(new_version.dict(), previous_content=current_content)
+        except VersionConflictError:
+            raise HTTPException(status_code=409, detail="File was modified concurrently, reload and retry")
+        changes.update({
+            "content_hash": await blob_store.put(file_update.content),
+            "head_version_id": new_version.id,
+            "version_count": new_version.sequence,
+            "word_count": new_version.word_count,
+            "file_size": new_version.file_size
+        })
+        # The head may only move forward from the version this one was based on
+        query["version_count"] = file.get("version_count", 0)
+    changes["updated_at"] = datetime.utcnow()
     
-    file_obj.updated_at = datetime.utcnow()
+    update = {"$set": changes, "$inc": {"revision": 1}}
+    if new_version or "compilation_status" in changes:
+        # The dashboard counters and the old blob need the values being replaced
+        before = await db.tex_files.find_one_and_update(query, update, return_document=ReturnDocument.BEFORE)
+        updated = {**before, **changes, "revision": before.get("revision", 0) + 1} if before else None
+    else:
+        before = None
+        updated = await db.tex_files.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    if not updated:
+        if new_version:
+            await version_store.discard(file_id, new_version.sequence)
+            await blob_store.release([changes["content_hash"]])
+        await raise_update_failed(db.tex_files, file_id, "File", expected_revision)
+    if before:
+        await dashboard_stats.file_changed(before, updated)
+    if new_version:
+        await index_files([{**updated, "content": file_update.content}])
+        await blob_store.release([before.get("content_hash")])
+    else:
+        await reindex_file_metadata(updated)
     
-    await db.tex_files.replace_one({"id": file_id}, file_obj.dict())
-    return file_obj
+    if file and updated.get("project_id") and (new_version or updated["name"] != file["name"]):
+        # Rebuild only the project roots that include this file
+        await recompile_dependent_roots(updated["project_id"], {file["name"], updated["name"]}, updated)
+    if view == "summary":
+        return TexFileSummary(**updated)
+    if new_version:
+        updated["content"] = file_update.content
+    return TexFile(**(await with_content([updated]))[0])
 
 @api_router.delete("/files/{file_id}")
 async def delete_file(file_id: str):
-    result = await db.tex_files.delete_one({"id": file_id})
-    if result.deleted_count == 0:
+    file = await db.tex_files.find_one_and_delete({"id": file_id})
+    if not file:
         raise HTTPException(status_code=404, detail="File not found")
+    await dashboard_stats.files_removed([file])
+    unindex_files([file_id])
+    await artifact_store.release([file_id])
+    await blob_store.release([file.get("content_hash")])
+    await version_store.delete([file_id])
+    build_dirs.remove(file_id)
+    if file.get("project_id"):
+        await recompile_dependent_roots(file["project_id"], [file["name"]])
     return {"message": "File deleted successfully"}
 
+# File listings (keyset pagination and NDJSON streaming)
+LISTING_BATCH_SIZE = 200
+
+async def scan_files(query: dict, view: str, sort: str, cursor: Optional[str]) -> AsyncIterator[BaseModel]:
+    """Iterate matching files in (sort, id) order after the cursor, loading content in batches"""
+    summary = view == "summary"
+    model = TexFileSummary if summary else TexFile
+    mongo_cursor = db.tex_files.find(
+        after_cursor(query, sort, cursor), FILE_SUMMARY_PROJECTION if summary else None
+    ).sort(sort_spec(sort))
+    
+    batch = []
+    async for file in mongo_cursor.batch_size(LISTING_BATCH_SIZE):
+        batch.append(file)
+        if len(batch) < LISTING_BATCH_SIZE:
+            continue
+        if not summary:
+            await with_content(batch)
+        for file in batch:
+            yield model(**file)
+        batch = []
+    if batch and not summary:
+        await with_content(batch)
+    for file in batch:
+        yield model(**file)
+
+def validate_listing(view: str, sort: str, cursor: Optional[str], format: str, ranked: bool = False):
+    """Reject bad listing parameters before a response starts streaming"""
+    if view not in FILE_VIEWS:
+        raise HTTPException(status_code=400, detail=f"Unknown view '{view}', expected one of: {', '.join(FILE_VIEWS)}")
+    if format not in LISTING_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}', expected one of: {', '.join(LISTING_FORMATS)}")
+    try:
+        if ranked and sort == RELEVANCE:
+            after_ranked([], cursor)
+        else:
+            sort_spec(sort)
+            after_cursor({}, sort, cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def files_in_order(
+    file_ids: AsyncIterator[str],
+    projection: Optional[dict],
+    content: bool,
+    batch_size: int = LISTING_BATCH_SIZE
+) -> AsyncIterator[dict]:
+    """File documents for a stream of ids, in that order, loaded in batches"""
+    iterator = file_ids.__aiter__()
+    ids, done = [], False
+    while not done:
+        try:
+            ids.append(await iterator.__anext__())
+        except StopAsyncIteration:
+            done = True
+        if ids and (done or len(ids) == batch_size):
+            files = await db.tex_files.find({"id": {"$in": ids}}, projection).to_list(None)
+            if content:
+                await with_content(files)
+            by_id = {f["id"]: f for f in files}
+            for file_id in ids:
+                # Skip files deleted since the search ran
+                if file_id in by_id:
+                    yield by_id[file_id]
+            ids = []
+
+async def listing_response(
+    files: AsyncIterator[BaseModel],
+    sort: str,
+    limit: Optional[int],
+    format: str,
+    response: Response,
+    cursor_item: Optional[Callable[[BaseModel], Dict[str, Any]]] = None
+):
+    """
+    One page (json) with X-Next-Cursor set when more files follow, or an NDJSON
+    stream of every file (up to limit if given) without buffering the result.
+    cursor_item gives the cursor fields of an item that isn't a bare file.
+    """
+    if format == "ndjson":
+        async def lines():
+            count = 0
+            async for file in files:
+                yield file.json() + "\n"
+                count += 1
+                if limit is not None and count >= limit:
+                    break
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
+    size = page_size(limit)
+    page = []
+    async for file in files:
+        if len(page) == size:
+            # One more match exists, so hand out a cursor for the next page
+            last = cursor_item(page[-1]) if cursor_item else page[-1].dict(include={sort, "id"})
+            response.headers["X-Next-Cursor"] = encode_cursor(sort, last)
+            break
+        page.append(file)
+    return page
+
+# Version history endpoints
+@api_router.get("/files/{file_id}/versions", response_model=List[FileVersion])
+async def get_file_versions(file_id: str, limit: int = 50, before: Optional[int] = None):
+    """Newest first; page back with before=<sequence of the last version seen>"""
+    if not await db.tex_files.find_one({"id": file_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="File not found")
+    versions = await version_store.list(file_id, min(max(limit, 1), 500), before, include_content=True)
+    return [FileVersion(**version) for version in versions]
+
+@api_router.get("/files/{file_id}/versions/{sequence}", response_model=FileVersion)
+async def get_file_version(file_id: str, sequence: int):
+    version = await version_store.get(file_id, sequence)
+    if not version:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return FileVersion(**version)
+
 # File upload endpoint
 @api_router.post("/files/upload")
 async def upload_file(
@@ -653,9 +1691,145 @@ async def upload_file(
     
     return await create_file(file_data)
 
+# Project endpoints
+MAX_ASSET_BYTES = 15 * 1024 * 1024
+
+@api_router.post("/projects", response_model=Project)
+async def create_project(project: ProjectCreate):
+    subject = await db.subjects.find_one({"id": project.subject_id})
+    if not subject:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    project_obj = Project(**project.dict())
+    await db.projects.insert_one(project_obj.dict())
+    return project_obj
+
+@api_router.get("/projects", response_model=List[Project])
+async def get_projects(subject_id: Optional[str] = None):
+    query = {"subject_id": subject_id} if subject_id else {}
+    projects = await db.projects.find(query).to_list(1000)
+    return [Project(**project) for project in projects]
+
+@api_router.get("/projects/{project_id}", response_model=Project)
+async def get_project(project_id: str):
+    project = await db.projects.find_one({"id": project_id})
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return Project(**project)
+
+@api_router.delete("/projects/{project_id}")
+async def delete_project(project_id: str):
+    if await db.tex_files.find_one({"project_id": project_id}):
+        raise HTTPException(status_code=400, detail="Project still has files")
+    result = await db.projects.delete_one({"id": project_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Project not found")
+    await db.project_assets.delete_many({"project_id": project_id})
+    return {"message": "Project deleted successfully"}
+
+@api_router.get("/projects/{project_id}/graph")
+async def get_project_graph(project_id: str):
+    await get_project(project_id)
+    files, assets = await load_project_files(project_id)
+    available = set(files) | set(assets)
+    nodes, edges, missing = [], [], {}
+    for path, f in sorted(files.items()):
+        resolved, unresolved = resolve_dependencies(f["content"], available)
+        nodes.append({
+            "path": path,
+            "type": "tex",
+            "file_id": f["id"],
+            "root": is_root_document(f["content"])
+        })
+        edges += [{"from": path, "to": target} for target in resolved]
+        if unresolved:
+            missing[path] = unresolved
+    nodes += [{"path": path, "type": "asset", "asset_id": a["id"]} for path, a in sorted(assets.items())]
+    return {"nodes": nodes, "edges": edges, "missing": missing}
+
+@api_router.post("/projects/{project_id}/compile", response_model=List[CompileJob])
+async def compile_project(project_id: str, root_id: Optional[str] = None):
+    """Rebuild every root document of a project (or just root_id)"""
+    await get_project(project_id)
+    files, _, _ = await refresh_project_dependencies(project_id)
+    roots = [f for f in files.values() if is_root_document(f["content"])]
+    if root_id:
+        roots = [f for f in roots if f["id"] == root_id]
+        if not roots:
+            raise HTTPException(status_code=404, detail="Root document not found in project")
+    return [await start_project_compile(root, PRIORITY_INTERACTIVE) for root in roots]
+
+@api_router.post("/projects/{project_id}/assets", response_model=ProjectAsset)
+async def upload_project_asset(project_id: str, file: UploadFile = File(...), path: str = Form("")):
+    await get_project(project_id)
+    asset_path = normalize_path(path or file.filename or "")
+    if asset_path is None:
+        raise HTTPException(status_code=400, detail="Invalid asset path")
+    if await db.tex_files.find_one({"project_id": project_id, "name": asset_path}):
+        raise HTTPException(status_code=400, detail=f"Project already has a file at {asset_path}")
+    data = await file.read()
+    if len(data) > MAX_ASSET_BYTES:
+        raise HTTPException(status_code=413, detail="Asset is too large")
+    
+    asset = ProjectAsset(project_id=project_id, path=asset_path, size=len(data))
+    existing = await db.project_assets.find_one({"project_id": project_id, "path": asset_path})
+    if existing:
+        asset.id = existing["id"]
+    await db.project_assets.replace_one(
+        {"project_id": project_id, "path": asset_path},
+        {**asset.dict(), "data": data},
+        upsert=True
+    )
+    await recompile_dependent_roots(project_id, [asset_path])
+    return asset
+
+@api_router.get("/projects/{project_id}/assets", response_model=List[ProjectAsset])
+async def get_project_assets(project_id: str):
+    assets = await db.project_assets.find({"project_id": project_id}, {"data": 0}).to_list(1000)
+    return [ProjectAsset(**asset) for asset in assets]
+
+@api_router.delete("/projects/{project_id}/assets/{asset_id}")
+async def delete_project_asset(project_id: str, asset_id: str):
+    asset = await db.project_assets.find_one_and_delete(
+        {"project_id": project_id, "id": asset_id}, projection={"data": 0}
+    )
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    await recompile_dependent_roots(project_id, [asset["path"]])
+    return {"message": "Asset deleted successfully"}
+
 # Search endpoint
-@api_router.post("/search")
-async def search_files(search_request: SearchRequest):
+async def ranked_ids(hits: List[Tuple[str, float]]) -> AsyncIterator[str]:
+    for file_id, _ in hits:
+        yield file_id
+
+async def sorted_ids(query: dict, sort: str, cursor: Optional[str]) -> AsyncIterator[str]:
+    mongo_cursor = db.tex_files.find(after_cursor(query, sort, cursor), {"_id": 0, "id": 1}).sort(sort_spec(sort))
+    async for file in mongo_cursor.batch_size(LISTING_BATCH_SIZE):
+        yield file["id"]
+
+@api_router.post("/search", response_model=SearchResults)
+async def search_files(search_request: SearchRequest, response: Response):
+    """
+    Full-text search over names, contents, notes and tags: words and "quoted
+    phrases" must all match, hits are ranked by BM25 unless sort is given.
+    Hits carry highlighted snippets of the content; facets count all matching
+    files by subject, semester, tag and compile status. Paged like GET /files
+    (cursor in the request body, next cursor in next_cursor and X-Next-Cursor).
+    
+    With "history": true the query matches past versions as well: hits are the
+    files where any version matched (not ranked, newest first by default),
+    with the runs of matching versions and the newest of them.
+    """
+    text = search_request.query.strip()
+    history = search_request.history
+    if history and not text:
+        raise HTTPException(status_code=400, detail="History search needs a query")
+    if history and not history_index.ready:
+        raise HTTPException(status_code=503, detail="The version history index is still being built")
+    ranked = bool(text) and not history
+    sort = search_request.sort or (RELEVANCE if ranked else "created_at")
+    validate_listing(search_request.view, sort, search_request.cursor, search_request.format, ranked=ranked)
+    filters = (search_request.subject_id, search_request.semester_id, search_request.tags)
     query = {}
     
     # Add filters
@@ -666,34 +1840,111 @@ async def search_files(search_request: SearchRequest):
     if search_request.tags:
         query["tags"] = {"$in": search_request.tags}
     
-    # Add text search
-    if search_request.query:
-        query["$or"] = [
-            {"name": {"$regex": search_request.query, "$options": "i"}},
-            {"content": {"$regex": search_request.query, "$options": "i"}},
-            {"notes": {"$regex": search_request.query, "$options": "i"}},
-            {"tags": {"$regex": search_request.query, "$options": "i"}}
-        ]
+    if history:
+        scores = {}
+        history_ranges = history_index.search(text)
+        # Filters apply to the files as they are now
+        matched = search_index.matching(*filters, file_ids=history_ranges)
+        query = {"id": {"$in": matched}}
+    elif text:
+        hits = search_index.search(text, *filters)
+        scores = dict(hits)
+        matched = [file_id for file_id, _ in hits]
+        # The index already applied the filters
+        query = {"id": {"$in": matched}}
+    else:
+        scores = {}
+        matched = search_index.matching(*filters)
+    
+    if sort == RELEVANCE:
+        file_ids = ranked_ids(after_ranked(hits, search_request.cursor))
+        cursor_item = lambda hit: {RELEVANCE: hit.score, "id": hit.file.id}
+    else:
+        file_ids = sorted_ids(query, sort, search_request.cursor)
+        cursor_item = lambda hit: hit.file.dict(include={sort, "id"})
+    
+    # Snippets need the content even for summaries
+    summary = search_request.view == "summary"
+    model = TexFileSummary if summary else TexFile
+    batch_size = LISTING_BATCH_SIZE
+    if search_request.format == "json":
+        batch_size = min(batch_size, page_size(search_request.limit) + 1)
+    files = files_in_order(
+        file_ids, FILE_SUMMARY_PROJECTION if summary and not text else None, not summary or bool(text), batch_size
+    )
+    
+    async def search_hits():
+        async for file in files:
+            spans = search_index.spans(file["id"], text) if text else []
+            yield SearchHit(
+                file=model(**file),
+                score=scores.get(file["id"]),
+                snippets=make_snippets(file["content"], spans) if spans else [],
+                history=await history_match(file["id"], history_ranges[file["id"]]) if history else None
+            )
     
-    files = await db.tex_files.find(query).to_list(1000)
-    return [TexFile(**file) for file in files]
+    page = await listing_response(
+        search_hits(), sort, search_request.limit, search_request.format, response, cursor_item
+    )
+    if search_request.format == "ndjson":
+        return page
+    return SearchResults(
+        hits=page,
+        total=len(matched),
+        facets=search_index.facets(matched),
+        next_cursor=response.headers.get("X-Next-Cursor")
+    )
+
+async def history_match(file_id: str, ranges: List[List[int]]) -> HistoryMatch:
+    """Matching version ranges of a history search hit, with the newest matching versions"""
+    sequences = []
+    for first, last in reversed(ranges):
+        wanted = HISTORY_VERSIONS_PER_HIT - len(sequences)
+        if wanted <= 0:
+            break
+        sequences.extend(range(last, max(first, last - wanted + 1) - 1, -1))
+    versions = await db.file_versions.find(
+        {"file_id": file_id, "sequence": {"$in": sequences}},
+        {"_id": 0, "id": 1, "sequence": 1, "created_at": 1}
+    ).sort("sequence", -1).to_list(None)
+    return HistoryMatch(
+        ranges=[tuple(r) for r in ranges],
+        versions=versions,
+        in_current=ranges[-1][1] == history_index.heads.get(file_id)
+    )
+
+@api_router.get("/search/stats")
+async def get_search_stats():
+    """Size of the full-text, autocomplete and version history indexes"""
+    return {**search_index.stats(), "suggestions": suggest_index.stats(), "history": history_index.stats()}
+
+@api_router.get("/suggest")
+async def suggest(q: str = "", limit: int = DEFAULT_SUGGESTIONS, kinds: Optional[str] = None):
+    """
+    Autocomplete for the search box: file names, subjects, tags and section
+    titles starting with the typed words, tolerating typos. kinds=file,tag
+    restricts the entry kinds.
+    """
+    wanted = [kind for kind in kinds.split(",") if kind] if kinds else None
+    unknown = set(wanted or []) - set(SUGGESTION_KINDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown kind '{sorted(unknown)[0]}', expected one of: {', '.join(SUGGESTION_KINDS)}"
+        )
+    return suggest_index.suggest(q, min(max(limit, 1), MAX_SUGGESTIONS), wanted)
 
 # Export endpoint
 @api_router.get("/export/{file_id}")
 async def export_file(file_id: str):
-    file = await db.tex_files.find_one({"id": file_id})
+    file = await find_file({"id": file_id})
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Create temporary file
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.tex', delete=False) as tmp_file:
-        tmp_file.write(file["content"])
-        tmp_file_path = tmp_file.name
-    
-    return FileResponse(
-        path=tmp_file_path,
-        filename=file["name"],
-        media_type='application/x-tex'
+    return Response(
+        content=file["content"],
+        media_type='application/x-tex',
+        headers=attachment_headers(file["name"])
     )
 
 # Bulk export endpoint
@@ -703,120 +1954,272 @@ async def export_bulk(file_ids: List[str]):
         raise HTTPException(status_code=400, detail="No files selected")
     
     # Get all files
-    files = await db.tex_files.find({"id": {"$in": file_ids}}).to_list(1000)
+    files = await with_content(await db.tex_files.find({"id": {"$in": file_ids}}).to_list(1000))
     
     if not files:
         raise HTTPException(status_code=404, detail="No files found")
     
-    # Create temporary zip file
-    with tempfile.NamedTemporaryFile(mode='w+b', suffix='.zip', delete=False) as tmp_zip:
-        zip_path = tmp_zip.name
-    
-    # Create zip file
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+    # Build the zip in memory, spilling to an anonymous temp file if it gets large
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
         for file in files:
             # Add file content directly to zip without creating temp files
             zipf.writestr(file["name"], file["content"])
+    zip_buffer.seek(0)
     
-    return FileResponse(
-        path=zip_path,
-        filename="latex_files.zip",
-        media_type='application/zip'
+    def iter_zip():
+        try:
+            while chunk := zip_buffer.read(256 * 1024):
+                yield chunk
+        finally:
+            zip_buffer.close()
+    
+    return StreamingResponse(
+        iter_zip(),
+        media_type='application/zip',
+        headers=attachment_headers("latex_files.zip")
     )
 
 # Dashboard stats endpoint
 @api_router.get("/stats")
 async def get_stats():
-    total_terms = await db.terms.count_documents({})
-    total_subjects = await db.subjects.count_documents({})
-    total_files = await db.tex_files.count_documents({})
-    
-    # Get files by compilation status
-    compilation_stats = await db.tex_files.aggregate([
-        {"$group": {"_id": "$compilation_status", "count": {"$sum": 1}}}
-    ]).to_list(1000)
+    """Dashboard totals from the materialized counters, independent of library size"""
+    counters = await dashboard_stats.snapshot()
+    totals = counters["totals"]
     
     # Get recent files
-    recent_files = await db.tex_files.find().sort("updated_at", -1).limit(5).to_list(5)
+    recent_files = await db.tex_files.find({}, FILE_SUMMARY_PROJECTION).sort("updated_at", -1).limit(5).to_list(5)
     
     return {
-        "total_terms": total_terms,
-        "total_subjects": total_subjects,
-        "total_files": total_files,
-        "compilation_stats": {stat["_id"]: stat["count"] for stat in compilation_stats},
-        "recent_files": [TexFile(**file) for file in recent_files]
+        "total_years": totals.get("years", 0),
+        "total_semesters": totals.get("semesters", 0),
+        "total_subjects": totals.get("subjects", 0),
+        "total_files": totals.get("files", 0),
+        "total_words": totals.get("words", 0),
+        "compilation_stats": totals.get("status", {}),
+        "by_year": counters["by_year"],
+        "by_semester": counters["by_semester"],
+        "by_subject": counters["by_subject"],
+        "recent_files": [TexFileSummary(**file) for file in recent_files]
     }
 
+# Hierarchy tree endpoint
+@api_router.get("/tree")
+async def get_tree(depth: str = "subjects", expand: Optional[str] = None):
+    """
+    Years, semesters, subjects and file summaries as one tree with per-node
+    totals. depth sets how far every branch goes; expand lists year, semester
+    or subject ids whose branches are returned whole, down to their files.
+    """
+    if depth not in TREE_DEPTHS:
+        raise HTTPException(status_code=400, detail=f"depth must be one of: {', '.join(TREE_DEPTHS)}")
+    expand_ids = [item.strip() for item in expand.split(",") if item.strip()] if expand else []
+    years = await db.years.aggregate(tree_pipeline(depth, expand_ids, FILE_SUMMARY_PROJECTION)).to_list(None)
+    return {"depth": depth, "years": shape_tree(years, depth, expand_ids)}
+
+@api_router.post("/stats/rebuild")
+async def rebuild_stats():
+    """Recompute the dashboard counters from scratch (after manual database edits)"""
+    return {"scopes": await dashboard_stats.rebuild()}
+
 # Compilation endpoint
+def compile_response(status: str, output: Optional[str], error: Optional[str] = None, up_to_date: bool = False) -> dict:
+    """Response body of the compile endpoint"""
+    if status == "success":
+        return {
+            "status": status,
+            "message": "Compilation successful",
+            "pdf_available": True,
+            "output": output,
+            "up_to_date": up_to_date
+        }
+    return {
+        "status": status,
+        "message": "Compilation failed",
+        "pdf_available": False,
+        "output": output,
+        "error": error,
+        "up_to_date": up_to_date
+    }
+
+async def reject_project_fragment(file: dict):
+    """A project file that is not a root only builds as part of the roots that include it"""
+    files, _, current = await refresh_project_dependencies(file["project_id"])
+    roots = [path for path, f in files.items() if is_root_document(f["content"])]
+    including = dependent_roots(current, roots, file["name"])
+    if including:
+        detail = f"{file['name']} is not a root document; compile a root that includes it: {', '.join(including)}"
+    else:
+        detail = f"{file['name']} is not a root document and no root of its project includes it"
+    raise HTTPException(status_code=400, detail=detail)
+
 @api_router.post("/files/{file_id}/compile")
-async def compile_file(file_id: str):
-    """Compile a LaTeX file to PDF"""
-    file = await db.tex_files.find_one({"id": file_id})
+async def compile_file(file_id: str, background: bool = False, force: bool = False):
+    """
+    Compile a LaTeX file to PDF (or queue a compile job with background=true)
+    Unchanged content returns the last result unless force=true. Project
+    files without a \\documentclass are fragments and are rejected (400)
+    with the roots that include them.
+    """
+    file = await find_file({"id": file_id})
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
+    if file.get("project_id") and not is_root_document(file["content"]):
+        await reject_project_fragment(file)
     
-    # Compile the LaTeX content
-    status, output, result = await compile_latex_to_pdf(file["content"], file["name"])
+    engine = file.get("engine", DEFAULT_ENGINE)
+    workspace = await project_workspace(file)
+    content_hash = pdf_cache_key(file["content"], file["name"], engine, files=workspace)
+    if (not force
+            and file.get("compiled_content_hash") == content_hash
+            and file.get("compilation_status") in ("success", "error")):
+        return compile_response(
+            file["compilation_status"],
+            file.get("compilation_output"),
+            error="Compilation failed (content unchanged since last compile)",
+            up_to_date=True
+        )
     
-    # Update file with compilation results
-    file_obj = TexFile(**file)
-    file_obj.compilation_status = status
-    file_obj.compilation_output = output
-    file_obj.updated_at = datetime.utcnow()
+    if background:
+        job = CompileJob(file_id=file_id)
+        await set_compile_state({"id": file_id}, {"compilation_status": "pending", "compile_job_id": job.id})
+        await enqueue_compile_job(
+            job, file["content"], file["name"], engine, PRIORITY_INTERACTIVE, force, files=workspace
+        )
+        return job
     
-    await db.tex_files.replace_one({"id": file_id}, file_obj.dict())
+    # Compile the LaTeX content
+    status, output, result = await compile_latex_to_pdf(
+        file["content"], file["name"], engine, force=force, build_id=file_id, files=workspace
+    )
     
+    # Update file with compilation results
+    await record_compile_result(file_id, status, output, content_hash)
     if status == "success":
-        return {
-            "status": status,
-            "message": "Compilation successful",
-            "pdf_available": True,
-            "output": output
-        }
-    else:
-        return {
-            "status": status,
-            "message": "Compilation failed",
-            "pdf_available": False,
-            "output": output,
-            "error": result
-        }
+        await artifact_store.retain(file_id, result)
+    
+    return compile_response(status, output, error=result)
+
+# Compile job status endpoint
+@api_router.get("/jobs/{job_id}", response_model=CompileJob)
+async def get_job(job_id: str):
+    job = await db.compile_jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return CompileJob(**job)
 
 # PDF download endpoint
 @api_router.get("/files/{file_id}/pdf")
 async def get_pdf(file_id: str):
     """Get compiled PDF for a file"""
-    file = await db.tex_files.find_one({"id": file_id})
+    file = await find_file({"id": file_id})
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     
+    engine = file.get("engine", DEFAULT_ENGINE)
+    workspace = await project_workspace(file)
+    content_hash = pdf_cache_key(file["content"], file["name"], engine, files=workspace)
+    if file.get("compilation_status") == "error" and file.get("compiled_content_hash") == content_hash:
+        # Recompiling unchanged content would fail the same way
+        raise HTTPException(status_code=400, detail="Compilation failed (content unchanged since last compile)")
+    
     if file.get("compilation_status") != "success":
         # Try to compile first
-        status, output, result = await compile_latex_to_pdf(file["content"], file["name"])
+        status, output, result = await compile_latex_to_pdf(
+            file["content"], file["name"], engine, build_id=file_id, files=workspace
+        )
         
         # Update file with compilation results
-        file_obj = TexFile(**file)
-        file_obj.compilation_status = status
-        file_obj.compilation_output = output
-        file_obj.updated_at = datetime.utcnow()
-        
-        await db.tex_files.replace_one({"id": file_id}, file_obj.dict())
+        await record_compile_result(file_id, status, output, content_hash)
         
         if status != "success":
             raise HTTPException(status_code=400, detail=f"Compilation failed: {result}")
         
-        pdf_path = result
+        artifact_key = result
+        await artifact_store.retain(file_id, artifact_key)
     else:
-        # Re-compile to get fresh PDF
-        status, output, pdf_path = await compile_latex_to_pdf(file["content"], file["name"])
+        # Already compiled; the PDF cache serves unchanged content without recompiling
+        status, output, artifact_key = await compile_latex_to_pdf(
+            file["content"], file["name"], engine, build_id=file_id, files=workspace
+        )
         if status != "success":
-            raise HTTPException(status_code=400, detail=f"Compilation failed: {pdf_path}")
+            raise HTTPException(status_code=400, detail=f"Compilation failed: {artifact_key}")
     
-    return FileResponse(
-        path=pdf_path,
-        filename=file["name"].replace('.tex', '.pdf'),
-        media_type='application/pdf'
+    return artifact_response(artifact_key, file["name"].replace('.tex', '.pdf'), 'application/pdf')
+
+# Draft preview endpoint
+@api_router.get("/files/{file_id}/preview")
+async def get_preview(file_id: str):
+    """Single draft pass PDF for quick previews; does not change the file's compile status"""
+    file = await find_file({"id": file_id})
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    status, output, result = await compile_latex_to_pdf(
+        file["content"], file["name"], file.get("engine", DEFAULT_ENGINE), mode=MODE_PREVIEW,
+        build_id=file_id, files=await project_workspace(file)
     )
+    if status != "success":
+        raise HTTPException(status_code=400, detail=f"Preview failed: {result}")
+    
+    return artifact_response(result, file["name"].replace('.tex', '.pdf'), 'application/pdf')
+
+# Available TeX engines endpoint
+@api_router.get("/engines")
+async def get_engines():
+    """TeX engines files can be compiled with"""
+    return [
+        {"name": name, "installed": engine.available(), "default": name == DEFAULT_ENGINE}
+        for name, engine in tex_engines.items()
+    ]
+
+# PDF cache stats endpoint
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters of the compiled PDF cache and artifact store usage"""
+    return {**pdf_cache.stats(), "artifacts": await artifact_store.stats()}
+
+# Artifact garbage collection endpoint
+@api_router.post("/cache/gc")
+async def collect_cache_garbage():
+    """Run artifact garbage collection now"""
+    return await artifact_store.collect_garbage()
+
+# Content blob store endpoints
+@api_router.get("/blobs/stats")
+async def get_blob_stats():
+    """Deduplication and compression counters of the content blob store"""
+    return await blob_store.stats()
+
+@api_router.post("/blobs/gc")
+async def collect_blob_garbage():
+    """Delete content blobs no file or version references"""
+    return await blob_store.collect_garbage()
+
+# Index admin endpoints
+@api_router.get("/admin/indexes")
+async def get_index_status():
+    """Declared indexes per collection and which of them are missing"""
+    return await index_manager.status()
+
+@api_router.get("/admin/explain")
+async def explain_hot_queries():
+    """Query plans of the hot queries; any with collscan=true needs an index"""
+    report = await index_manager.explain()
+    return {
+        "collscans": [entry["query"] for entry in report if entry.get("collscan")],
+        "queries": report
+    }
+
+# Compile scheduler stats endpoint
+@api_router.get("/compile/stats")
+async def get_compile_stats():
+    """Worker pool and queue counters of the compile scheduler"""
+    return {
+        **compile_scheduler.stats(),
+        **compile_singleflight.stats(),
+        "preamble_formats": format_cache.stats()
+    }
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -827,6 +2230,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Configure logging
@@ -836,6 +2240,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_compile_scheduler():
+    await index_manager.ensure()
+    await version_store.migrate_embedded(db.tex_files)
+    await version_store.migrate_inline_snapshots()
+    await migrate_inline_file_content()
+    await dashboard_stats.ensure()
+    await sync_search_index()
+    await load_suggestions()
+    history_index.load()
+    spawn_background(sync_history_index())
+    compile_scheduler.start()
+    await resume_compile_jobs()
+    spawn_background(collect_garbage_periodically())
+
+@app.on_event("shutdown")
+async def stop_compile_scheduler():
+    for task in list(background_tasks):
+        task.cancel()
+    await compile_scheduler.stop()
+    await save_index(search_index)
+    await save_index(history_index)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
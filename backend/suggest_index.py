@@ -0,0 +1,229 @@
+"""Type-ahead suggestions for the search box.
+
+An in-memory index of short entries: file names, subject names, tags and
+section titles. Entry words are kept in a sorted list, so every word starting
+with a typed prefix is one bisect plus a short scan, and in a trigram index
+for typo tolerance: words sharing trigrams with the typed word are checked
+with an edit distance against their prefix of the same length ("fourei"
+still finds "Fourier"). Every typed word must start a word of the entry
+("lin alg" finds "Linear Algebra").
+
+The index is filled at startup from the subjects and the search index's file
+metadata and updated on every write, so a lookup never touches the database.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from latex_tokenizer import words
+
+KINDS = ("subject", "file", "tag", "section")
+KIND_ORDER = {kind: order for order, kind in enumerate(KINDS)}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Words checked per typed word (a single letter starts too many words to rank them all)
+MAX_PREFIX_WORDS = 200
+MAX_LETTER_PREFIX_WORDS = 40
+MAX_FUZZY_CANDIDATES = 50
+# Penalties: a whole word beats a prefix, which beats a typo
+EXACT, PREFIX = 0.0, 0.25
+
+EntryKey = Tuple[str, str]  # (kind, id or normalized text)
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"^{word}"
+    return {padded[i:i + 3] for i in range(max(1, len(padded) - 2))}
+
+
+def max_typos(word: str) -> int:
+    if len(word) < 3:
+        return 0
+    return 1 if len(word) < 7 else 2
+
+
+def prefix_distance(typed: str, word: str, limit: int) -> Optional[int]:
+    """
+    Edit distance (with transpositions) between typed and the closest prefix
+    of word, or None if it is over limit
+    """
+    columns = len(word) + 1
+    previous_previous: Optional[List[int]] = None
+    previous = list(range(columns))
+    for i in range(1, len(typed) + 1):
+        current = [i] + [0] * (columns - 1)
+        for j in range(1, columns):
+            cost = typed[i - 1] != word[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and j > 1
+                    and typed[i - 1] == word[j - 2] and typed[i - 2] == word[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return None
+        previous_previous, previous = previous, current
+    distance = min(previous)
+    return distance if distance <= limit else None
+
+
+class SuggestIndex:
+    """Prefix and typo-tolerant lookup of file names, subjects, tags and section titles"""
+
+    def __init__(self):
+        self.entries: Dict[EntryKey, Dict[str, Any]] = {}
+        self.word_entries: Dict[str, Set[EntryKey]] = {}
+        self.sorted_words: List[str] = []
+        self.trigram_words: Dict[str, Set[str]] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}  # file id -> what was indexed for it
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # Entries
+    def _link(self, word: str, key: EntryKey):
+        keys = self.word_entries.get(word)
+        if keys is None:
+            keys = self.word_entries[word] = set()
+            insort(self.sorted_words, word)
+            for gram in trigrams(word):
+                self.trigram_words.setdefault(gram, set()).add(word)
+        keys.add(key)
+
+    def _unlink(self, word: str, key: EntryKey):
+        keys = self.word_entries.get(word)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self.word_entries[word]
+            del self.sorted_words[bisect_left(self.sorted_words, word)]
+            for gram in trigrams(word):
+                grams = self.trigram_words[gram]
+                grams.discard(word)
+                if not grams:
+                    del self.trigram_words[gram]
+
+    def _add(self, key: EntryKey, text: str, **data):
+        self._remove(key)
+        self.entries[key] = {"kind": key[0], "text": text, **data}
+        for word in set(words(text)):
+            self._link(word, key)
+
+    def _remove(self, key: EntryKey):
+        entry = self.entries.pop(key, None)
+        if entry:
+            for word in set(words(entry["text"])):
+                self._unlink(word, key)
+
+    def _count(self, kind: str, text: str, delta: int):
+        """Entries shared by files (tags, section titles) count the files using them"""
+        key = (kind, text.lower())
+        entry = self.entries.get(key)
+        count = (entry["count"] if entry else 0) + delta
+        if count <= 0:
+            self._remove(key)
+        elif entry:
+            entry["count"] = count
+        else:
+            self._add(key, text, count=count)
+
+    # Updates
+    def set_file(self, file_id: str, metadata: Dict[str, Any]):
+        """Index a file's name, tags and section titles (metadata as kept by the search index)"""
+        self.remove_file(file_id)
+        indexed = {
+            "name": metadata.get("name") or "",
+            "subject_id": metadata.get("subject_id"),
+            "tags": sorted(set(metadata.get("tags") or [])),
+            "sections": sorted(set(metadata.get("sections") or [])),
+        }
+        self.files[file_id] = indexed
+        self._add(("file", file_id), indexed["name"], id=file_id, subject_id=indexed["subject_id"])
+        for tag in indexed["tags"]:
+            self._count("tag", tag, 1)
+        for title in indexed["sections"]:
+            self._count("section", title, 1)
+
+    def remove_file(self, file_id: str):
+        indexed = self.files.pop(file_id, None)
+        if indexed is None:
+            return
+        self._remove(("file", file_id))
+        for tag in indexed["tags"]:
+            self._count("tag", tag, -1)
+        for title in indexed["sections"]:
+            self._count("section", title, -1)
+
+    def set_subject(self, subject_id: str, name: str):
+        self._add(("subject", subject_id), name or "", id=subject_id)
+
+    def remove_subject(self, subject_id: str):
+        self._remove(("subject", subject_id))
+
+    # Lookup
+    def _word_matches(self, typed: str) -> Dict[str, float]:
+        """Indexed words starting with (or close to starting with) a typed word, with their penalty"""
+        matches: Dict[str, float] = {}
+        if typed in self.word_entries:
+            matches[typed] = EXACT
+        start = bisect_left(self.sorted_words, typed)
+        count = MAX_PREFIX_WORDS if len(typed) > 1 else MAX_LETTER_PREFIX_WORDS
+        for word in self.sorted_words[start:start + count]:
+            if not word.startswith(typed):
+                break
+            matches.setdefault(word, PREFIX)
+        limit = max_typos(typed)
+        if limit:
+            shared: Dict[str, int] = {}
+            for gram in trigrams(typed):
+                for word in self.trigram_words.get(gram, ()):
+                    shared[word] = shared.get(word, 0) + 1
+            candidates = heapq.nlargest(MAX_FUZZY_CANDIDATES, shared, key=shared.__getitem__)
+            for word in candidates:
+                if word in matches:
+                    continue
+                distance = prefix_distance(typed, word, limit)
+                if distance is not None:
+                    matches[word] = distance
+        return matches
+
+    def suggest(
+        self,
+        query: str,
+        limit: int = DEFAULT_LIMIT,
+        kinds: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Best entries for what was typed so far, closest matches first"""
+        typed = words(query)
+        if not typed:
+            return []
+        wanted = set(kinds) if kinds else None
+        penalties: Optional[Dict[EntryKey, float]] = None
+        for word in typed:
+            entry_penalties: Dict[EntryKey, float] = {}
+            for match, penalty in self._word_matches(word).items():
+                for key in self.word_entries[match]:
+                    if wanted is None or key[0] in wanted:
+                        if penalty < entry_penalties.get(key, float("inf")):
+                            entry_penalties[key] = penalty
+            if penalties is None:
+                penalties = entry_penalties
+            else:
+                penalties = {
+                    key: penalties[key] + penalty for key, penalty in entry_penalties.items() if key in penalties
+                }
+            if not penalties:
+                return []
+
+        def rank(key: EntryKey):
+            entry = self.entries[key]
+            return (penalties[key], KIND_ORDER[key[0]], -entry.get("count", 1), len(entry["text"]), entry["text"])
+
+        best = heapq.nsmallest(limit, penalties, key=rank)
+        return [dict(self.entries[key]) for key in best]
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {kind: 0 for kind in KINDS}
+        for kind, _ in self.entries:
+            counts[kind] += 1
+        return {"entries": counts, "words": len(self.sorted_words), "trigrams": len(self.trigram_words)}
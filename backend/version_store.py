@@ -0,0 +1,288 @@
+"""Version history of tex files, kept outside the file documents.
+
+Every save of a file's content becomes one document in the versions
+collection, numbered by a per-file sequence (1 = the initial content). The
+tex_files document only points at its head version, so it stays small no
+matter how long the history gets, and listing files never loads history.
+
+Versions are delta-compressed: every snapshot_interval-th version (and any
+version whose delta would not be much smaller) stores the full content, the
+others store a line diff against the previous version. Rebuilding a version
+replays at most snapshot_interval - 1 diffs on top of the nearest snapshot.
+Snapshot contents live in the blob store (`content_hash`), so identical
+snapshots of different files are stored once. Documents written before
+delta compression (full `content`, no `snapshot_sequence`) are read as
+snapshots and moved into the blob store at startup.
+"""
+
+import asyncio
+import difflib
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_INTERVAL = 20
+# Store a snapshot instead when the delta would be larger than this share of the content
+MAX_DELTA_RATIO = 0.5
+# Fields returned when listing history without the (large) content
+SUMMARY_PROJECTION = {"_id": 0, "content": 0, "delta": 0}
+
+# A delta is a list of ops applied to the previous version's lines:
+# [start, end] copies those lines, a string is inserted as-is
+Delta = List[Union[List[int], str]]
+
+
+class VersionConflictError(Exception):
+    """Another save already took the sequence number"""
+
+
+def make_delta(base: str, target: str) -> Delta:
+    """Line diff that turns base into target"""
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    delta: Delta = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append(''.join(target_lines[j1:j2]))
+    return delta
+
+
+def apply_delta(base_lines: List[str], delta: Delta) -> List[str]:
+    """Lines of the version a delta describes, given the previous version's lines"""
+    lines: List[str] = []
+    for op in delta:
+        if isinstance(op, str):
+            lines.extend(op.splitlines(keepends=True))
+        else:
+            lines.extend(base_lines[op[0]:op[1]])
+    return lines
+
+
+def delta_size(delta: Delta) -> int:
+    """Approximate stored size of a delta in bytes"""
+    return sum(len(op.encode('utf-8')) if isinstance(op, str) else 16 for op in delta)
+
+
+def encode_version(
+    version: Dict[str, Any],
+    previous_content: Optional[str],
+    previous_snapshot: Optional[int],
+    snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL
+) -> Dict[str, Any]:
+    """
+    Storage document for a version: a snapshot, or a delta against the
+    previous version (previous_snapshot: snapshot_sequence of that version)
+    """
+    document = dict(version)
+    content = document.pop("content")
+    sequence = document["sequence"]
+    if previous_content is not None and previous_snapshot is not None \
+            and sequence - previous_snapshot < snapshot_interval:
+        delta = make_delta(previous_content, content)
+        if delta_size(delta) <= MAX_DELTA_RATIO * len(content.encode('utf-8')):
+            document["snapshot_sequence"] = previous_snapshot
+            document["delta"] = delta
+            return document
+    document["snapshot_sequence"] = sequence
+    document["content"] = content
+    return document
+
+
+def rebuild_contents(documents: Iterable[Dict[str, Any]], wanted: Optional[Set[int]] = None) -> Dict[int, str]:
+    """
+    Contents by sequence for consecutive storage documents in ascending order
+    (the first one must be a snapshot); only the wanted sequences if given
+    """
+    contents: Dict[int, str] = {}
+    lines = None
+    for document in documents:
+        if "delta" in document:
+            if lines is None:
+                raise ValueError(f"Version {document['sequence']} has no snapshot to rebuild from")
+            lines = apply_delta(lines, document["delta"])
+        else:
+            lines = document["content"].splitlines(keepends=True)
+        if wanted is None or document["sequence"] in wanted:
+            contents[document["sequence"]] = ''.join(lines)
+    return contents
+
+
+class VersionStore:
+    """Per-file version documents indexed by (file_id, sequence)"""
+
+    def __init__(self, collection, blobs, snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL):
+        self.collection = collection
+        self.blobs = blobs
+        self.snapshot_interval = max(1, snapshot_interval)
+
+    async def append(self, version: Dict[str, Any], previous_content: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a version; its (file_id, sequence) must not exist yet.
+        previous_content is the content of version sequence - 1, if known.
+        """
+        previous_snapshot = None
+        if previous_content is not None and version["sequence"] > 1:
+            previous = await self.collection.find_one(
+                {"file_id": version["file_id"], "sequence": version["sequence"] - 1},
+                {"_id": 0, "sequence": 1, "snapshot_sequence": 1}
+            )
+            if previous:
+                previous_snapshot = previous.get("snapshot_sequence", previous["sequence"])
+        document = await asyncio.to_thread(
+            encode_version, version, previous_content, previous_snapshot, self.snapshot_interval
+        )
+        if "content" in document:
+            document["content_hash"] = await self.blobs.put(document.pop("content"))
+        try:
+            await self.collection.insert_one(document)
+        except DuplicateKeyError:
+            await self.blobs.release([document.get("content_hash")])
+            raise VersionConflictError(
+                f"Version {version['sequence']} of file {version['file_id']} already exists"
+            )
+        return version
+
+    async def append_initial(self, versions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store the first version of several new files with one insert"""
+        documents = [encode_version(version, None, None, self.snapshot_interval) for version in versions]
+        hashes = await self.blobs.put_many([document.pop("content") for document in documents])
+        for document, key in zip(documents, hashes):
+            document["content_hash"] = key
+        if documents:
+            await self.collection.insert_many(documents)
+        return versions
+
+    async def _contents(self, file_id: str, low: int, high: int) -> Dict[int, str]:
+        """Rebuild the contents of versions low..high"""
+        first = await self.collection.find_one(
+            {"file_id": file_id, "sequence": low}, {"_id": 0, "sequence": 1, "snapshot_sequence": 1}
+        )
+        if not first:
+            return {}
+        start = first.get("snapshot_sequence", first["sequence"])
+        documents = await self.collection.find(
+            {"file_id": file_id, "sequence": {"$gte": start, "$lte": high}},
+            {"_id": 0, "sequence": 1, "content": 1, "content_hash": 1, "delta": 1}
+        ).sort("sequence", ASCENDING).to_list(None)
+        snapshots = await self.blobs.get_many(d.get("content_hash") for d in documents)
+        for document in documents:
+            if "content_hash" in document:
+                document["content"] = snapshots[document["content_hash"]]
+        wanted = set(range(low, high + 1))
+        return await asyncio.to_thread(rebuild_contents, documents, wanted)
+
+    async def list(
+        self,
+        file_id: str,
+        limit: int = 50,
+        before: Optional[int] = None,
+        include_content: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Newest first; pass before=<sequence> to page further back"""
+        query: Dict[str, Any] = {"file_id": file_id}
+        if before is not None:
+            query["sequence"] = {"$lt": before}
+        cursor = self.collection.find(query, SUMMARY_PROJECTION).sort("sequence", DESCENDING).limit(limit)
+        versions = await cursor.to_list(None)
+        if include_content and versions:
+            contents = await self._contents(file_id, versions[-1]["sequence"], versions[0]["sequence"])
+            for version in versions:
+                version["content"] = contents[version["sequence"]]
+        return versions
+
+    async def get(self, file_id: str, sequence: int) -> Optional[Dict[str, Any]]:
+        version = await self.collection.find_one({"file_id": file_id, "sequence": sequence}, SUMMARY_PROJECTION)
+        if version:
+            version["content"] = (await self._contents(file_id, sequence, sequence))[sequence]
+        return version
+
+    async def replay(self, file_id: str, after: int = 0) -> AsyncIterator[Tuple[int, str]]:
+        """(sequence, content) of every version after a sequence, oldest first"""
+        newest = await self.collection.find_one(
+            {"file_id": file_id}, {"_id": 0, "sequence": 1}, sort=[("sequence", DESCENDING)]
+        )
+        if not newest:
+            return
+        low = after + 1
+        # Rebuild a few snapshot intervals at a time instead of one version at a time
+        step = self.snapshot_interval * 5
+        while low <= newest["sequence"]:
+            high = min(newest["sequence"], low + step - 1)
+            contents = await self._contents(file_id, low, high)
+            for sequence in sorted(contents):
+                yield sequence, contents[sequence]
+            low = high + 1
+
+    async def discard(self, file_id: str, sequence: int):
+        """Remove one version again (its save was abandoned)"""
+        document = await self.collection.find_one_and_delete(
+            {"file_id": file_id, "sequence": sequence}, {"_id": 0, "content_hash": 1}
+        )
+        if document:
+            await self.blobs.release([document.get("content_hash")])
+
+    async def delete(self, file_ids: Iterable[str]):
+        file_ids = list(file_ids)
+        if file_ids:
+            snapshots = await self.collection.find(
+                {"file_id": {"$in": file_ids}, "content_hash": {"$exists": True}},
+                {"_id": 0, "content_hash": 1}
+            ).to_list(None)
+            await self.collection.delete_many({"file_id": {"$in": file_ids}})
+            await self.blobs.release(s["content_hash"] for s in snapshots)
+
+    async def migrate_inline_snapshots(self) -> int:
+        """Move snapshot contents still stored inline into the blob store"""
+        migrated = 0
+        async for document in self.collection.find({"content": {"$exists": True}}, {"_id": 0, "id": 1, "content": 1}):
+            key = await self.blobs.put(document["content"])
+            result = await self.collection.update_one(
+                {"id": document["id"], "content": {"$exists": True}},
+                {"$set": {"content_hash": key}, "$unset": {"content": ""}}
+            )
+            if not result.modified_count:
+                await self.blobs.release([key])
+            migrated += 1
+        if migrated:
+            logger.info(f"Moved {migrated} inline version snapshots into the blob store")
+        return migrated
+
+    async def migrate_embedded(self, files_collection) -> int:
+        """
+        Move histories still embedded in tex_files documents (the old `versions`
+        array) into this collection. Safe to rerun: already-copied versions are
+        skipped and a file is only rewritten once all of its versions are stored.
+        Returns: number of files migrated
+        """
+        migrated = 0
+        cursor = files_collection.find({"versions": {"$exists": True}}, {"_id": 0, "id": 1, "versions": 1})
+        async for file in cursor:
+            head_id = None
+            previous_content = None
+            versions = file.get("versions") or []
+            for sequence, version in enumerate(versions, start=1):
+                version = {**version, "file_id": file["id"], "sequence": sequence}
+                try:
+                    await self.append(version, previous_content)
+                except VersionConflictError:
+                    pass
+                head_id = version["id"]
+                previous_content = version["content"]
+            await files_collection.update_one(
+                {"id": file["id"]},
+                {
+                    "$set": {"head_version_id": head_id, "version_count": len(versions)},
+                    "$unset": {"versions": ""}
+                }
+            )
+            migrated += 1
+        if migrated:
+            logger.info(f"Moved embedded version history of {migrated} files into the versions collection")
+        return migrated
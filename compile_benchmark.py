@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark LaTeX compile times with and without precompiled preamble formats
+
+Compares a plain compile, a cold compile (format is built first) and warm
+compiles that reuse the cached format. Needs a TeX engine and the
+mylatexformat package installed locally; MongoDB is not required.
+
+Usage: python compile_benchmark.py [--engine xelatex] [--runs 5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from preamble_formats import FormatCache  # noqa: E402
+
+SAMPLE_DOCUMENT = r"""\documentclass{article}
+\usepackage{amsmath}
+\usepackage{amssymb}
+\usepackage{tikz}
+\usetikzlibrary{arrows.meta,positioning}
+\usepackage{hyperref}
+
+\begin{document}
+\section{Benchmark}
+Euler's identity: $e^{i\pi} + 1 = 0$.
+\begin{align}
+  \int_0^1 x^2 \, dx &= \frac{1}{3}
+\end{align}
+\begin{tikzpicture}
+  \node (a) {A};
+  \node[right=of a] (b) {B};
+  \draw[-{Stealth}] (a) -- (b);
+\end{tikzpicture}
+\end{document}
+"""
+
+
+async def compile_once(engine, content, extra_args=(), extra_env=None):
+    """Run one compile in a scratch directory and return the wall time"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tex_path = os.path.join(temp_dir, "bench.tex")
+        with open(tex_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        env = {**os.environ, **extra_env} if extra_env else None
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            engine, '-interaction=nonstopmode', *extra_args, tex_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=temp_dir,
+            env=env
+        )
+        await process.wait()
+        elapsed = time.perf_counter() - start
+        if process.returncode != 0 or not os.path.exists(os.path.join(temp_dir, "bench.pdf")):
+            raise RuntimeError(f"{engine} failed with return code {process.returncode}")
+        return elapsed
+
+
+async def run_benchmark(engine, runs):
+    print(f"=== Preamble format benchmark ({engine}, {runs} runs) ===")
+
+    plain = [await compile_once(engine, SAMPLE_DOCUMENT) for _ in range(runs)]
+    print(f"📄 Plain compile:         {statistics.mean(plain):.3f}s avg")
+
+    with tempfile.TemporaryDirectory() as format_dir:
+        cache = FormatCache(format_dir)
+
+        start = time.perf_counter()
+        prepared = await cache.prepare(engine, SAMPLE_DOCUMENT)
+        if prepared is None:
+            print("❌ Format build failed (is mylatexformat installed?)")
+            return False
+        content, args, env = prepared
+        cold = time.perf_counter() - start + await compile_once(engine, content, args, env)
+        print(f"🧊 Cold (build + compile): {cold:.3f}s")
+
+        warm = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            content, args, env = await cache.prepare(engine, SAMPLE_DOCUMENT)
+            warm.append(time.perf_counter() - start + await compile_once(engine, content, args, env))
+        print(f"🔥 Warm compile:          {statistics.mean(warm):.3f}s avg")
+
+    print(f"\n✅ Warm speedup over plain: {statistics.mean(plain) / statistics.mean(warm):.2f}x")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--engine", default="xelatex")
+    parser.add_argument("--runs", type=int, default=5)
+    options = parser.parse_args()
+    success = asyncio.run(run_benchmark(options.engine, options.runs))
+    sys.exit(0 if success else 1)
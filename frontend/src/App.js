@@ -5,6 +5,35 @@ import './App.css';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// File summaries fetched per page of the file listing
+const FILE_PAGE_SIZE = 60;
+
+// Split the /tree response (down to subjects) back into flat lists of years, semesters and subjects
+const flattenTree = (tree) => {
+  const lists = { years: [], semesters: [], subjects: [] };
+  tree.years.forEach(({ semesters = [], ...year }) => {
+    lists.years.push(year);
+    semesters.forEach(({ subjects = [], ...semester }) => {
+      lists.semesters.push(semester);
+      lists.subjects.push(...subjects);
+    });
+  });
+  return lists;
+};
+
+// Search snippet with its matches marked
+const Snippet = ({ snippet }) => {
+  const parts = [];
+  let last = 0;
+  snippet.highlights.forEach(([start, end], index) => {
+    parts.push(snippet.text.slice(last, start));
+    parts.push(<mark key={index}>{snippet.text.slice(start, end)}</mark>);
+    last = end;
+  });
+  parts.push(snippet.text.slice(last));
+  return <p className="text-xs text-gray-600 font-mono break-words">{parts}</p>;
+};
+
 // Components
 const Modal = ({ isOpen, onClose, title, children }) => {
   if (!isOpen) return null;
@@ -29,6 +58,32 @@ const Modal = ({ isOpen, onClose, title, children }) => {
 
 const FilePreview = ({ file, onClose }) => {
   const [activeTab, setActiveTab] = useState('content');
+  const [versions, setVersions] = useState(null);
+  const [details, setDetails] = useState(file.content !== undefined ? file : null);
+  const content = details ? details.content : null;
+
+  // Listings only carry metadata; load content and notes when the preview opens
+  useEffect(() => {
+    if (details === null) {
+      axios.get(`${API}/files/${file.id}`)
+        .then(response => setDetails(response.data))
+        .catch(error => {
+          console.error('Error loading file:', error);
+          setDetails({ ...file, content: '' });
+        });
+    }
+  }, [details, file]);
+
+  useEffect(() => {
+    if (activeTab === 'versions' && versions === null) {
+      axios.get(`${API}/files/${file.id}/versions`)
+        .then(response => setVersions(response.data))
+        .catch(error => {
+          console.error('Error loading versions:', error);
+          setVersions([]);
+        });
+    }
+  }, [activeTab, versions, file.id]);
   
   return (
     <Modal isOpen={true} onClose={onClose} title={file.name}>
@@ -63,7 +118,7 @@ const FilePreview = ({ file, onClose }) => {
                 : 'text-gray-500'
             }`}
           >
-            Versions ({file.versions?.length || 0})
+            Versions ({file.version_count || 0})
           </button>
         </div>
 
@@ -72,13 +127,14 @@ const FilePreview = ({ file, onClose }) => {
           <div className="space-y-4">
             <div className="bg-gray-50 p-4 rounded-lg">
               <pre className="text-sm whitespace-pre-wrap font-mono max-h-96 overflow-y-auto">
-                {file.content}
+                {content === null ? 'Loading...' : content}
               </pre>
             </div>
             <div className="flex space-x-4">
               <button
+                disabled={content === null}
                 onClick={() => {
-                  const blob = new Blob([file.content], { type: 'text/plain' });
+                  const blob = new Blob([content], { type: 'text/plain' });
                   const url = URL.createObjectURL(blob);
                   const a = document.createElement('a');
                   a.href = url;
@@ -134,10 +190,10 @@ const FilePreview = ({ file, onClose }) => {
               </div>
             </div>
             
-            {file.notes && (
+            {details?.notes && (
               <div>
                 <label className="block text-sm font-medium text-gray-700">Notes</label>
-                <p className="mt-1 text-sm text-gray-900">{file.notes}</p>
+                <p className="mt-1 text-sm text-gray-900">{details.notes}</p>
               </div>
             )}
             
@@ -159,11 +215,12 @@ const FilePreview = ({ file, onClose }) => {
 
         {activeTab === 'versions' && (
           <div className="space-y-4">
-            {file.versions?.map((version, index) => (
+            {versions === null && <p className="text-sm text-gray-500">Loading versions...</p>}
+            {versions?.map((version) => (
               <div key={version.id} className="border rounded-lg p-4">
                 <div className="flex justify-between items-start mb-2">
                   <div>
-                    <h4 className="font-medium">Version {file.versions.length - index}</h4>
+                    <h4 className="font-medium">Version {version.sequence}</h4>
                     <p className="text-sm text-gray-500">
                       {new Date(version.created_at).toLocaleString()}
                     </p>
@@ -470,7 +527,11 @@ const AddFileModal = ({ isOpen, onClose, onSuccess, years, semesters, subjects }
           tags: formData.tags.split(',').map(tag => tag.trim()).filter(tag => tag),
           notes: formData.notes
         };
-        await axios.post(`${API}/files/multi-upload`, multiUploadData);
+        const response = await axios.post(`${API}/files/multi-upload`, multiUploadData);
+        const failed = response.data.filter(result => result.status !== 'created');
+        if (failed.length > 0) {
+          console.warn('Some files were not uploaded:', failed.map(result => `${result.name}: ${result.error}`));
+        }
       } else {
         // Single file upload
         const data = {
@@ -794,12 +855,15 @@ function App() {
   const [semesters, setSemesters] = useState([]);
   const [subjects, setSubjects] = useState([]);
   const [files, setFiles] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [stats, setStats] = useState({});
   const [loading, setLoading] = useState(true);
   const [selectedYear, setSelectedYear] = useState('');
   const [selectedSemester, setSelectedSemester] = useState('');
   const [selectedSubject, setSelectedSubject] = useState('');
   const [searchQuery, setSearchQuery] = useState('');
+  const [submittedQuery, setSubmittedQuery] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
   const [previewFile, setPreviewFile] = useState(null);
 
   // Modal states
@@ -808,23 +872,23 @@ function App() {
   const [showCreateSubject, setShowCreateSubject] = useState(false);
   const [showAddFile, setShowAddFile] = useState(false);
 
-  // Load data
+  // Load data (the hierarchy with file counts; file lists are paged in when the files view needs them)
   const loadData = async () => {
     try {
       setLoading(true);
-      const [yearsRes, semestersRes, subjectsRes, filesRes, statsRes] = await Promise.all([
-        axios.get(`${API}/years`),
-        axios.get(`${API}/semesters`),
-        axios.get(`${API}/subjects`),
-        axios.get(`${API}/files`),
+      const [treeRes, statsRes] = await Promise.all([
+        axios.get(`${API}/tree`, { params: { depth: 'subjects' } }),
         axios.get(`${API}/stats`)
       ]);
       
-      setYears(yearsRes.data);
-      setSemesters(semestersRes.data);
-      setSubjects(subjectsRes.data);
-      setFiles(filesRes.data);
+      const tree = flattenTree(treeRes.data);
+      setYears(tree.years);
+      setSemesters(tree.semesters);
+      setSubjects(tree.subjects);
       setStats(statsRes.data);
+      if (currentView === 'files' && !submittedQuery) {
+        loadFiles();
+      }
     } catch (error) {
       console.error('Error loading data:', error);
     } finally {
@@ -832,20 +896,40 @@ function App() {
     }
   };
 
+  // One page of file summaries; pass the previous page's cursor to append the next one
+  const loadFiles = async (cursor = null) => {
+    try {
+      const response = await axios.get(`${API}/files`, {
+        params: {
+          view: 'summary',
+          subject_id: selectedSubject || undefined,
+          limit: FILE_PAGE_SIZE,
+          cursor: cursor || undefined
+        }
+      });
+      setFiles(previous => (cursor ? [...previous, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error loading files:', error);
+    }
+  };
+
   // Search files
   const searchFiles = async () => {
-    if (!searchQuery.trim()) {
-      loadData();
+    if (!submittedQuery.trim()) {
+      loadFiles();
       return;
     }
 
     try {
       const response = await axios.post(`${API}/search`, {
-        query: searchQuery,
+        query: submittedQuery,
         term_id: selectedTerm || null,
-        subject_id: selectedSubject || null
+        subject_id: selectedSubject || null,
+        view: 'summary'
       });
-      setFiles(response.data);
+      setFiles(response.data.hits.map(hit => ({ ...hit.file, snippets: hit.snippets })));
+      setNextCursor(null);
     } catch (error) {
       console.error('Error searching files:', error);
     }
@@ -863,13 +947,44 @@ function App() {
   }, []);
 
   useEffect(() => {
-    const timeoutId = setTimeout(() => {
-      if (searchQuery) {
-        searchFiles();
+    if (submittedQuery) {
+      searchFiles();
+    } else if (currentView === 'files') {
+      loadFiles();
+    }
+  }, [currentView, submittedQuery, selectedTerm, selectedSubject]);
+
+  // Type-ahead uses the light /suggest endpoint; the full search runs on Enter or when a suggestion is picked
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    const timeoutId = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/suggest`, { params: { q: searchQuery, limit: 8 } });
+        setSuggestions(response.data);
+      } catch (error) {
+        console.error('Error loading suggestions:', error);
       }
-    }, 300);
+    }, 100);
     return () => clearTimeout(timeoutId);
-  }, [searchQuery, selectedTerm, selectedSubject]);
+  }, [searchQuery]);
+
+  const submitSearch = (query) => {
+    setSuggestions([]);
+    setSearchQuery(query);
+    setSubmittedQuery(query.trim());
+  };
+
+  const pickSuggestion = (suggestion) => {
+    if (suggestion.kind === 'subject') {
+      setSelectedSubject(suggestion.id);
+      submitSearch('');
+    } else {
+      submitSearch(suggestion.text);
+    }
+  };
 
   // Render functions
   const renderDashboard = () => (
@@ -941,14 +1056,34 @@ function App() {
       {/* Search and filters */}
       <div className="bg-white p-6 rounded-lg shadow">
         <div className="grid grid-cols-1 md:grid-cols-4 gap-4">
-          <div>
+          <div className="relative">
             <input
               type="text"
               placeholder="Search files..."
               value={searchQuery}
-              onChange={(e) => setSearchQuery(e.target.value)}
+              onChange={(e) => {
+                setSearchQuery(e.target.value);
+                if (!e.target.value && submittedQuery) {
+                  submitSearch('');
+                }
+              }}
+              onKeyDown={(e) => e.key === 'Enter' && submitSearch(searchQuery)}
               className="w-full border-gray-300 rounded-md shadow-sm focus:ring-blue-500 focus:border-blue-500"
             />
+            {suggestions.length > 0 && (
+              <ul className="absolute z-10 mt-1 w-full bg-white border border-gray-200 rounded-md shadow-lg">
+                {suggestions.map(suggestion => (
+                  <li
+                    key={`${suggestion.kind}:${suggestion.id || suggestion.text}`}
+                    onClick={() => pickSuggestion(suggestion)}
+                    className="px-3 py-2 text-sm cursor-pointer hover:bg-gray-100 flex justify-between"
+                  >
+                    <span className="truncate">{suggestion.text}</span>
+                    <span className="text-xs text-gray-400 ml-2">{suggestion.kind}</span>
+                  </li>
+                ))}
+              </ul>
+            )}
           </div>
           <div>
             <select
@@ -1032,6 +1167,14 @@ function App() {
                 </div>
               </div>
               
+              {file.snippets && file.snippets.length > 0 && (
+                <div className="mt-3 space-y-1">
+                  {file.snippets.map((snippet, index) => (
+                    <Snippet key={index} snippet={snippet} />
+                  ))}
+                </div>
+              )}
+              
               {file.tags && file.tags.length > 0 && (
                 <div className="mt-3 flex flex-wrap gap-1">
                   {file.tags.slice(0, 3).map((tag, index) => (
@@ -1056,13 +1199,10 @@ function App() {
                 </button>
                 <button
                   onClick={() => {
-                    const blob = new Blob([file.content], { type: 'text/plain' });
-                    const url = URL.createObjectURL(blob);
                     const a = document.createElement('a');
-                    a.href = url;
+                    a.href = `${API}/export/${file.id}`;
                     a.download = file.name;
                     a.click();
-                    URL.revokeObjectURL(url);
                   }}
                   className="bg-gray-500 text-white px-3 py-2 rounded text-sm hover:bg-gray-600"
                 >
@@ -1073,6 +1213,16 @@ function App() {
           );
         })}
       </div>
+      {nextCursor && (
+        <div className="text-center">
+          <button
+            onClick={() => loadFiles(nextCursor)}
+            className="bg-white border border-gray-300 text-gray-700 px-4 py-2 rounded hover:bg-gray-50"
+          >
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 
@@ -1157,7 +1307,6 @@ function App() {
           {subjects.map(subject => {
             const semester = semesters.find(s => s.id === subject.semester_id);
             const year = years.find(y => y.id === semester?.year_id);
-            const subjectFiles = files.filter(f => f.subject_id === subject.id);
             
             return (
               <div key={subject.id} className="border rounded-lg p-4">
@@ -1175,7 +1324,7 @@ function App() {
                   <p className="text-sm text-gray-600 mt-2">{subject.description}</p>
                 )}
                 <div className="mt-2 text-sm text-gray-600">
-                  {subjectFiles.length} files
+                  {subject.file_count || 0} files
                 </div>
               </div>
             );
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+# The backend modules import each other as top-level modules
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture(scope="session")
+def server():
+    """The API module on an in-memory database, with its files in a temp dir"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+    data_dir = Path(tempfile.mkdtemp(prefix="latex-tracker-tests-"))
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "latex_tracker_tests")
+    os.environ.setdefault("PREAMBLE_FORMATS", "0")
+    for name, default in [
+        ("ARTIFACT_DIR", "artifacts"), ("FORMAT_CACHE_DIR", "format_cache"), ("BUILD_DIR", "builds"),
+        ("SEARCH_INDEX_PATH", "search_index/index.json.gz"),
+        ("HISTORY_INDEX_PATH", "search_index/history.json.gz"),
+    ]:
+        os.environ.setdefault(name, str(data_dir / default))
+    import server as server_module
+    return server_module
+
+
+class Api:
+    """
+    Runs async scenarios against the app on a database of its own
+    Compile jobs are recorded in queued instead of being run.
+    """
+
+    def __init__(self, server, monkeypatch, tmp_path):
+        from artifact_store import ArtifactStore, LocalArtifactBackend
+        from blob_store import BlobStore
+        from dashboard_stats import DashboardStats
+        from history_index import HistoryIndex
+        from pdf_cache import PdfCache
+        from search_index import SearchIndex
+        from suggest_index import SuggestIndex
+        from version_store import VersionStore
+
+        self.server = server
+        self.db = server.client[f"test_{uuid.uuid4().hex}"]
+        self.queued = []
+        self.blob_store = BlobStore(self.db.blobs)
+        artifact_store = ArtifactStore(
+            self.db.artifacts, LocalArtifactBackend(tmp_path / "artifacts"), max_bytes=1 << 20, ttl=timedelta(hours=1)
+        )
+        for name, value in [
+            ("db", self.db),
+            ("blob_store", self.blob_store),
+            ("version_store", VersionStore(self.db.file_versions, self.blob_store)),
+            ("dashboard_stats", DashboardStats(self.db, ttl=0)),
+            ("artifact_store", artifact_store),
+            ("pdf_cache", PdfCache(artifact_store)),
+            ("search_index", SearchIndex(tmp_path / "index.json.gz")),
+            ("suggest_index", SuggestIndex()),
+            ("history_index", HistoryIndex(tmp_path / "history.json.gz")),
+            ("history_lock", asyncio.Lock()),
+            ("enqueue_compile_job", self.enqueue),
+        ]:
+            monkeypatch.setattr(server, name, value)
+
+    async def enqueue(self, job, content, filename, *args, **kwargs):
+        await self.db.compile_jobs.insert_one(job.dict())
+        self.queued.append((job, filename))
+        return job
+
+    def run(self, scenario):
+        """Run scenario(client) with an httpx client on the app"""
+        import httpx
+        from db_indexes import IndexManager
+
+        async def main():
+            transport = httpx.ASGITransport(app=self.server.app)
+            await IndexManager(self.db).ensure()
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+        return asyncio.run(main())
+
+    async def create_hierarchy(self, client, year=2026, semester="Fall", subject="Physics"):
+        """A year, semester and subject to put files in; returns their ids"""
+        year_id = (await client.post("/api/years", json={"year": year})).json()["id"]
+        semester_id = (await client.post("/api/semesters", json={"name": semester, "year_id": year_id})).json()["id"]
+        subject_id = (await client.post(
+            "/api/subjects", json={"name": subject, "semester_id": semester_id}
+        )).json()["id"]
+        return year_id, semester_id, subject_id
+
+    async def create_file(self, client, subject_id, semester_id, name="notes.tex", content="Hello", **fields):
+        response = await client.post("/api/files", json={
+            "name": name, "subject_id": subject_id, "semester_id": semester_id, "content": content, **fields
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+
+@pytest.fixture
+def api(server, monkeypatch, tmp_path):
+    return Api(server, monkeypatch, tmp_path)
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from artifact_store import ArtifactStore, LocalArtifactBackend
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+TTL = timedelta(hours=1)
+
+
+def run(tmp_path, scenario, max_bytes=1000):
+    """Run scenario(store, make_file) on a local store in tmp_path with a small size cap"""
+    def make_file(name, size):
+        path = tmp_path / "sources" / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"%" * size)
+        return str(path)
+
+    async def main():
+        collection = mongomock_motor.AsyncMongoMockClient()["artifacts_test"]["artifacts"]
+        store = ArtifactStore(collection, LocalArtifactBackend(tmp_path / "artifacts"), max_bytes, TTL)
+        return await scenario(store, make_file)
+    return asyncio.run(main())
+
+
+async def age(store, key, by):
+    """Pretend key was last used `by` ago"""
+    await store.collection.update_one({"key": key}, {"$set": {"last_access": datetime.utcnow() - by}})
+
+
+async def keys(store):
+    return sorted([entry["key"] async for entry in store.collection.find({})])
+
+
+def test_unreferenced_artifacts_expire_after_the_ttl(tmp_path):
+    async def scenario(store, make_file):
+        for key in ("old.pdf", "recent.pdf", "kept.pdf"):
+            await store.put(key, make_file(key, 10), "pdf", "application/pdf")
+        await store.retain("file-1", "kept.pdf")
+        await age(store, "old.pdf", TTL + timedelta(minutes=1))
+        await age(store, "recent.pdf", TTL - timedelta(minutes=1))
+        await age(store, "kept.pdf", TTL * 10)
+
+        assert await store.collect_garbage() == {"deleted": 1, "freed_bytes": 10}
+        assert await keys(store) == ["kept.pdf", "recent.pdf"]
+        assert store.local_path("old.pdf") is None
+        assert await store.get("old.pdf") is None
+
+    run(tmp_path, scenario)
+
+
+def test_least_recently_used_are_evicted_past_the_size_cap(tmp_path):
+    async def scenario(store, make_file):
+        for minutes, key in enumerate(["d.pdf", "c.pdf", "b.pdf", "a.pdf"]):
+            await store.put(key, make_file(key, 300), "pdf", "application/pdf")
+            # a is the oldest; nothing is old enough to expire
+            await age(store, key, timedelta(minutes=10 + minutes))
+        await store.retain("file-1", "a.pdf")
+
+        # 1200 bytes against a cap of 1000: the oldest unreferenced one goes
+        assert await store.collect_garbage() == {"deleted": 1, "freed_bytes": 300}
+        assert await keys(store) == ["a.pdf", "c.pdf", "d.pdf"]
+
+        store.max_bytes = 500
+        # The referenced one is older, but all unreferenced ones go first
+        assert (await store.collect_garbage())["deleted"] == 2
+        assert await keys(store) == ["a.pdf"]
+
+        store.max_bytes = 100
+        assert (await store.collect_garbage())["deleted"] == 1
+        assert await keys(store) == []
+
+    run(tmp_path, scenario)
+
+
+def test_recently_used_artifacts_survive_eviction(tmp_path):
+    async def scenario(store, make_file):
+        await store.put("old.pdf", make_file("old", 600), "pdf", "application/pdf")
+        await age(store, "old.pdf", timedelta(minutes=30))
+        await store.put("new.pdf", make_file("new", 600), "pdf", "application/pdf")
+        assert (await store.collect_garbage())["deleted"] == 1
+        assert await keys(store) == ["new.pdf"]
+        # Over the cap, but within the grace period of a download
+        assert (await store.collect_garbage())["deleted"] == 0
+
+    run(tmp_path, scenario)
+
+
+def test_recompiling_moves_the_reference_to_the_new_artifact(tmp_path):
+    async def scenario(store, make_file):
+        await store.put("v1.pdf", make_file("v1", 10), "pdf", "application/pdf")
+        await store.retain("file-1", "v1.pdf")
+        await store.retain("file-2", "v1.pdf")  # an identical file shares the cached PDF
+
+        await store.put("v2.pdf", make_file("v2", 10), "pdf", "application/pdf")
+        await store.retain("file-1", "v2.pdf")
+        await store.retain("file-1", "v2.pdf")
+        assert (await store.get("v1.pdf"))["refs"] == ["file-2"]
+        assert (await store.get("v2.pdf"))["refs"] == ["file-1"]
+
+        await store.release(["file-2"])
+        for key in ("v1.pdf", "v2.pdf"):
+            await age(store, key, TTL * 2)
+        assert (await store.collect_garbage())["deleted"] == 1
+        assert await keys(store) == ["v2.pdf"]
+        assert (await store.stats())["referenced"] == 1
+
+    run(tmp_path, scenario)
+
+
+def test_a_missing_backend_file_drops_the_registry_entry(tmp_path):
+    async def scenario(store, make_file):
+        await store.put("gone.pdf", make_file("gone", 10), "pdf", "application/pdf")
+        await store.backend.delete("gone.pdf")
+        assert await store.get("gone.pdf") is None
+        assert await keys(store) == []
+
+    run(tmp_path, scenario)
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from blob_store import MIN_COMPRESS_BYTES, BlobStore, content_hash
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+LONG_TEXT = "\\section{Waves} A wave carries energy from one place to another. " * 20
+
+
+def run(scenario):
+    """Run scenario(collection) on an empty blobs collection"""
+    async def main():
+        collection = mongomock_motor.AsyncMongoMockClient()["blobs_test"]["blobs"]
+        await collection.create_index("hash", unique=True)
+        return await scenario(collection)
+    return asyncio.run(main())
+
+
+async def refs(collection, text):
+    blob = await collection.find_one({"hash": content_hash(text)})
+    return blob and blob["refs"]
+
+
+def test_identical_texts_are_stored_once():
+    async def scenario(collection):
+        store = BlobStore(collection)
+        first = await store.put(LONG_TEXT)
+        second = await store.put(LONG_TEXT)
+        await store.put(LONG_TEXT, refs=3)
+        assert first == second == content_hash(LONG_TEXT)
+        assert await collection.count_documents({}) == 1
+        assert await refs(collection, LONG_TEXT) == 5
+        assert (store.written, store.deduplicated) == (1, 2)
+
+    run(scenario)
+
+
+def test_garbage_collection_deletes_only_unreferenced_blobs():
+    async def scenario(collection):
+        store = BlobStore(collection)
+        await store.put("kept")
+        await store.put("released")
+        await store.put("released")
+        await store.release([content_hash("released")])
+        assert await refs(collection, "released") == 1
+        assert await store.collect_garbage() == {"deleted": 0, "freed_bytes": 0}
+
+        await store.release([content_hash("released"), None])
+        assert await refs(collection, "released") == 0
+        assert (await store.collect_garbage())["deleted"] == 1
+        assert await collection.find_one({"hash": content_hash("released")}) is None
+        assert await refs(collection, "kept") == 1
+
+    run(scenario)
+
+
+def test_put_revives_a_released_blob():
+    async def scenario(collection):
+        store = BlobStore(collection)
+        await store.put("text")
+        await store.release([content_hash("text")])
+        await store.put("text")
+        assert (await store.collect_garbage())["deleted"] == 0
+        assert await refs(collection, "text") == 1
+
+    run(scenario)
+
+
+@pytest.mark.parametrize("codec", ["zlib", "none"])
+@pytest.mark.parametrize("text", ["short", LONG_TEXT, "Unicode: éè ∑ α"])
+def test_texts_round_trip(codec, text):
+    async def scenario(collection):
+        key = await BlobStore(collection, codec).put(text)
+        # A fresh store has nothing cached and decodes from the stored blob
+        assert await BlobStore(collection, codec).get(key) == text
+        blob = await collection.find_one({"hash": key})
+        compressed = codec == "zlib" and len(text.encode("utf-8")) >= MIN_COMPRESS_BYTES
+        assert blob["codec"] == ("zlib" if compressed else "none")
+        assert blob["size"] == len(text.encode("utf-8"))
+        assert (blob["stored_size"] < blob["size"]) == compressed
+
+    run(scenario)
+
+
+def test_put_many_counts_duplicates_within_and_across_calls():
+    async def scenario(collection):
+        store = BlobStore(collection)
+        await store.put("existing")
+        keys = await store.put_many(["new", "existing", "new", LONG_TEXT, "new"])
+        assert keys == [content_hash(t) for t in ["new", "existing", "new", LONG_TEXT, "new"]]
+        assert await collection.count_documents({}) == 3
+        assert await refs(collection, "new") == 3
+        assert await refs(collection, "existing") == 2
+        assert await refs(collection, LONG_TEXT) == 1
+        assert await BlobStore(collection).get_many(keys) == {
+            content_hash("new"): "new", content_hash("existing"): "existing", content_hash(LONG_TEXT): LONG_TEXT
+        }
+
+    run(scenario)
+
+
+def test_a_failed_update_releases_only_its_own_references(api, monkeypatch):
+    version_store = api.server.version_store
+    append = version_store.append
+
+    async def append_then_lose_the_race(version, previous_content=None):
+        stored = await append(version, previous_content)
+        await api.db.tex_files.update_one({"id": version["file_id"]}, {"$inc": {"version_count": 1}})
+        return stored
+
+    async def scenario(client):
+        _, semester_id, subject_id = await api.create_hierarchy(client)
+        await api.create_file(client, subject_id, semester_id, "shared.tex", LONG_TEXT)
+        file = await api.create_file(client, subject_id, semester_id, "draft.tex", "Draft")
+        # The shared file and its first version
+        assert await refs(api.db.blobs, LONG_TEXT) == 2
+        monkeypatch.setattr(version_store, "append", append_then_lose_the_race)
+        response = await client.put(f"/api/files/{file['id']}", json={"content": LONG_TEXT})
+        assert response.status_code == 409
+        assert await refs(api.db.blobs, LONG_TEXT) == 2
+        assert await refs(api.db.blobs, "Draft") == 2
+
+    api.run(scenario)
+
+
+def test_inline_file_content_is_moved_into_the_blob_store(api):
+    async def scenario(client):
+        await api.db.tex_files.insert_many([
+            {"id": "a", "name": "a.tex", "content": LONG_TEXT},
+            {"id": "b", "name": "b.tex", "content": LONG_TEXT},
+            {"id": "c", "name": "c.tex", "content_hash": await api.blob_store.put("stored")},
+        ])
+        assert await api.server.migrate_inline_file_content() == 2
+        async for file in api.db.tex_files.find({"id": {"$in": ["a", "b"]}}):
+            assert "content" not in file
+            assert file["content_hash"] == content_hash(LONG_TEXT)
+        assert await refs(api.db.blobs, LONG_TEXT) == 2
+        assert await refs(api.db.blobs, "stored") == 1
+        assert await api.server.migrate_inline_file_content() == 0
+        files = await api.server.with_content(await api.db.tex_files.find({}, {"_id": 0}).to_list(None))
+        assert {f["id"]: f["content"] for f in files} == {"a": LONG_TEXT, "b": LONG_TEXT, "c": "stored"}
+
+    api.run(scenario)
@@ -0,0 +1,28 @@
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.mark.parametrize("path", ["main.tex", "chapters/one.tex", "chapters/../main.tex"])
+def test_paths_inside_the_build_directory(server, tmp_path, path):
+    assert server.workspace_path(str(tmp_path), path).startswith(str(tmp_path.resolve()) + "/")
+
+
+@pytest.mark.parametrize("path", ["../escaped.tex", "a/../../escaped.tex", "/tmp/escaped.tex", "."])
+def test_paths_leaving_the_build_directory(server, tmp_path, path):
+    with pytest.raises(ValueError):
+        server.workspace_path(str(tmp_path), path)
+
+
+def test_symlinks_out_of_the_build_directory_are_refused(server, tmp_path):
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "link").symlink_to(tmp_path)
+    with pytest.raises(ValueError):
+        server.workspace_path(str(tmp_path / "build"), "link/escaped.tex")
+
+
+def test_file_names_are_normalized(server):
+    assert server.validate_file_name("./notes/week 1.tex") == "notes/week 1.tex"
+    for name in ["../../../../tmp/rv/escaped.tex", "/etc/passwd", ".."]:
+        with pytest.raises(HTTPException) as error:
+            server.validate_file_name(name)
+        assert error.value.status_code == 400
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import pytest
+
+from compile_scheduler import (
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE, CompileQueueFullError, CompileScheduler, CompileSchedulerClosedError,
+    SingleFlight
+)
+
+
+def test_interactive_jobs_run_before_batch_jobs():
+    async def run():
+        scheduler = CompileScheduler(workers=1)
+        order = []
+        gate = asyncio.Event()
+
+        def job(name):
+            async def compile():
+                if name == "first":
+                    await gate.wait()
+                order.append(name)
+            return compile
+
+        first = asyncio.create_task(scheduler.submit(job("first")))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(scheduler.submit(job("batch"), PRIORITY_BATCH)),
+            asyncio.create_task(scheduler.submit(job("interactive"), PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *waiting)
+        await scheduler.stop()
+        return order
+
+    assert asyncio.run(run()) == ["first", "interactive", "batch"]
+
+
+def test_full_queue_rejects_jobs():
+    async def run():
+        scheduler = CompileScheduler(workers=1, max_queue=1)
+        gate = asyncio.Event()
+        running = asyncio.create_task(scheduler.submit(gate.wait))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(scheduler.submit(gate.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(CompileQueueFullError):
+            await scheduler.submit(gate.wait)
+        assert scheduler.stats()["rejected"] == 1
+        gate.set()
+        await asyncio.gather(running, queued)
+        await scheduler.stop()
+
+    asyncio.run(run())
+
+
+def test_stopped_scheduler_fails_queued_and_new_jobs():
+    async def run():
+        scheduler = CompileScheduler(workers=1)
+        gate = asyncio.Event()
+        running = asyncio.create_task(scheduler.submit(gate.wait))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(scheduler.submit(gate.wait))
+        await asyncio.sleep(0)
+        await scheduler.stop()
+        for task in (running, queued):
+            with pytest.raises(CompileSchedulerClosedError):
+                await task
+        with pytest.raises(CompileSchedulerClosedError):
+            await scheduler.submit(gate.wait)
+
+    asyncio.run(run())
+
+
+def test_scheduler_errors_map_to_429_and_503(server):
+    async def run():
+        full = await server.compile_queue_full_handler(None, CompileQueueFullError(retry_after=7))
+        closed = await server.compile_scheduler_closed_handler(None, CompileSchedulerClosedError())
+        return full, closed
+
+    full, closed = asyncio.run(run())
+    assert full.status_code == 429
+    assert full.headers["Retry-After"] == "7"
+    assert json.loads(full.body) == {"detail": "Compile queue is full, try again later"}
+    assert closed.status_code == 503
+
+
+def test_single_flight_shares_one_call():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+        gate = asyncio.Event()
+
+        async def compile():
+            nonlocal calls
+            calls += 1
+            await gate.wait()
+            return "pdf"
+
+        waiters = [asyncio.create_task(flight.do("key", compile)) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*waiters)
+        # Once finished, the next call runs again
+        again = await flight.do("key", compile)
+        return calls, results, again, flight.stats()
+
+    calls, results, again, stats = asyncio.run(run())
+    assert results == ["pdf"] * 3
+    assert again == "pdf"
+    assert calls == 2
+    assert stats == {"in_flight": 0, "deduplicated": 2}
+
+
+def test_single_flight_survives_a_cancelled_waiter():
+    async def run():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+
+        async def compile():
+            await gate.wait()
+            return "pdf"
+
+        impatient = asyncio.create_task(flight.do("key", compile))
+        patient = asyncio.create_task(flight.do("key", compile))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        gate.set()
+        return await patient
+
+    assert asyncio.run(run()) == "pdf"
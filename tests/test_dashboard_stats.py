@@ -0,0 +1,104 @@
+LONG = "one two three four five six seven eight nine ten"
+
+
+async def stats(client):
+    response = await client.get("/api/stats")
+    assert response.status_code == 200
+    return response.json()
+
+
+def breakdowns(counters):
+    """The stats response without the parts not kept in counters, zero fields dropped"""
+    def clean(document):
+        return {k: v for k, v in document.items() if v}
+    return {
+        "totals": {
+            key: counters[key]
+            for key in ("total_years", "total_semesters", "total_subjects", "total_files", "total_words", "compilation_stats")
+        },
+        **{kind: {scope: clean(doc) for scope, doc in counters[kind].items()}
+           for kind in ("by_year", "by_semester", "by_subject")},
+    }
+
+
+def test_counters_follow_creates_edits_compiles_and_deletes(api):
+    async def scenario(client):
+        year_id, semester_id, subject_id = await api.create_hierarchy(client)
+        a = await api.create_file(client, subject_id, semester_id, "a.tex", "Hello world")
+        b = await api.create_file(client, subject_id, semester_id, "b.tex", LONG)
+        counters = await stats(client)
+        assert (counters["total_years"], counters["total_semesters"], counters["total_subjects"]) == (1, 1, 1)
+        assert (counters["total_files"], counters["total_words"]) == (2, 12)
+        assert counters["compilation_stats"] == {"pending": 2}
+        for scope in (counters["by_year"][year_id], counters["by_semester"][semester_id],
+                      counters["by_subject"][subject_id]):
+            assert (scope["files"], scope["words"]) == (2, 12)
+
+        await client.put(f"/api/files/{a['id']}", json={"content": "Hello brave new world"})
+        assert (await stats(client))["total_words"] == 14
+        await api.server.set_compile_state({"id": b["id"]}, {"compilation_status": "success"})
+        await client.put(f"/api/files/{a['id']}", json={"compilation_status": "error"})
+        counters = await stats(client)
+        assert counters["compilation_stats"] == {"success": 1, "error": 1}
+        assert counters["by_subject"][subject_id]["status"] == {"success": 1, "error": 1}
+
+        await client.delete(f"/api/files/{b['id']}")
+        counters = await stats(client)
+        assert (counters["total_files"], counters["total_words"]) == (1, 4)
+        assert counters["compilation_stats"] == {"error": 1}
+        assert counters["by_year"][year_id]["bytes"] == len("Hello brave new world")
+
+    api.run(scenario)
+
+
+def test_file_changed_moves_counts_between_subjects_and_semesters(api):
+    async def scenario(client):
+        fall_year, fall, physics = await api.create_hierarchy(client)
+        spring_year, spring, maths = await api.create_hierarchy(client, 2027, "Spring", "Maths")
+        file = await api.create_file(client, physics, fall, "a.tex", LONG)
+        before = await api.db.tex_files.find_one({"id": file["id"]}, api.server.COUNTER_PROJECTION)
+        await api.server.dashboard_stats.file_changed(before, {**before, "subject_id": maths, "semester_id": spring})
+        counters = await stats(client)
+        assert counters["total_files"] == 1
+        assert set(counters["by_subject"]) == {maths}
+        assert set(counters["by_semester"]) == {spring}
+        assert set(counters["by_year"]) == {spring_year}
+        assert counters["by_year"][spring_year]["words"] == 10
+
+    api.run(scenario)
+
+
+def test_semester_moving_to_another_year_carries_its_totals(api):
+    async def scenario(client):
+        old_year, semester_id, subject_id = await api.create_hierarchy(client)
+        new_year = (await client.post("/api/years", json={"year": 2027})).json()["id"]
+        await api.create_file(client, subject_id, semester_id, "a.tex", LONG)
+        response = await client.put(f"/api/semesters/{semester_id}", json={"year_id": new_year})
+        assert response.status_code == 200
+        counters = await stats(client)
+        assert set(counters["by_year"]) == {new_year}
+        assert counters["by_year"][new_year]["words"] == 10
+
+    api.run(scenario)
+
+
+def test_rebuild_matches_the_incremental_counters(api):
+    async def scenario(client):
+        _, fall, physics = await api.create_hierarchy(client)
+        _, spring, maths = await api.create_hierarchy(client, 2027, "Spring", "Maths")
+        files = [
+            await api.create_file(client, physics, fall, "a.tex", LONG),
+            await api.create_file(client, physics, fall, "b.tex", "Short"),
+            await api.create_file(client, maths, spring, "c.tex", "Three more words"),
+        ]
+        await client.put(f"/api/files/{files[0]['id']}", json={"content": "Now shorter"})
+        await client.put(f"/api/files/{files[2]['id']}", json={"compilation_status": "success"})
+        await client.delete(f"/api/files/{files[1]['id']}")
+        await client.post("/api/subjects", json={"name": "Empty", "semester_id": spring})
+
+        incremental = breakdowns(await stats(client))
+        response = await client.post("/api/stats/rebuild")
+        assert response.json() == {"scopes": 7}
+        assert breakdowns(await stats(client)) == incremental
+
+    api.run(scenario)
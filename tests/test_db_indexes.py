@@ -0,0 +1,81 @@
+import asyncio
+
+from db_indexes import IndexManager, plan_indexes, plan_stages
+
+COLLSCAN = {"stage": "COLLSCAN", "filter": {"tags": {"$eq": "homework"}}, "direction": "forward"}
+FETCH_IXSCAN = {
+    "stage": "FETCH",
+    "inputStage": {"stage": "IXSCAN", "keyPattern": {"id": 1}, "indexName": "id_1"},
+}
+SORT_OVER_OR = {
+    "stage": "SORT",
+    "sortPattern": {"created_at": 1},
+    "inputStage": {
+        "stage": "FETCH",
+        "inputStage": {
+            "stage": "OR",
+            "inputStages": [
+                {"stage": "IXSCAN", "indexName": "subject_id_1"},
+                {"stage": "COLLSCAN"},
+            ],
+        },
+    },
+}
+
+
+def test_stages_of_a_top_level_collection_scan():
+    assert plan_stages(COLLSCAN) == ["COLLSCAN"]
+    assert plan_indexes(COLLSCAN) == []
+
+
+def test_stages_of_a_fetch_over_an_index_scan():
+    assert plan_stages(FETCH_IXSCAN) == ["FETCH", "IXSCAN"]
+    assert plan_indexes(FETCH_IXSCAN) == ["id_1"]
+
+
+def test_stages_of_nested_input_stages():
+    assert plan_stages(SORT_OVER_OR) == ["SORT", "FETCH", "OR", "IXSCAN", "COLLSCAN"]
+    assert plan_indexes(SORT_OVER_OR) == ["subject_id_1"]
+    assert plan_stages({}) == plan_stages([]) == []
+
+
+class FakeCursor:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def sort(self, sort):
+        return self
+
+    async def explain(self):
+        if isinstance(self.plan, Exception):
+            raise self.plan
+        return {"queryPlanner": {"winningPlan": self.plan}}
+
+
+class FakeCollection:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def find(self, query):
+        return FakeCursor(self.plan)
+
+
+def test_explain_flags_collection_scans_and_in_memory_sorts():
+    db = {
+        "by_id": FakeCollection(FETCH_IXSCAN),
+        "scanned": FakeCollection(COLLSCAN),
+        "sorted": FakeCollection(SORT_OVER_OR),
+        "broken": FakeCollection(RuntimeError("explain failed")),
+    }
+    manager = IndexManager(db, indexes={}, hot_queries=[
+        ("file by id", "by_id", {"id": "x"}, None),
+        ("files by tag", "scanned", {"tags": "homework"}, None),
+        ("files of a subject", "sorted", {"subject_id": "x"}, [("created_at", 1)]),
+        ("broken", "broken", {}, None),
+    ])
+    report = {entry["query"]: entry for entry in asyncio.run(manager.explain())}
+    assert (report["file by id"]["collscan"], report["file by id"]["in_memory_sort"]) == (False, False)
+    assert report["file by id"]["indexes"] == ["id_1"]
+    assert (report["files by tag"]["collscan"], report["files by tag"]["in_memory_sort"]) == (True, False)
+    assert (report["files of a subject"]["collscan"], report["files of a subject"]["in_memory_sort"]) == (True, True)
+    assert report["broken"] == {"query": "broken", "collection": "broken", "error": "explain failed"}
@@ -0,0 +1,94 @@
+import copy
+
+import pytest
+
+from hierarchy import TREE_DEPTHS, shape_tree
+
+
+def counts(files, words):
+    return {"files": files, "words": words, "bytes": words * 6, "status": {"success": files}}
+
+
+def subject(subject_id, semester_id, n_files):
+    return {
+        "id": subject_id, "semester_id": semester_id, "counts": counts(n_files, 10 * n_files),
+        "files": [{"id": f"{subject_id}-{n}", "name": f"{n}.tex"} for n in range(n_files)],
+    }
+
+
+AGGREGATED = [
+    {"id": "y2026", "year": 2026, "counts": counts(6, 60), "semesters": [
+        {"id": "fall", "year_id": "y2026", "counts": counts(5, 50), "subjects": [
+            subject("physics", "fall", 3), subject("maths", "fall", 2),
+        ]},
+        {"id": "spring", "year_id": "y2026", "counts": counts(1, 10), "subjects": [subject("chem", "spring", 1)]},
+    ]},
+    {"id": "y2025", "year": 2025, "counts": counts(0, 0), "semesters": []},
+]
+
+
+def shape(depth, expand=()):
+    return shape_tree(copy.deepcopy(AGGREGATED), depth, expand)
+
+
+def nodes(tree):
+    """Every node id down to files"""
+    ids = []
+    for year in tree:
+        ids.append(year["id"])
+        for semester in year.get("semesters", []):
+            ids.append(semester["id"])
+            for subject in semester.get("subjects", []):
+                ids.append(subject["id"])
+                ids += [file["id"] for file in subject.get("files", [])]
+    return ids
+
+
+@pytest.mark.parametrize("depth, expected", list(zip(TREE_DEPTHS, [
+    ["y2026", "y2025"],
+    ["y2026", "fall", "spring", "y2025"],
+    ["y2026", "fall", "physics", "maths", "spring", "chem", "y2025"],
+    [
+        "y2026", "fall", "physics", "physics-0", "physics-1", "physics-2", "maths", "maths-0", "maths-1",
+        "spring", "chem", "chem-0", "y2025",
+    ],
+])))
+def test_every_depth(depth, expected):
+    assert nodes(shape(depth)) == expected
+
+
+def test_totals_and_child_counts_are_kept_when_collapsed():
+    years = {year["id"]: year for year in shape("years")}
+    assert years["y2026"]["counts"] == counts(6, 60)
+    assert (years["y2026"]["semester_count"], years["y2025"]["semester_count"]) == (2, 0)
+    assert "semesters" not in years["y2026"]
+
+    fall = shape("semesters")[0]["semesters"][0]
+    assert (fall["counts"]["words"], fall["subject_count"]) == (50, 2)
+    assert "subjects" not in fall
+
+    physics = shape("subjects")[0]["semesters"][0]["subjects"][0]
+    assert (physics["counts"]["words"], physics["file_count"]) == (30, 3)
+    assert "files" not in physics
+
+
+def test_expanding_a_year_opens_its_whole_branch():
+    assert nodes(shape("years", ["y2026"])) == nodes(shape("files"))
+
+
+def test_expanding_a_semester_opens_it_and_the_path_to_it():
+    assert nodes(shape("years", ["spring"])) == ["y2026", "fall", "spring", "chem", "chem-0", "y2025"]
+    # Siblings on the path stay collapsed at the requested depth
+    fall = shape("years", ["spring"])[0]["semesters"][0]
+    assert "subjects" not in fall and fall["subject_count"] == 2
+
+
+def test_expanding_a_subject_opens_its_files_and_the_path_to_it():
+    assert nodes(shape("years", ["maths"])) == ["y2026", "fall", "physics", "maths", "maths-0", "maths-1", "spring", "y2025"]
+    assert nodes(shape("subjects", ["maths"])) == [
+        "y2026", "fall", "physics", "maths", "maths-0", "maths-1", "spring", "chem", "y2025",
+    ]
+
+
+def test_unknown_expand_ids_change_nothing():
+    assert shape("semesters", ["nowhere"]) == shape("semesters")
@@ -0,0 +1,71 @@
+from history_index import HistoryIndex, intersect, version_keys
+
+
+def history(*versions, file_id="f"):
+    index = HistoryIndex()
+    for sequence, content in enumerate(versions, start=1):
+        assert index.apply(file_id, sequence, version_keys(content))
+    return index
+
+
+def test_intersect_overlapping_ranges():
+    assert intersect([[1, 4], [6, None]], [[3, 7]]) == [[3, 4], [6, 7]]
+    assert intersect([[1, None]], [[2, None]]) == [[2, None]]
+    assert intersect([[1, 3]], [[3, 5]]) == []
+
+
+def test_search_returns_matching_version_runs():
+    index = history("fourier", "laplace", "fourier again", "fourier", "bye")
+    assert index.search("fourier") == {"f": [[1, 1], [3, 4]]}
+    assert index.search("bye") == {"f": [[5, 5]]}
+    assert index.search("missing") == {}
+
+
+def test_every_word_must_occur_in_the_same_version():
+    index = history("fourier", "laplace", "fourier laplace")
+    assert index.search("fourier laplace") == {"f": [[3, 3]]}
+    assert index.search('"laplace fourier"') == {"f": [[3, 3]]}
+
+
+def test_prefixed_terms_and_fields_without_history():
+    index = history(r"$\alpha$", "alpha")
+    assert index.search("math:alpha") == {"f": [[1, 1]]}
+    assert index.search("alpha") == {"f": [[2, 2]]}
+
+
+def test_search_within_given_files():
+    index = history("alpha")
+    assert index.search("alpha", file_ids=["f", "other"]) == {"f": [[1, 1]]}
+    assert index.search("alpha", file_ids=["other"]) == {}
+
+
+def test_versions_must_come_in_order():
+    index = history("one", "two")
+    assert index.apply("f", 2, version_keys("two"))  # already indexed
+    assert not index.apply("f", 4, version_keys("four"))  # 3 is missing
+    assert index.heads == {"f": 2}
+    assert index.apply("f", 3, version_keys("three"))
+    assert index.search("three") == {"f": [[3, 3]]}
+
+
+def test_remove_drops_every_range_of_a_file():
+    index = history("shared words", file_id="a")
+    index.apply("b", 1, version_keys("shared"))
+    index.remove("a")
+    assert index.search("shared") == {"b": [[1, 1]]}
+    assert "prose:words" not in index.ranges
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = history("fourier", "laplace")
+    index.path = tmp_path / "history.json.gz"
+    index.write(index.serialize())
+    loaded = HistoryIndex(index.path)
+    assert loaded.load()
+    assert loaded.search("fourier") == {"f": [[1, 1]]}
+    assert loaded.apply("f", 3, version_keys("fourier"))
+    assert loaded.search("fourier") == {"f": [[1, 1], [3, 3]]}
+
+
+def test_empty_query_matches_nothing():
+    assert history("anything").search("") == {}
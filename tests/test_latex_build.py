@@ -0,0 +1,122 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+import latex_build
+from latex_build import build, needs_another_pass, needs_bibliography
+from latex_engines import TectonicEngine, TexEngine
+
+CITING = "\\citation{knuth}\n\\bibdata{refs}\n\\bibstyle{plain}\n"
+
+
+def test_bibliography_runs_when_citations_change_or_the_bbl_is_missing():
+    assert needs_bibliography("new", None, has_bbl=False)
+    assert needs_bibliography("new", "old", has_bbl=True)
+    assert needs_bibliography("same", "same", has_bbl=False)
+    assert not needs_bibliography("same", "same", has_bbl=True)
+
+
+@pytest.mark.parametrize("before, after, bibliography_ran, rerun_requested, expected", [
+    ("a", "a", False, False, False),
+    ("a", "b", False, False, True),
+    ("a", "a", True, False, True),
+    ("a", "a", False, True, True),
+])
+def test_another_pass(before, after, bibliography_ran, rerun_requested, expected):
+    assert needs_another_pass(before, after, bibliography_ran, rerun_requested) == expected
+
+
+class FakeTex:
+    """
+    Stands in for run_process: each engine pass calls tex(pass_number, workdir),
+    which writes aux files and returns (returncode, log); bibtex and biber write a .bbl
+    """
+
+    def __init__(self, tex):
+        self.tex = tex
+        self.commands = []
+        self.passes = 0
+
+    async def __call__(self, argv, cwd, env=None):
+        self.commands.append(argv[0])
+        if argv[0] in ("bibtex", "biber"):
+            Path(cwd, argv[1] + ".bbl").write_text("\\begin{thebibliography}")
+            return 0, f"{argv[0]} done"
+        self.passes += 1
+        return self.tex(self.passes, Path(cwd))
+
+
+def run_build(monkeypatch, workdir, tex, engine=None, max_passes=None):
+    fake = FakeTex(tex)
+    monkeypatch.setattr(latex_build, "run_process", fake)
+    engine = engine or TexEngine("pdflatex")
+    returncode, _ = asyncio.run(build(engine, "main.tex", str(workdir), "full", [], max_passes=max_passes))
+    return returncode, fake.commands
+
+
+def writes(aux="", log="Output written on main.pdf", **files):
+    """A pass that leaves the given aux content (and other files) behind"""
+    def tex(n, workdir):
+        (workdir / "main.aux").write_text(aux)
+        for ext, content in files.items():
+            (workdir / f"main.{ext}").write_text(content)
+        return 0, log
+    return tex
+
+
+def test_settled_aux_files_need_one_pass(monkeypatch, tmp_path):
+    (tmp_path / "main.aux").write_text("\\newlabel{eq}{1}")
+    assert run_build(monkeypatch, tmp_path, writes("\\newlabel{eq}{1}")) == (0, ["pdflatex"])
+
+
+def test_changed_aux_or_toc_reruns_until_stable(monkeypatch, tmp_path):
+    assert run_build(monkeypatch, tmp_path, writes("\\newlabel{eq}{1}")) == (0, ["pdflatex"] * 2)
+    # Same aux as last time, but the table of contents moved
+    assert run_build(monkeypatch, tmp_path, writes("\\newlabel{eq}{1}", toc="\\contentsline{section}")) == (
+        0, ["pdflatex"] * 2
+    )
+
+
+def test_rerun_warning_in_the_log_reruns(monkeypatch, tmp_path):
+    def tex(n, workdir):
+        (workdir / "main.aux").write_text("")
+        return 0, "LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right." if n == 1 else ""
+    (tmp_path / "main.aux").write_text("")
+    assert run_build(monkeypatch, tmp_path, tex) == (0, ["pdflatex"] * 2)
+
+
+def test_passes_stop_at_the_cap(monkeypatch, tmp_path):
+    def never_settles(n, workdir):
+        (workdir / "main.toc").write_text(f"page {n}")
+        return 0, ""
+    assert run_build(monkeypatch, tmp_path, never_settles) == (0, ["pdflatex"] * TexEngine.max_passes)
+    assert run_build(monkeypatch, tmp_path, never_settles, max_passes=2) == (0, ["pdflatex"] * 2)
+
+
+def test_a_failed_pass_stops_the_build(monkeypatch, tmp_path):
+    def fails(n, workdir):
+        (workdir / "main.aux").write_text(f"pass {n}")
+        return 1, "! Undefined control sequence."
+    assert run_build(monkeypatch, tmp_path, fails) == (1, ["pdflatex"])
+
+
+def test_bibtex_runs_only_when_citations_change(monkeypatch, tmp_path):
+    assert run_build(monkeypatch, tmp_path, writes(CITING)) == (0, ["pdflatex", "bibtex", "pdflatex"])
+    # Unchanged citations: the .bbl from last time is reused
+    assert run_build(monkeypatch, tmp_path, writes(CITING)) == (0, ["pdflatex"])
+    changed = CITING + "\\citation{lamport}\n"
+    assert run_build(monkeypatch, tmp_path, writes(changed)) == (0, ["pdflatex", "bibtex", "pdflatex"])
+    # A changed .bib source counts too
+    (tmp_path / "refs.bib").write_text("@book{knuth, title={TeX}}")
+    assert run_build(monkeypatch, tmp_path, writes(changed)) == (0, ["pdflatex", "bibtex", "pdflatex"])
+
+
+def test_biblatex_documents_use_biber(monkeypatch, tmp_path):
+    tex = writes("\\abx@aux@cite{0}{knuth}\n", bcf="<bcf:citekey>knuth</bcf:citekey>")
+    assert run_build(monkeypatch, tmp_path, tex) == (0, ["pdflatex", "biber", "pdflatex"])
+    assert run_build(monkeypatch, tmp_path, tex) == (0, ["pdflatex"])
+
+
+def test_tectonic_is_a_single_run(monkeypatch, tmp_path):
+    assert run_build(monkeypatch, tmp_path, writes(CITING), TectonicEngine()) == (0, ["tectonic"])
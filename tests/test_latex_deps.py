@@ -0,0 +1,89 @@
+import pytest
+
+from latex_deps import (
+    dependency_closure, dependent_roots, is_root_document, normalize_path, parse_references, resolve_dependencies
+)
+
+PROJECT = {
+    "main.tex": "\\documentclass{book}\n\\include{chapters/intro}\n\\input{chapters/methods.tex}\n"
+                "\\bibliography{refs,extra}\n",
+    "chapters/intro.tex": "\\input{chapters/figures}\n% \\input{chapters/commented}\n",
+    "chapters/methods.tex": "\\includegraphics[width=\\linewidth]{img/setup}\n\\input{missing}\n",
+    "chapters/figures.tex": "\\includegraphics{img/plot.png}\n\\input{chapters/intro}\n",
+    "slides.tex": "\\documentclass{beamer}\n\\input{chapters/figures}\n",
+}
+ASSETS = {"img/setup.pdf", "img/plot.png", "refs.bib", "extra.bib", "chapters/commented.tex"}
+
+
+def graph():
+    available = set(PROJECT) | ASSETS
+    return {path: resolve_dependencies(content, available)[0] for path, content in PROJECT.items()}
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("chapters/intro.tex", "chapters/intro.tex"),
+    ("./chapters/../chapters/intro", "chapters/intro"),
+    (' "img\\plot.png" ', "img/plot.png"),
+    ("../outside.tex", None),
+    ("/etc/passwd", None),
+    (".", None),
+    ("", None),
+])
+def test_normalize_path(path, expected):
+    assert normalize_path(path) == expected
+
+
+def test_root_documents_have_an_uncommented_documentclass():
+    assert is_root_document("\\documentclass[12pt]{article}\n")
+    assert is_root_document("% preamble\n  \\documentclass{article}")
+    assert not is_root_document("% \\documentclass{article}\n\\section{Intro}")
+    assert not is_root_document(PROJECT["chapters/intro.tex"])
+
+
+def test_references_skip_comments_and_split_bibliographies():
+    assert parse_references(PROJECT["main.tex"]) == [
+        ("tex", "chapters/intro"), ("tex", "chapters/methods.tex"), ("bib", "refs"), ("bib", "extra"),
+    ]
+    assert parse_references("\\addbibresource[location=local]{refs.bib} \\subfile{part}") == [
+        ("tex", "part"), ("bib", "refs.bib"),
+    ]
+
+
+def test_nested_inputs_graphics_and_bibliographies_resolve():
+    resolved = graph()
+    assert resolved["main.tex"] == ["chapters/intro.tex", "chapters/methods.tex", "refs.bib", "extra.bib"]
+    # Graphics without an extension try the usual ones
+    assert resolved["chapters/methods.tex"] == ["img/setup.pdf"]
+    assert resolved["chapters/figures.tex"] == ["chapters/intro.tex", "img/plot.png"]
+
+
+def test_unresolved_references_are_reported():
+    available = set(PROJECT) | ASSETS
+    assert resolve_dependencies(PROJECT["chapters/methods.tex"], available) == (["img/setup.pdf"], ["missing"])
+    assert resolve_dependencies("\\input{../secret} \\includegraphics{nowhere}", available) == (
+        [], ["../secret", "nowhere"]
+    )
+
+
+def test_closure_follows_nesting_and_stops_at_cycles():
+    resolved = graph()
+    assert dependency_closure(resolved, "main.tex") == {
+        "chapters/intro.tex", "chapters/methods.tex", "chapters/figures.tex",
+        "img/setup.pdf", "img/plot.png", "refs.bib", "extra.bib",
+    }
+    # intro and figures include each other
+    assert dependency_closure(resolved, "chapters/intro.tex") == {"chapters/figures.tex", "img/plot.png"}
+
+
+@pytest.mark.parametrize("changed, roots", [
+    ("img/plot.png", ["main.tex", "slides.tex"]),
+    ("chapters/intro.tex", ["main.tex", "slides.tex"]),
+    ("img/setup.pdf", ["main.tex"]),
+    ("refs.bib", ["main.tex"]),
+    ("slides.tex", ["slides.tex"]),
+    ("chapters/commented.tex", []),
+    ("unknown.tex", []),
+])
+def test_dependent_roots(changed, roots):
+    project_roots = [path for path, content in PROJECT.items() if is_root_document(content)]
+    assert dependent_roots(graph(), project_roots, changed) == roots
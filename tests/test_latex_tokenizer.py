@@ -0,0 +1,47 @@
+from latex_tokenizer import count_words, scan, section_titles, tokenize_latex
+
+SOURCE = r"""
+\documentclass{article}
+\usepackage{amsmath}
+\begin{document}
+\section{The \emph{Fourier} transform}
+We define $\hat f(\xi)$ as follows % not this comment
+\begin{equation}\label{eq:Fourier}
+  \hat f = \int f \, dx
+\end{equation}
+See \eqref{eq:Fourier} and don't panic.
+\end{document}
+"""
+
+
+def test_tokens_are_sorted_into_fields():
+    fields = tokenize_latex(SOURCE)
+    assert fields["prose"] == [
+        "the", "fourier", "transform", "we", "define", "as", "follows", "see", "and", "don't", "panic"
+    ]
+    assert fields["environments"] == ["document", "equation"]
+    assert fields["labels"] == ["eq:fourier"]
+    assert fields["math"] == ["hat", "f", "xi", "hat", "f", "int", "f", "dx"]
+    assert "section" in fields["commands"] and "eqref" in fields["commands"]
+    # Arguments that are keys, classes or package names are not words
+    assert "amsmath" not in fields["prose"] and "article" not in fields["prose"]
+
+
+def test_tokens_keep_source_offsets():
+    for token in scan(SOURCE):
+        assert SOURCE[token.start:token.end].lower().rstrip("*") == token.term or token.field == "labels"
+
+
+def test_count_words_counts_prose_only():
+    assert count_words(r"Two words $x + y = z$ \textbf{three} % four five") == 3
+    assert count_words("") == 0
+
+
+def test_section_titles_without_markup_or_comments():
+    source = r"""
+\section*{Intro}
+% \section{Hidden}
+\subsection[short]{A \textbf{bold} step}
+"""
+    assert section_titles(SOURCE) == ["The Fourier transform"]
+    assert section_titles(source) == ["Intro", "A bold step"]
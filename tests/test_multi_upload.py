@@ -0,0 +1,102 @@
+import pytest
+
+from blob_store import content_hash
+
+
+@pytest.fixture
+def started(api, monkeypatch):
+    """(file_id, filename) of every compile started in the background"""
+    calls = []
+
+    def run_compile_job(job_id, file_id, content, filename, *args):
+        calls.append((file_id, filename))
+
+        async def record():
+            pass
+        return record()
+    monkeypatch.setattr(api.server, "run_compile_job", run_compile_job)
+    return calls
+
+
+def test_valid_and_invalid_files_in_one_upload(api, started):
+    async def scenario(client):
+        _, semester_id, subject_id = await api.create_hierarchy(client)
+        await api.create_file(client, subject_id, semester_id, "taken.tex", "Already here")
+        started.clear()
+        # Stands in for a concurrent insert colliding with one of the batch
+        await api.db.tex_files.create_index("name", unique=True)
+
+        response = await client.post("/api/files/multi-upload", json={
+            "subject_id": subject_id, "semester_id": semester_id, "tags": ["lab"], "files": [
+                {"name": "a.tex", "content": "First file"},
+                {"name": "../escape.tex", "content": "Outside"},
+                {"name": "empty.tex", "content": ""},
+                {"content": "No name"},
+                {"name": "taken.tex", "content": "Clashes on insert"},
+                {"name": "./notes/b.tex", "content": "Second file"},
+            ]
+        })
+        assert response.status_code == 200
+        results = response.json()
+        assert [(r["index"], r["name"], r["status"]) for r in results] == [
+            (0, "a.tex", "created"),
+            (1, "../escape.tex", "error"),
+            (2, "empty.tex", "error"),
+            (3, None, "error"),
+            (4, "taken.tex", "error"),
+            (5, "notes/b.tex", "created"),
+        ]
+        assert results[1]["error"] == "Invalid file name"
+        assert results[2]["error"] == results[3]["error"] == "A file needs a name and non-empty content"
+        assert "duplicate key" in results[4]["error"].lower()
+        for result in results:
+            assert (result["file"] is not None) == (result["status"] == "created")
+            assert (result["job_id"] is not None) == (result["status"] == "created")
+
+        created = {r["file"]["id"]: r for r in results if r["status"] == "created"}
+        stored = await api.db.tex_files.find({"tags": "lab"}, {"_id": 0}).to_list(None)
+        assert {f["id"]: f["name"] for f in stored} == {id: r["name"] for id, r in created.items()}
+        assert all(f["compile_job_id"] == created[f["id"]]["job_id"] for f in stored)
+        assert sorted(started) == sorted((id, r["name"]) for id, r in created.items())
+        assert await api.db.compile_jobs.count_documents({"id": {"$in": [r["job_id"] for r in created.values()]}}) == 2
+        # The entry that failed to insert leaves no version or blob reference behind
+        assert await api.db.file_versions.count_documents({}) == 3
+        blob = await api.db.blobs.find_one({"hash": content_hash("Clashes on insert")})
+        assert blob is None or blob["refs"] == 0
+
+    api.run(scenario)
+
+
+def test_duplicate_paths_within_a_project_upload(api, started):
+    async def scenario(client):
+        _, semester_id, subject_id = await api.create_hierarchy(client)
+        project = (await client.post("/api/projects", json={"subject_id": subject_id, "name": "Thesis"})).json()
+        await api.create_file(client, subject_id, semester_id, "intro.tex", "Intro", project_id=project["id"])
+        api.queued.clear()
+
+        response = await client.post("/api/files/multi-upload", json={
+            "subject_id": subject_id, "semester_id": semester_id, "project_id": project["id"], "files": [
+                {"name": "main.tex", "content": "\\documentclass{article}\n\\input{chapter}\n"},
+                {"name": "chapter.tex", "content": "Chapter"},
+                {"name": "./chapter.tex", "content": "Again"},
+                {"name": "intro.tex", "content": "Intro again"},
+                {"name": "/abs.tex", "content": "Absolute"},
+            ]
+        })
+        results = response.json()
+        assert [(r["status"], r["error"]) for r in results] == [
+            ("created", None),
+            ("created", None),
+            ("error", "Project already contains chapter.tex"),
+            ("error", "Project already contains intro.tex"),
+            ("error", "Invalid project path"),
+        ]
+        # Project files are built through their root, once the whole upload is in place
+        assert started == []
+        assert [name for _, name in api.queued] == ["main.tex"]
+        assert results[0]["file"]["compilation_status"] == "pending"
+        root = await api.db.tex_files.find_one({"id": results[0]["file"]["id"]})
+        assert root["dependencies"] == ["chapter.tex"]
+        assert await api.db.tex_files.count_documents({"project_id": project["id"]}) == 3
+
+    api.run(scenario)
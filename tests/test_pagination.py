@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import (
+    RELEVANCE, InvalidCursorError, after_cursor, after_ranked, decode_cursor, encode_cursor, page_size, sort_spec
+)
+
+
+def test_cursor_round_trip():
+    created = datetime(2024, 3, 1, 12, 30)
+    cursor = encode_cursor("created_at", {"created_at": created, "id": "f1", "name": "a.tex"})
+    assert decode_cursor("created_at", cursor) == (created, "f1")
+
+
+def test_after_cursor_starts_strictly_after_the_item():
+    cursor = encode_cursor("name", {"name": "b.tex", "id": "f2"})
+    query = after_cursor({"subject_id": "s"}, "name", cursor)
+    assert query == {"$and": [
+        {"subject_id": "s"},
+        {"$or": [{"name": {"$gt": "b.tex"}}, {"name": "b.tex", "id": {"$gt": "f2"}}]},
+    ]}
+    assert after_cursor({"subject_id": "s"}, "name", None) == {"subject_id": "s"}
+
+
+def test_after_ranked_pages_by_score_then_id():
+    hits = [("a", 3.0), ("b", 2.0), ("c", 2.0), ("d", 1.0)]
+    cursor = encode_cursor(RELEVANCE, {RELEVANCE: 2.0, "id": "b"})
+    assert after_ranked(hits, cursor) == [("c", 2.0), ("d", 1.0)]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", encode_cursor("name", {"name": "a", "id": "1"})])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        after_cursor({}, "created_at", cursor)
+
+
+def test_sort_and_page_size_bounds():
+    assert sort_spec("name") == [("name", 1), ("id", 1)]
+    with pytest.raises(InvalidCursorError):
+        sort_spec("size")
+    assert page_size(None) == 200
+    assert page_size(0) == 1
+    assert page_size(10 ** 6) == 1000
+
+
+def test_listing_answers_400_on_a_bad_cursor(server):
+    with pytest.raises(HTTPException) as error:
+        server.validate_listing("summary", "created_at", "garbage", "json")
+    assert error.value.status_code == 400
+    assert error.value.detail == "Malformed cursor"
+    with pytest.raises(HTTPException) as error:
+        server.validate_listing("summary", RELEVANCE, "garbage", "json", ranked=True)
+    assert error.value.status_code == 400
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from artifact_store import ArtifactStore, LocalArtifactBackend
+from pdf_cache import PdfCache, pdf_cache_key
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+SOURCE = "\\documentclass{article}\\begin{document}Hi\\end{document}"
+
+
+def run(tmp_path, scenario):
+    """Run scenario(cache, pdf_path) on a cache over a local artifact store with a 1 kB cap"""
+    pdf = tmp_path / "main.pdf"
+    pdf.write_bytes(b"%PDF" + b"0" * 396)
+
+    async def main():
+        collection = mongomock_motor.AsyncMongoMockClient()["pdf_cache_test"]["artifacts"]
+        store = ArtifactStore(collection, LocalArtifactBackend(tmp_path / "artifacts"), 1000, timedelta(hours=1))
+        return await scenario(PdfCache(store), str(pdf))
+    return asyncio.run(main())
+
+
+def test_keys_change_with_every_compile_input():
+    key = pdf_cache_key(SOURCE, "main.tex")
+    assert key == pdf_cache_key(SOURCE, "main.tex", "xelatex", "full", {})
+    assert len({
+        key,
+        pdf_cache_key(SOURCE + " ", "main.tex"),
+        pdf_cache_key(SOURCE, "other.tex"),
+        pdf_cache_key(SOURCE, "main.tex", "pdflatex"),
+        pdf_cache_key(SOURCE, "main.tex", mode="draft"),
+        pdf_cache_key(SOURCE, "main.tex", files={"chapter.tex": b"One"}),
+        pdf_cache_key(SOURCE, "main.tex", files={"chapter.tex": b"Two"}),
+    }) == 7
+    # Workspace files are hashed by path, whatever order they come in
+    assert pdf_cache_key(SOURCE, "main.tex", files={"a": b"1", "b": b"2"}) == pdf_cache_key(
+        SOURCE, "main.tex", files={"b": b"2", "a": b"1"}
+    )
+
+
+def test_stored_pdfs_are_hits_with_their_output(tmp_path):
+    async def scenario(cache, pdf_path):
+        key = pdf_cache_key(SOURCE, "main.tex")
+        assert await cache.get(key) is None
+        assert await cache.put(key, pdf_path, "Output written on main.pdf") == f"{key}.pdf"
+        assert await cache.get(key) == (f"{key}.pdf", "Output written on main.pdf")
+        assert cache.stats() == {"hits": 1, "misses": 1}
+
+    run(tmp_path, scenario)
+
+
+def test_evicted_pdfs_are_misses_again(tmp_path):
+    async def scenario(cache, pdf_path):
+        store = cache.artifacts
+        keys = [pdf_cache_key(f"{SOURCE}%{n}", "main.tex") for n in range(3)]
+        for n, key in enumerate(keys):
+            await cache.put(key, pdf_path)
+            await store.collection.update_one(
+                {"key": cache.artifact_key(key)}, {"$set": {"last_access": datetime.utcnow() - timedelta(minutes=30 - n)}}
+            )
+        await store.retain("file-1", cache.artifact_key(keys[0]))
+        # 1200 bytes against the 1000 byte cap: the oldest unreferenced PDF is evicted
+        assert (await store.collect_garbage())["deleted"] == 1
+        assert [await cache.get(key) is not None for key in keys] == [True, False, True]
+
+    run(tmp_path, scenario)
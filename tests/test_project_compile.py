@@ -0,0 +1,52 @@
+DOCUMENT = "\\documentclass{article}\n\\begin{document}\n\\input{chapter}\n\\end{document}\n"
+
+
+async def create_project(api, client):
+    _, semester_id, subject_id = await api.create_hierarchy(client)
+    project = (await client.post("/api/projects", json={"subject_id": subject_id, "name": "Thesis"})).json()
+
+    async def add(name, content):
+        return await api.create_file(client, subject_id, semester_id, name, content, project_id=project["id"])
+    return add
+
+
+def test_compiling_a_fragment_names_the_roots_that_include_it(api):
+    async def scenario(client):
+        add = await create_project(api, client)
+        chapter = await add("chapter.tex", "Chapter")
+        await add("main.tex", DOCUMENT)
+        await add("appendix.tex", "Appendix")
+        api.queued.clear()
+
+        response = await client.post(f"/api/files/{chapter['id']}/compile?background=true")
+        assert response.status_code == 400
+        assert response.json()["detail"] == (
+            "chapter.tex is not a root document; compile a root that includes it: main.tex"
+        )
+        assert api.queued == []
+
+    api.run(scenario)
+
+
+def test_compiling_an_unused_fragment_is_rejected(api):
+    async def scenario(client):
+        add = await create_project(api, client)
+        appendix = await add("appendix.tex", "Appendix")
+        response = await client.post(f"/api/files/{appendix['id']}/compile")
+        assert response.status_code == 400
+        assert "no root of its project includes it" in response.json()["detail"]
+
+    api.run(scenario)
+
+
+def test_project_roots_still_compile(api):
+    async def scenario(client):
+        add = await create_project(api, client)
+        await add("chapter.tex", "Chapter")
+        root = await add("main.tex", DOCUMENT)
+        api.queued.clear()
+        response = await client.post(f"/api/files/{root['id']}/compile?background=true")
+        assert response.status_code == 200
+        assert [name for _, name in api.queued] == ["main.tex"]
+
+    api.run(scenario)
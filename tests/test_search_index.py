@@ -0,0 +1,152 @@
+import asyncio
+import threading
+
+from search_index import SearchIndex, analyze, make_snippets, parse_query
+
+
+def indexed(*files):
+    index = SearchIndex()
+    for file in files:
+        index.add(file["id"], analyze(file))
+    return index
+
+
+def ids(hits):
+    return [file_id for file_id, _ in hits]
+
+
+def test_bm25_ranks_more_frequent_terms_first():
+    index = indexed(
+        {"id": "once", "name": "a.tex", "content": "fourier transforms and other topics of analysis"},
+        {"id": "often", "name": "b.tex", "content": "fourier series, fourier transforms, fourier"},
+        {"id": "never", "name": "c.tex", "content": "linear algebra"},
+    )
+    hits = index.search("fourier")
+    assert ids(hits) == ["often", "once"]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_name_matches_weigh_more_than_content():
+    index = indexed(
+        {"id": "body", "name": "notes.tex", "content": "a short remark on laplace"},
+        {"id": "title", "name": "laplace.tex", "content": "a short remark on transforms"},
+    )
+    assert ids(index.search("laplace")) == ["title", "body"]
+
+
+def test_every_word_must_match():
+    index = indexed(
+        {"id": "both", "name": "a.tex", "content": "fourier and laplace"},
+        {"id": "one", "name": "b.tex", "content": "fourier only"},
+    )
+    assert ids(index.search("fourier laplace")) == ["both"]
+
+
+def test_phrase_matches_consecutive_words_only():
+    index = indexed(
+        {"id": "phrase", "name": "a.tex", "content": "the fourier transform is linear"},
+        {"id": "apart", "name": "b.tex", "content": "the transform of fourier"},
+    )
+    assert ids(index.search('"fourier transform"')) == ["phrase"]
+    assert set(ids(index.search("fourier transform"))) == {"phrase", "apart"}
+
+
+def test_field_prefixes_search_latex_fields():
+    index = indexed(
+        {"id": "math", "name": "a.tex", "content": r"\begin{theorem} $\alpha + x$ \label{thm:main} \end{theorem}"},
+        {"id": "prose", "name": "b.tex", "content": "alpha theorem in words"},
+    )
+    assert ids(index.search("math:alpha")) == ["math"]
+    assert ids(index.search("env:theorem")) == ["math"]
+    assert ids(index.search("label:thm:main")) == ["math"]
+    # Without a prefix only prose (and names, tags, notes) match
+    assert ids(index.search("alpha")) == ["prose"]
+
+
+def test_parse_query_keeps_unknown_prefixes_as_words():
+    assert parse_query("ratio:1 env:proof") == [
+        (("name", "tags", "notes", "prose"), ["ratio", "1"]),
+        (("environments",), ["proof"]),
+    ]
+
+
+def test_filters_and_removal():
+    index = indexed(
+        {"id": "a", "name": "a.tex", "subject_id": "s1", "tags": ["hw"], "content": "fourier"},
+        {"id": "b", "name": "b.tex", "subject_id": "s2", "content": "fourier"},
+    )
+    assert ids(index.search("fourier", subject_id="s1")) == ["a"]
+    assert ids(index.search("fourier", tags=["hw"])) == ["a"]
+    index.remove("a")
+    assert ids(index.search("fourier")) == ["b"]
+    assert index.facets(["b"])["subject_id"] == {"s2": 1}
+
+
+def test_update_metadata_keeps_content_postings():
+    index = indexed({"id": "a", "name": "a.tex", "tags": ["old"], "content": r"\section{Intro} fourier"})
+    assert index.update_metadata("a", {"id": "a", "name": "b.tex", "tags": ["new"]})
+    assert ids(index.search("new")) == ["a"]
+    assert ids(index.search("old")) == []
+    assert ids(index.search("fourier")) == ["a"]
+    assert index.files["a"]["sections"] == ["Intro"]
+    assert not index.update_metadata("missing", {"id": "missing"})
+
+
+def test_snippets_highlight_matches():
+    content = "The Fourier transform is linear."
+    index = indexed({"id": "a", "name": "a.tex", "content": content})
+    spans = index.spans("a", '"fourier transform"')
+    assert [content[start:end] for start, end in spans] == ["Fourier transform"]
+    snippet = make_snippets(content, spans)[0]
+    start, end = snippet["highlights"][0]
+    assert snippet["text"][start:end] == "Fourier transform"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = indexed({"id": "a", "name": "a.tex", "content": "fourier"})
+    index.path = tmp_path / "index.json.gz"
+    index.write(index.serialize())
+    loaded = SearchIndex(index.path)
+    assert loaded.load()
+    assert ids(loaded.search("fourier")) == ["a"]
+
+
+def test_writes_during_a_save_keep_the_snapshot_consistent(server, tmp_path):
+    index = indexed({"id": "a", "name": "a.tex", "content": "fourier"})
+    index.path = tmp_path / "index.json.gz"
+    writing, resume = threading.Event(), threading.Event()
+    write = index.write
+
+    def slow_write(data):
+        writing.set()
+        resume.wait(5)
+        write(data)
+
+    index.write = slow_write
+    serialize = index.serialize
+    serialized_on = []
+
+    def tracked_serialize():
+        serialized_on.append(threading.get_ident())
+        return serialize()
+
+    index.serialize = tracked_serialize
+
+    async def run():
+        save = asyncio.create_task(server.save_index(index))
+        await asyncio.to_thread(writing.wait, 5)
+        # The event loop keeps indexing while the file is being written
+        for number in range(200):
+            index.add(f"new-{number}", analyze({"id": f"new-{number}", "name": "b.tex", "content": "laplace"}))
+        index.remove("a")
+        resume.set()
+        await save
+
+    asyncio.run(run())
+    # Built on the loop's thread, where nothing can change the index meanwhile
+    assert serialized_on == [threading.get_ident()]
+    assert index.dirty
+    saved = SearchIndex(index.path)
+    assert saved.load()
+    assert ids(saved.search("fourier")) == ["a"]
+    assert saved.search("laplace") == []
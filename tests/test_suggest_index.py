@@ -0,0 +1,54 @@
+from suggest_index import SuggestIndex, prefix_distance
+
+
+def suggestions(index, query, **options):
+    return [(entry["kind"], entry["text"]) for entry in index.suggest(query, **options)]
+
+
+def library():
+    index = SuggestIndex()
+    index.set_subject("s1", "Advanced Calculus")
+    index.set_subject("s2", "Linear Algebra")
+    index.set_file("f1", {"name": "fourier.tex", "subject_id": "s1", "tags": ["Homework"],
+                          "sections": ["Fourier Series"]})
+    index.set_file("f2", {"name": "notes.tex", "subject_id": "s2", "tags": ["homework"], "sections": []})
+    return index
+
+
+def test_prefix_distance_allows_typos_against_word_prefixes():
+    assert prefix_distance("four", "fourier", 1) == 0
+    assert prefix_distance("fuor", "fourier", 1) == 1  # transposition
+    assert prefix_distance("fxyz", "fourier", 1) is None
+
+
+def test_prefixes_of_every_typed_word():
+    index = library()
+    assert suggestions(index, "lin alg") == [("subject", "Linear Algebra")]
+    assert suggestions(index, "fourier ser") == [("section", "Fourier Series")]
+
+
+def test_typos_are_tolerated():
+    index = library()
+    assert ("subject", "Advanced Calculus") in suggestions(index, "cacl")
+    assert ("file", "fourier.tex") in suggestions(index, "fourei")
+
+
+def test_exact_matches_rank_before_typos():
+    index = library()
+    assert suggestions(index, "fourier")[0] == ("file", "fourier.tex")
+
+
+def test_shared_entries_are_counted_and_removed_with_their_files():
+    index = library()
+    # "Homework" and "homework" are one tag entry used by two files
+    assert suggestions(index, "home") == [("tag", "Homework")]
+    assert index.entries[("tag", "homework")]["count"] == 2
+    index.remove_file("f1")
+    assert index.entries[("tag", "homework")]["count"] == 1
+    assert suggestions(index, "fourier") == []
+
+
+def test_kinds_and_limit():
+    index = library()
+    assert suggestions(index, "fourier", kinds=["section"]) == [("section", "Fourier Series")]
+    assert len(index.suggest("f", limit=1)) == 1
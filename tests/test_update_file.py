@@ -0,0 +1,112 @@
+import pytest
+
+from blob_store import content_hash
+
+DOCUMENT = "\\documentclass{article}\n\\begin{document}\n\\input{chapter}\n\\end{document}\n"
+
+
+async def unreferenced(api, text):
+    """Nothing refers to the blob of text any more (garbage collection may not have run yet)"""
+    blob = await api.db.blobs.find_one({"hash": content_hash(text)})
+    return blob is None or blob["refs"] <= 0
+
+
+def test_metadata_edit_returns_the_updated_file(api):
+    async def scenario(client):
+        _, semester_id, subject_id = await api.create_hierarchy(client)
+        file = await api.create_file(client, subject_id, semester_id)
+        response = await client.put(f"/api/files/{file['id']}", json={"tags": ["exam"], "expected_revision": 0})
+        assert response.status_code == 200
+        assert response.json()["tags"] == ["exam"]
+        assert response.json()["revision"] == 1
+        assert response.json()["content"] == "Hello"
+        summary = await client.put(f"/api/files/{file['id']}?view=summary", json={"notes": "read"})
+        assert summary.json()["revision"] == 2
+        assert "content" not in summary.json()
+
+    api.run(scenario)
+
+
+def test_metadata_edit_of_a_missing_file_is_404(api):
+    async def scenario(client):
+        response = await client.put("/api/files/missing", json={"tags": ["exam"]})
+        assert response.status_code == 404
+
+    api.run(scenario)
+
+
+@pytest.mark.parametrize("update", [{"tags": ["exam"]}, {"content": "Changed"}, {"name": "renamed.tex"}])
+def test_stale_expected_revision_is_409(api, update):
+    async def scenario(client):
+        _, semester_id, subject_id = await api.create_hierarchy(client)
+        file = await api.create_file(client, subject_id, semester_id)
+        await client.put(f"/api/files/{file['id']}", json={"notes": "first"})
+        response = await client.put(f"/api/files/{file['id']}", json={**update, "expected_revision": 0})
+        assert response.status_code == 409
+        assert "expected revision 0, now 1" in response.json()["detail"]
+        current = (await client.get(f"/api/files/{file['id']}")).json()
+        assert (current["name"], current["content"], current["tags"]) == ("notes.tex", "Hello", [])
+        assert current["version_count"] == 1
+
+    api.run(scenario)
+
+
+def test_content_edit_racing_on_a_version_that_exists_is_409(api):
+    async def scenario(client):
+        _, semester_id, subject_id = await api.create_hierarchy(client)
+        file = await api.create_file(client, subject_id, semester_id)
+        # Another save already stored version 2 but has not moved the head yet
+        await api.server.version_store.append(api.server.create_file_version(file["id"], 2, "Theirs").dict())
+        response = await client.put(f"/api/files/{file['id']}", json={"content": "Mine"})
+        assert response.status_code == 409
+        assert await unreferenced(api, "Mine")
+
+    api.run(scenario)
+
+
+def test_content_edit_losing_the_head_rolls_back_its_version_and_blob(api, monkeypatch):
+    version_store = api.server.version_store
+    append = version_store.append
+
+    async def append_then_lose_the_race(version, previous_content=None):
+        stored = await append(version, previous_content)
+        # A concurrent save moves the head past the version this one was based on
+        await api.db.tex_files.update_one({"id": version["file_id"]}, {"$inc": {"version_count": 1}})
+        return stored
+
+    async def scenario(client):
+        _, semester_id, subject_id = await api.create_hierarchy(client)
+        file = await api.create_file(client, subject_id, semester_id)
+        monkeypatch.setattr(version_store, "append", append_then_lose_the_race)
+        response = await client.put(f"/api/files/{file['id']}", json={"content": "Mine"})
+        assert response.status_code == 409
+        assert await api.db.file_versions.count_documents({"file_id": file["id"]}) == 1
+        assert await unreferenced(api, "Mine")
+        assert await api.db.blobs.find_one({"hash": content_hash("Hello")}, {"_id": 0, "refs": 1}) == {"refs": 2}
+        stored = await api.db.tex_files.find_one({"id": file["id"]})
+        assert (stored["content_hash"], stored["revision"]) == (content_hash("Hello"), 0)
+
+    api.run(scenario)
+
+
+def test_project_edit_reports_the_new_dependencies_and_compile(api):
+    async def scenario(client):
+        _, semester_id, subject_id = await api.create_hierarchy(client)
+        project = (await client.post("/api/projects", json={"subject_id": subject_id, "name": "Thesis"})).json()
+        await api.create_file(client, subject_id, semester_id, "chapter.tex", "Chapter", project_id=project["id"])
+        await api.create_file(client, subject_id, semester_id, "appendix.tex", "Appendix", project_id=project["id"])
+        root = await api.create_file(client, subject_id, semester_id, "main.tex", DOCUMENT, project_id=project["id"])
+        api.queued.clear()
+
+        content = DOCUMENT.replace("\\input{chapter}", "\\input{chapter}\n\\input{appendix}")
+        response = await client.put(f"/api/files/{root['id']}", json={"content": content})
+        assert response.status_code == 200
+        updated = response.json()
+        assert updated["dependencies"] == ["chapter.tex", "appendix.tex"]
+        assert updated["compilation_status"] == "pending"
+        assert [(job.id, name) for job, name in api.queued] == [(updated["compile_job_id"], "main.tex")]
+        stored = (await client.get(f"/api/files/{root['id']}")).json()
+        # Mongo keeps milliseconds
+        assert {**updated, "updated_at": None} == {**stored, "updated_at": None}
+
+    api.run(scenario)
@@ -0,0 +1,133 @@
+import asyncio
+
+from version_store import (
+    VersionStore, apply_delta, encode_version, make_delta, rebuild_contents
+)
+
+
+def encoded_history(contents, snapshot_interval=4):
+    """Storage documents of consecutive versions, as VersionStore.append would encode them"""
+    documents = []
+    previous_content = previous_snapshot = None
+    for sequence, content in enumerate(contents, start=1):
+        document = encode_version(
+            {"file_id": "f", "sequence": sequence, "content": content},
+            previous_content, previous_snapshot, snapshot_interval
+        )
+        documents.append(document)
+        previous_content, previous_snapshot = content, document["snapshot_sequence"]
+    return documents
+
+
+def test_delta_round_trip():
+    base = "line one\nline two\nline three\n"
+    target = "line one\nline 2\nline three\nline four"
+    delta = make_delta(base, target)
+    assert "".join(apply_delta(base.splitlines(keepends=True), delta)) == target
+
+
+def test_small_edits_are_stored_as_deltas_between_snapshots():
+    lines = [f"line {i}\n" for i in range(50)]
+    contents = ["".join(lines[:40 + i]) for i in range(10)]
+    documents = encoded_history(contents, snapshot_interval=4)
+    kinds = ["snapshot" if "content" in d else "delta" for d in documents]
+    assert kinds == ["snapshot", "delta", "delta", "delta"] * 2 + ["snapshot", "delta"]
+    assert [d["snapshot_sequence"] for d in documents] == [1, 1, 1, 1, 5, 5, 5, 5, 9, 9]
+
+
+def test_rewrites_are_stored_as_snapshots():
+    documents = encoded_history(["a\n" * 20, "b\n" * 20])
+    assert "content" in documents[1]
+    assert documents[1]["snapshot_sequence"] == 2
+
+
+def test_rebuild_contents_replays_deltas():
+    contents = [f"title\n{'body ' * i}\nend\n" for i in range(1, 8)]
+    documents = encoded_history(contents, snapshot_interval=3)
+    rebuilt = rebuild_contents(documents)
+    assert rebuilt == {sequence: content for sequence, content in enumerate(contents, start=1)}
+    assert rebuild_contents(documents, wanted={2, 6}) == {2: contents[1], 6: contents[5]}
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.documents
+
+
+def matches(document, query):
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            checks = {"$gte": lambda v, c: v >= c, "$lte": lambda v, c: v <= c, "$lt": lambda v, c: v < c}
+            if not all(checks[op](value, operand) for op, operand in condition.items()):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def project(document, projection):
+    if any(value == 1 for key, value in projection.items() if key != "_id"):
+        return {key: document[key] for key, value in projection.items() if value == 1 and key in document}
+    return {key: value for key, value in document.items() if projection.get(key, 1)}
+
+
+class FakeCollection:
+    """The few collection calls VersionStore makes, over a list"""
+
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    async def find_one(self, query, projection, sort=None):
+        found = [d for d in self.documents if matches(d, query)]
+        if sort:
+            field, direction = sort[0]
+            found.sort(key=lambda d: d[field], reverse=direction < 0)
+        return project(found[0], projection) if found else None
+
+    def find(self, query, projection):
+        return FakeCursor([project(d, projection) for d in self.documents if matches(d, query)])
+
+
+class FakeBlobs:
+    def __init__(self):
+        self.blobs = {}
+
+    async def put(self, text):
+        key = f"blob-{len(self.blobs)}"
+        self.blobs[key] = text
+        return key
+
+    async def get_many(self, keys):
+        return {key: self.blobs[key] for key in keys if key in self.blobs}
+
+
+def test_version_store_round_trip():
+    async def run():
+        store = VersionStore(FakeCollection(), FakeBlobs(), snapshot_interval=3)
+        contents = [f"\\section{{Draft}}\n{'text ' * i}\n" for i in range(1, 9)]
+        previous = None
+        for sequence, content in enumerate(contents, start=1):
+            await store.append({"file_id": "f", "sequence": sequence, "content": content}, previous)
+            previous = content
+        assert (await store.get("f", 5))["content"] == contents[4]
+        listed = await store.list("f", limit=3, include_content=True)
+        assert [(v["sequence"], v["content"]) for v in listed] == [(8, contents[7]), (7, contents[6]), (6, contents[5])]
+        replayed = [item async for item in store.replay("f", after=2)]
+        assert replayed == list(enumerate(contents, start=1))[2:]
+
+    asyncio.run(run())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark version history storage: full copies vs snapshots plus deltas
+
+Simulates a long editing session on a large document (small edits, appended
+paragraphs, occasional larger rewrites) and reports the stored size of the
+history and how long it takes to rebuild a version, for the old full-copy
+scheme and for delta compression at a few snapshot intervals. Runs in
+memory; MongoDB is not required.
+
+Usage: python version_benchmark.py [--size-kb 200] [--versions 500] [--samples 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import bson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from version_store import encode_version, rebuild_contents  # noqa: E402
+
+WORDS = (
+    "theorem lemma proof integral matrix vector space function limit sequence "
+    "converges bounded continuous derivative eigenvalue basis linear operator"
+).split()
+
+
+def paragraph(rng):
+    sentences = [" ".join(rng.choices(WORDS, k=rng.randint(8, 16))).capitalize() + "." for _ in range(4)]
+    return " ".join(sentences) + "\n"
+
+
+def initial_document(rng, size_kb):
+    lines = ["\\documentclass{article}\n", "\\begin{document}\n"]
+    size = 0
+    section = 0
+    while size < size_kb * 1024:
+        if len(lines) % 12 == 2:
+            section += 1
+            lines.append(f"\\section{{Section {section}}}\n")
+        lines.append(paragraph(rng))
+        size += len(lines[-1])
+    return lines + ["\\end{document}\n"]
+
+
+def edit(rng, lines):
+    """One save: mostly small edits, sometimes new text or a rewritten block"""
+    lines = list(lines)
+    body = range(2, len(lines) - 1)
+    roll = rng.random()
+    if roll < 0.7:
+        i = rng.choice(body)
+        words = lines[i].split(" ")
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+        lines[i] = " ".join(words)
+    elif roll < 0.95:
+        lines.insert(rng.choice(body), paragraph(rng))
+    else:
+        i = rng.choice(body)
+        lines[i:i + 10] = [paragraph(rng) for _ in range(10)]
+    return lines
+
+
+def simulate(size_kb, versions, seed=1):
+    rng = random.Random(seed)
+    lines = initial_document(rng, size_kb)
+    contents = ["".join(lines)]
+    for _ in range(versions - 1):
+        lines = edit(rng, lines)
+        contents.append("".join(lines))
+    return contents
+
+
+def store(contents, snapshot_interval):
+    """Storage documents as the version store would write them"""
+    documents = []
+    previous_snapshot = None
+    for sequence, content in enumerate(contents, start=1):
+        version = {"file_id": "bench", "sequence": sequence, "content": content}
+        previous = contents[sequence - 2] if sequence > 1 else None
+        document = encode_version(version, previous, previous_snapshot, snapshot_interval)
+        previous_snapshot = document["snapshot_sequence"]
+        documents.append(document)
+    return documents
+
+
+def rebuild(documents, sequence):
+    """Rebuild one version the way VersionStore.get does"""
+    start = documents[sequence - 1]["snapshot_sequence"]
+    return rebuild_contents(documents[start - 1:sequence], {sequence})[sequence]
+
+
+def report(label, documents, contents, samples, rng):
+    stored = sum(len(bson.encode(d)) for d in documents)
+    latencies = []
+    for sequence in rng.sample(range(1, len(contents) + 1), min(samples, len(contents))):
+        start = time.perf_counter()
+        content = rebuild(documents, sequence)
+        latencies.append(time.perf_counter() - start)
+        assert content == contents[sequence - 1], f"version {sequence} rebuilt incorrectly"
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<22} {stored / 1024 / 1024:>9.2f} MB  "
+        f"{statistics.mean(latencies) * 1000:>8.2f} ms avg  {p95 * 1000:>8.2f} ms p95"
+    )
+    return stored
+
+
+def run_benchmark(size_kb, versions, samples):
+    print(f"=== Version storage benchmark ({size_kb}KB document, {versions} versions) ===")
+    contents = simulate(size_kb, versions)
+    rng = random.Random(2)
+
+    full = [{"file_id": "bench", "sequence": i, "content": c, "snapshot_sequence": i}
+            for i, c in enumerate(contents, start=1)]
+    baseline = report("Full copies", full, contents, samples, rng)
+
+    for interval in (10, 20, 50):
+        start = time.perf_counter()
+        documents = store(contents, interval)
+        encode_ms = (time.perf_counter() - start) * 1000 / len(contents)
+        stored = report(f"Snapshot every {interval}", documents, contents, samples, rng)
+        print(f"{'':<22} {baseline / stored:>9.1f}x smaller, {encode_ms:.2f} ms per save to encode")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-kb", type=int, default=200)
+    parser.add_argument("--versions", type=int, default=500)
+    parser.add_argument("--samples", type=int, default=200)
+    options = parser.parse_args()
+    success = run_benchmark(options.size_kb, options.versions, options.samples)
+    sys.exit(0 if success else 1)